@@ -16,6 +16,7 @@ Smart Email AI - MCP邮件处理工具集
 主要组件：
 - EmailParser: 邮件内容解析和清理
 - iCloudConnector: iCloud邮箱实时连接（NEW!）
+- AsyncICloudConnector: 基于asyncio的iCloud邮箱连接（命令流水线）
 - DataManager: 邮件数据管理和持久化
 - ConfigManager: 配置文件管理
 - MCPTools: MCP协议工具集
@@ -24,21 +25,45 @@ Smart Email AI - MCP邮件处理工具集
 __version__ = "2.1.0"
 __author__ = "Smart Email AI Team"
 
-from .main import RefactoredEmailSystem
-from .interfaces.email_interface import EmailData, email_data_manager
-from .interfaces.config_interface import config_manager
-from .core.parser import OutlookEmailParser
-
-# 添加iCloud连接器导出
-try:
-    from .core.icloud_connector import iCloudConnector
-    icloud_available = True
-except ImportError:
-    # 如果iCloud依赖不可用，提供占位符
-    class iCloudConnector:
-        def __init__(self):
-            raise ImportError("iCloud连接器需要额外的依赖包")
-    icloud_available = False
+# 按需导入导出对象：批量导入的解析进程只导入 core.message_parser，
+# 不应因包初始化而加载主系统、配置和缓存数据库
+_exports = {
+    'RefactoredEmailSystem': '.main',
+    'EmailData': '.interfaces.email_interface',
+    'email_data_manager': '.interfaces.email_interface',
+    'config_manager': '.interfaces.config_interface',
+    'OutlookEmailParser': '.core.parser',
+}
+
+
+def _load_icloud():
+    """导入iCloud连接器导出"""
+    try:
+        from .core.icloud_connector import iCloudConnector
+        from .core.async_imap import AsyncICloudConnector
+        icloud_available = True
+    except ImportError:
+        # 如果iCloud依赖不可用，提供占位符
+        class iCloudConnector:
+            def __init__(self):
+                raise ImportError("iCloud连接器需要额外的依赖包")
+        AsyncICloudConnector = iCloudConnector
+        icloud_available = False
+    globals().update(iCloudConnector=iCloudConnector,
+                     AsyncICloudConnector=AsyncICloudConnector,
+                     icloud_available=icloud_available)
+
+
+def __getattr__(name):
+    if name in _exports:
+        import importlib
+        value = getattr(importlib.import_module(_exports[name], __name__), name)
+        globals()[name] = value
+        return value
+    if name in ('iCloudConnector', 'AsyncICloudConnector', 'icloud_available'):
+        _load_icloud()
+        return globals()[name]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 __all__ = [
     'RefactoredEmailSystem',
@@ -47,5 +72,6 @@ __all__ = [
     'config_manager',
     'OutlookEmailParser',
     'iCloudConnector',
+    'AsyncICloudConnector',
     'icloud_available'
 ] 
\ No newline at end of file
@@ -11,22 +11,106 @@ import hashlib
 import time
 import os
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional, Any, Tuple
+from typing import Callable, Dict, List, Optional, Any, Tuple
 from pathlib import Path
 import pickle
+import re
+import sys
 import threading
+from html import unescape
 from collections import OrderedDict
+from email import message_from_bytes
+from email.message import Message
+
+from .imap_protocol import build_id_set, parse_id_set
+from .sqlite_connections import SQLiteConnectionManager
+
+try:
+    from ..interfaces.config_interface import config_manager
+except ImportError:
+    # 处理直接运行时的导入问题
+    from interfaces.config_interface import config_manager
+
+# 列表视图显示的正文摘要长度
+SNIPPET_LENGTH = 200
+
+_HTML_HIDDEN = re.compile(r'<(script|style|head)\b.*?</\1\s*>', re.I | re.S)
+_HTML_TAG = re.compile(r'<[^>]+>')
+_WHITESPACE = re.compile(r'\s+')
+
+
+def make_email_id(folder: str, uid: Any) -> str:
+    """缓存中的邮件ID：收件箱邮件直接使用UID（兼容旧数据），其他文件夹为 "文件夹:UID"（见 split_email_id）"""
+    uid = uid.decode() if isinstance(uid, bytes) else str(uid)
+    return uid if not folder or folder == 'INBOX' else f"{folder}:{uid}"
+
+
+def split_email_id(email_id: Any) -> Tuple[str, Optional[int]]:
+    """把缓存邮件ID拆分为 (文件夹, UID)"""
+    email_id = email_id.decode() if isinstance(email_id, bytes) else str(email_id)
+    folder, _, uid = email_id.rpartition(':')
+    try:
+        return folder or 'INBOX', int(uid)
+    except ValueError:
+        return folder or 'INBOX', None
+
+
+def _aware_datetime(value: Any) -> Optional[datetime]:
+    """把缓存中的ISO日期转为带时区的时间（无时区时按本地时间），无法解析时返回None"""
+    try:
+        parsed = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+    except (TypeError, ValueError):
+        return None
+    return parsed if parsed.tzinfo else parsed.astimezone()
+
+
+def build_snippet(text: Optional[str], length: int = SNIPPET_LENGTH, html: bool = False) -> str:
+    """把正文规范化为单行摘要（去除HTML标签、合并空白并截断）"""
+    if not text:
+        return ''
+    if html:
+        text = unescape(_HTML_TAG.sub(' ', _HTML_HIDDEN.sub(' ', text)))
+    return _WHITESPACE.sub(' ', text).strip()[:length]
+
+
+def estimate_size(value: Any) -> int:
+    """粗略估算缓存值占用的内存字节数（字符串按实际大小，容器递归累加，其他对象按固定大小）"""
+    if isinstance(value, (str, bytes)):
+        return sys.getsizeof(value)
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(estimate_size(key) + estimate_size(item) for key, item in value.items())
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return sys.getsizeof(value) + sum(estimate_size(item) for item in value)
+    return 32
 
 
 class MemoryCache:
-    """L1缓存 - 内存缓存 (最快访问)"""
+    """L1缓存 - 内存缓存 (最快访问)
     
-    def __init__(self, max_size: int = 100, ttl_seconds: int = 300):
+    按条目数和估算的字节数双重限制容量，超出时按LRU淘汰；
+    条目可以附带依赖描述（tags），写入时由 invalidate_where 只删除受影响的条目
+    """
+    
+    def __init__(self, max_size: int = 100, ttl_seconds: int = 300, max_bytes: Optional[int] = None):
+        """初始化内存缓存
+        
+        Args:
+            max_size: 条目数上限
+            ttl_seconds: 条目有效期（秒）
+            max_bytes: 估算字节数上限，为None时只限制条目数；超过上限的单个条目不缓存
+        """
         self.max_size = max_size
         self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
         self.cache = OrderedDict()
         self.timestamps = {}
+        self.tags = {}  # 键 -> 依赖描述，未提供时为None
+        self.sizes = {}  # 键 -> 估算字节数
+        self.total_bytes = 0
         self.lock = threading.RLock()
+        self.invalidated = 0
+        self.evictions = 0
+        self.rejected = 0
     
     def get(self, key: str) -> Optional[Any]:
         with self.lock:
@@ -38,27 +122,71 @@ class MemoryCache:
                     return self.cache[key]
                 else:
                     # 过期删除
-                    del self.cache[key]
-                    del self.timestamps[key]
+                    self._remove(key)
             return None
     
-    def set(self, key: str, value: Any) -> None:
+    def set(self, key: str, value: Any, tags: Optional[Dict[str, Any]] = None) -> None:
+        """写入条目
+        
+        Args:
+            tags: 条目依赖的数据描述（账户、文件夹、日期范围、查询等），供 invalidate_where 判断
+        """
+        # 在锁外估算大小，避免阻塞并发读取
+        size = estimate_size(value)
         with self.lock:
-            # 检查容量限制
-            if len(self.cache) >= self.max_size and key not in self.cache:
-                # 删除最老的条目
-                oldest_key = next(iter(self.cache))
-                del self.cache[oldest_key]
-                del self.timestamps[oldest_key]
+            self._remove(key)
+            if self.max_bytes is not None and size > self.max_bytes:
+                self.rejected += 1
+                return
+            
+            # 按LRU淘汰，直到条目数和字节数都在限制内
+            while self.cache and (len(self.cache) >= self.max_size
+                                  or (self.max_bytes is not None and self.total_bytes + size > self.max_bytes)):
+                self._remove(next(iter(self.cache)))
+                self.evictions += 1
             
             self.cache[key] = value
             self.timestamps[key] = time.time()
-            self.cache.move_to_end(key)
+            self.tags[key] = tags
+            self.sizes[key] = size
+            self.total_bytes += size
     
     def clear(self) -> None:
         with self.lock:
             self.cache.clear()
             self.timestamps.clear()
+            self.tags.clear()
+            self.sizes.clear()
+            self.total_bytes = 0
+    
+    def invalidate_prefix(self, *prefixes: str) -> int:
+        """删除以指定前缀开头的条目，返回删除数量"""
+        with self.lock:
+            keys = [key for key in self.cache if key.startswith(prefixes)]
+            for key in keys:
+                self._remove(key)
+            self.invalidated += len(keys)
+            return len(keys)
+    
+    def invalidate_where(self, affected: Callable[[Dict[str, Any]], bool]) -> int:
+        """删除 affected(tags) 为True的条目（没有依赖描述的条目总是删除），返回删除数量
+        
+        affected 在锁外调用，可以执行数据库查询
+        """
+        with self.lock:
+            entries = list(self.tags.items())
+        keys = [key for key, tags in entries if tags is None or affected(tags)]
+        with self.lock:
+            for key in keys:
+                self._remove(key)
+            self.invalidated += len(keys)
+        return len(keys)
+    
+    def _remove(self, key: str) -> None:
+        self.cache.pop(key, None)
+        self.timestamps.pop(key, None)
+        self.tags.pop(key, None)
+        self.total_bytes -= self.sizes.pop(key, 0)
     
     def stats(self) -> Dict[str, Any]:
         with self.lock:
@@ -71,154 +199,562 @@ class MemoryCache:
                 'total_entries': len(self.cache),
                 'valid_entries': valid_entries,
                 'max_size': self.max_size,
-                'ttl_seconds': self.ttl_seconds
+                'ttl_seconds': self.ttl_seconds,
+                'total_bytes': self.total_bytes,
+                'max_bytes': self.max_bytes,
+                'evictions': self.evictions,
+                'rejected': self.rejected,
+                'invalidated': self.invalidated
             }
 
 
+class MessageLRUCache:
+    """邮件对象缓存 - 按字节数限制容量的LRU
+    
+    键为 (文件夹, UIDVALIDITY, UID)，UIDVALIDITY变化后旧条目自然失效；
+    按原始邮件字节数计量容量，可选只保存原始bytes，读取时再解析。
+    """
+    
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024, store_raw: bool = True):
+        self.max_bytes = max_bytes
+        self.store_raw = store_raw
+        self.cache = OrderedDict()  # 键 -> (原始bytes或邮件对象, 字节数)
+        self.total_bytes = 0
+        self.lock = threading.RLock()
+        self._stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'rejected': 0}
+    
+    def get(self, key: Tuple[str, int, int]) -> Optional[Message]:
+        with self.lock:
+            entry = self.cache.get(key)
+            if entry is None:
+                self._stats['misses'] += 1
+                return None
+            self.cache.move_to_end(key)
+            self._stats['hits'] += 1
+            value = entry[0]
+        return message_from_bytes(value) if isinstance(value, bytes) else value
+    
+    def put(self, key: Tuple[str, int, int], raw: bytes, msg: Optional[Message] = None) -> None:
+        """缓存一封邮件；超过总容量的单封邮件不缓存"""
+        size = len(raw)
+        with self.lock:
+            self._remove(key)
+            if size > self.max_bytes:
+                self._stats['rejected'] += 1
+                return
+            value = raw if self.store_raw or msg is None else msg
+            self.cache[key] = (value, size)
+            self.total_bytes += size
+            while self.total_bytes > self.max_bytes and self.cache:
+                oldest_key = next(iter(self.cache))
+                self._remove(oldest_key)
+                self._stats['evictions'] += 1
+    
+    def pop(self, key: Tuple[str, int, int]) -> None:
+        with self.lock:
+            self._remove(key)
+    
+    def discard_folder(self, folder: str, keep_uidvalidity: Optional[int] = None) -> int:
+        """删除文件夹的条目（可保留当前UIDVALIDITY的条目），返回删除数量"""
+        with self.lock:
+            keys = [key for key in self.cache
+                    if key[0] == folder and (keep_uidvalidity is None or key[1] != keep_uidvalidity)]
+            for key in keys:
+                self._remove(key)
+            return len(keys)
+    
+    def clear(self) -> None:
+        with self.lock:
+            self.cache.clear()
+            self.total_bytes = 0
+    
+    def __contains__(self, key) -> bool:
+        with self.lock:
+            return key in self.cache
+    
+    def __len__(self) -> int:
+        return len(self.cache)
+    
+    def stats(self) -> Dict[str, Any]:
+        with self.lock:
+            lookups = self._stats['hits'] + self._stats['misses']
+            return {
+                'entries': len(self.cache),
+                'total_bytes': self.total_bytes,
+                'max_bytes': self.max_bytes,
+                'store_raw': self.store_raw,
+                'hit_rate': f"{self._stats['hits'] / lookups * 100:.1f}%" if lookups else "0.0%",
+                **self._stats
+            }
+    
+    def _remove(self, key) -> None:
+        entry = self.cache.pop(key, None)
+        if entry is not None:
+            self.total_bytes -= entry[1]
+
+
 class SQLiteCache:
     """L2缓存 - SQLite本地数据库 (快速访问)"""
     
-    def __init__(self, db_path: str = "data/email_cache.db"):
+    def __init__(self, db_path: str = "data/email_cache.db", settings: Optional[Dict[str, Any]] = None):
+        """初始化SQLite缓存
+        
+        Args:
+            db_path: 数据库文件路径
+            settings: 连接参数（配置 cache.sqlite：synchronous、cache_size_mb、mmap_size_mb 等）
+        """
         self.db_path = db_path
         self.ensure_db_directory()
+        # 每个线程复用一条长期打开的连接（WAL模式，读写互不阻塞）
+        self.connections = SQLiteConnectionManager(db_path, settings)
         self.init_database()
     
+    def connect(self) -> sqlite3.Connection:
+        """获取当前线程的数据库连接，用于 with 语句（成功时提交，异常时回滚，不关闭连接）"""
+        return self.connections.connect()
+    
     def ensure_db_directory(self):
         """确保数据库目录存在"""
         Path(self.db_path).parent.mkdir(parents=True, exist_ok=True)
     
     def init_database(self):
         """初始化数据库表结构"""
-        with sqlite3.connect(self.db_path) as conn:
+        with self.connect() as conn:
             # 邮件索引表
+            conn.execute(f"CREATE TABLE IF NOT EXISTS emails_index ({self.EMAILS_INDEX_COLUMNS})")
+            
+            # 邮件内容表和以它为外部内容的全文搜索表
+            conn.execute(self.EMAIL_CONTENT_TABLE)
+            conn.execute(self.EMAIL_FTS_TABLE)
+            
+            # 同步检查点表（每个文件夹的UIDVALIDITY和已同步的最大UID）
             conn.execute("""
-                CREATE TABLE IF NOT EXISTS emails_index (
-                    id TEXT PRIMARY KEY,
+                CREATE TABLE IF NOT EXISTS sync_state (
                     account_type TEXT,
-                    message_id TEXT UNIQUE,
-                    subject TEXT,
-                    from_email TEXT,
-                    from_name TEXT,
-                    to_emails TEXT,
-                    date_received DATETIME,
-                    importance_score INTEGER DEFAULT 50,
-                    has_attachments BOOLEAN DEFAULT FALSE,
-                    is_read BOOLEAN DEFAULT FALSE,
-                    content_hash TEXT,
-                    size_bytes INTEGER DEFAULT 0,
-                    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-                    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
+                    folder TEXT,
+                    uidvalidity INTEGER,
+                    last_uid INTEGER DEFAULT 0,
+                    highestmodseq INTEGER DEFAULT 0,
+                    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                    PRIMARY KEY(account_type, folder)
                 )
             """)
             
-            # 邮件内容表
+            # 已完整同步的UID区间：区间内服务器上的每封邮件都已写入emails_index
             conn.execute("""
-                CREATE TABLE IF NOT EXISTS email_content (
-                    email_id TEXT PRIMARY KEY,
-                    body_text TEXT,
-                    body_html TEXT,
-                    attachments_json TEXT,
-                    FOREIGN KEY(email_id) REFERENCES emails_index(id)
+                CREATE TABLE IF NOT EXISTS sync_coverage (
+                    account_type TEXT,
+                    folder TEXT,
+                    uidvalidity INTEGER,
+                    uid_start INTEGER,
+                    uid_end INTEGER,
+                    PRIMARY KEY(account_type, folder, uid_start)
                 )
             """)
             
-            # 全文搜索表
+            # 服务器搜索结果缓存：规范化的搜索条件 -> UID集合（在UIDVALIDITY/UIDNEXT时的结果）
             conn.execute("""
-                CREATE VIRTUAL TABLE IF NOT EXISTS email_fts USING fts5(
-                    email_id,
-                    subject,
-                    body_text,
-                    from_name
+                CREATE TABLE IF NOT EXISTS search_cache (
+                    account_type TEXT,
+                    folder TEXT,
+                    criteria TEXT,
+                    uidvalidity INTEGER,
+                    uidnext INTEGER,
+                    uids TEXT,
+                    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                    PRIMARY KEY(account_type, folder, criteria)
                 )
             """)
             
+            # 为旧版本数据库补充新增列
+            self._migrate_schema(conn)
+            migrated_fts = self._migrate_fts(conn)
+            for trigger in self.EMAIL_FTS_TRIGGERS:
+                conn.execute(trigger)
+            
             # 性能优化索引
             conn.execute("CREATE INDEX IF NOT EXISTS idx_date_received ON emails_index(date_received DESC)")
             conn.execute("CREATE INDEX IF NOT EXISTS idx_from_email ON emails_index(from_email)")
             conn.execute("CREATE INDEX IF NOT EXISTS idx_importance ON emails_index(importance_score DESC)")
             conn.execute("CREATE INDEX IF NOT EXISTS idx_account_date ON emails_index(account_type, date_received)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_account_folder_date ON emails_index(account_type, folder, date_received DESC)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_account_folder_uid ON emails_index(account_type, folder, uid)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_message_id ON emails_index(message_id)")
+        
+        if migrated_fts:
+            # 回收旧全文索引中正文副本占用的空间（VACUUM不能在事务中执行）
+            conn = self.connect()
+            conn.execute("VACUUM")
+            conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    
+    # 邮件索引表结构；id 为收件箱邮件的UID，其他文件夹为 "文件夹:UID"（见 make_email_id）
+    EMAILS_INDEX_COLUMNS = """
+        id TEXT PRIMARY KEY,
+        account_type TEXT,
+        message_id TEXT,
+        subject TEXT,
+        from_email TEXT,
+        from_name TEXT,
+        to_emails TEXT,
+        date_received DATETIME,
+        importance_score INTEGER DEFAULT 50,
+        has_attachments BOOLEAN DEFAULT FALSE,
+        is_read BOOLEAN DEFAULT FALSE,
+        content_hash TEXT,
+        size_bytes INTEGER DEFAULT 0,
+        body_loaded BOOLEAN DEFAULT TRUE,
+        snippet TEXT DEFAULT '',
+        folder TEXT DEFAULT 'INBOX',
+        uid INTEGER,
+        created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+        updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
+    """
+    
+    # 邮件内容表；id 为全文索引的rowid（INTEGER PRIMARY KEY，VACUUM后保持不变），
+    # subject 和 from_name 供全文索引读取
+    EMAIL_CONTENT_TABLE = """
+        CREATE TABLE IF NOT EXISTS email_content (
+            id INTEGER PRIMARY KEY,
+            email_id TEXT UNIQUE,
+            subject TEXT,
+            from_name TEXT,
+            body_text TEXT,
+            body_html TEXT,
+            attachments_json TEXT,
+            FOREIGN KEY(email_id) REFERENCES emails_index(id)
+        )
+    """
+    
+    # 外部内容全文索引：只保存倒排索引，列值从 email_content 读取（snippet() 照常可用）
+    EMAIL_FTS_TABLE = """
+        CREATE VIRTUAL TABLE IF NOT EXISTS email_fts USING fts5(
+            subject,
+            body_text,
+            from_name,
+            content='email_content',
+            content_rowid='id'
+        )
+    """
+    
+    # 由触发器保持全文索引与 email_content 同步；写入 email_content 时不能使用 INSERT OR REPLACE
+    # （REPLACE 删除旧行时不触发删除触发器），应使用 ON CONFLICT DO UPDATE
+    EMAIL_FTS_TRIGGERS = (
+        """
+        CREATE TRIGGER IF NOT EXISTS email_content_fts_insert AFTER INSERT ON email_content BEGIN
+            INSERT INTO email_fts (rowid, subject, body_text, from_name)
+            VALUES (new.id, new.subject, new.body_text, new.from_name);
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS email_content_fts_delete AFTER DELETE ON email_content BEGIN
+            INSERT INTO email_fts (email_fts, rowid, subject, body_text, from_name)
+            VALUES ('delete', old.id, old.subject, old.body_text, old.from_name);
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS email_content_fts_update AFTER UPDATE ON email_content BEGIN
+            INSERT INTO email_fts (email_fts, rowid, subject, body_text, from_name)
+            VALUES ('delete', old.id, old.subject, old.body_text, old.from_name);
+            INSERT INTO email_fts (rowid, subject, body_text, from_name)
+            VALUES (new.id, new.subject, new.body_text, new.from_name);
+        END
+        """,
+    )
+    
+    # 旧版本数据库缺少的列: {表名: [(列名, 列定义)]}
+    SCHEMA_MIGRATIONS = {
+        'emails_index': [
+            ('body_loaded', 'BOOLEAN DEFAULT TRUE'),
+            ('snippet', "TEXT DEFAULT ''"),
+            ('folder', "TEXT DEFAULT 'INBOX'"),
+            ('uid', 'INTEGER'),
+        ],
+        'sync_state': [
+            ('highestmodseq', 'INTEGER DEFAULT 0'),
+        ],
+    }
+    
+    def _migrate_schema(self, conn: sqlite3.Connection) -> None:
+        """为已存在的表添加缺失的列"""
+        for table, columns in self.SCHEMA_MIGRATIONS.items():
+            existing = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+            for column, definition in columns:
+                if column not in existing:
+                    conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+                    if (table, column) == ('emails_index', 'snippet'):
+                        self._backfill_snippets(conn)
+                    elif (table, column) == ('emails_index', 'uid'):
+                        self._drop_legacy_rows(conn)
+        
+        # 同一封邮件可能同时存在于多个文件夹，message_id不能再是唯一约束
+        if self._has_unique_message_id(conn):
+            self._rebuild_emails_index(conn)
+    
+    @staticmethod
+    def _drop_legacy_rows(conn: sqlite3.Connection) -> None:
+        """删除没有uid列时写入的旧记录
+        
+        旧版本以IMAP序号作为邮件ID，与现在收件箱邮件使用的UID形式相同却指向不同的邮件，
+        无法可靠地换算为UID。缓存可以重建，直接删除，下次同步时按UID重新获取。
+        """
+        conn.execute("DELETE FROM email_content WHERE email_id IN (SELECT id FROM emails_index)")
+        conn.execute("DELETE FROM emails_index")
+    
+    @staticmethod
+    def _has_unique_message_id(conn: sqlite3.Connection) -> bool:
+        for index in conn.execute("PRAGMA index_list(emails_index)").fetchall():
+            if index[2] and [row[2] for row in conn.execute(f"PRAGMA index_info('{index[1]}')")] == ['message_id']:
+                return True
+        return False
+    
+    def _rebuild_emails_index(self, conn: sqlite3.Connection) -> None:
+        """按当前表结构重建emails_index并保留原有数据"""
+        old_columns = [row[1] for row in conn.execute("PRAGMA table_info(emails_index)")]
+        conn.execute(f"CREATE TABLE emails_index_migrated ({self.EMAILS_INDEX_COLUMNS})")
+        new_columns = {row[1] for row in conn.execute("PRAGMA table_info(emails_index_migrated)")}
+        columns = ', '.join(column for column in old_columns if column in new_columns)
+        conn.execute(f"INSERT INTO emails_index_migrated ({columns}) SELECT {columns} FROM emails_index")
+        conn.execute("DROP TABLE emails_index")
+        conn.execute("ALTER TABLE emails_index_migrated RENAME TO emails_index")
+    
+    def _migrate_fts(self, conn: sqlite3.Connection) -> bool:
+        """把旧版本的独立全文索引表（保存正文副本）迁移为外部内容索引
+        
+        Returns:
+            bool: 是否进行了迁移
+        """
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(email_content)")}
+        if 'id' in columns:
+            return False
+        
+        # sqlite3模块不会为DDL隐式开启事务，用保存点把整个迁移作为一个事务：
+        # 中途失败时回滚到旧表结构，下次启动重新迁移
+        conn.execute("SAVEPOINT migrate_fts")
+        try:
+            conn.execute("ALTER TABLE email_content RENAME TO email_content_legacy")
+            conn.execute("DROP TABLE IF EXISTS email_fts")
+            conn.execute(self.EMAIL_CONTENT_TABLE)
+            conn.execute(self.EMAIL_FTS_TABLE)
+            conn.execute("""
+                INSERT INTO email_content (email_id, subject, from_name, body_text, body_html, attachments_json)
+                SELECT c.email_id, e.subject, e.from_name, c.body_text, c.body_html, c.attachments_json
+                FROM email_content_legacy c LEFT JOIN emails_index e ON e.id = c.email_id
+            """)
+            conn.execute("DROP TABLE email_content_legacy")
+            # 触发器尚未创建，一次性重建索引比逐行插入快
+            conn.execute("INSERT INTO email_fts (email_fts) VALUES ('rebuild')")
+        except Exception:
+            conn.execute("ROLLBACK TO migrate_fts")
+            conn.execute("RELEASE migrate_fts")
+            raise
+        conn.execute("RELEASE migrate_fts")
+        return True
+    
+    def _backfill_snippets(self, conn: sqlite3.Connection) -> None:
+        """根据已缓存的正文为旧记录生成摘要"""
+        conn.create_function('build_snippet', 1, build_snippet)
+        conn.execute("""
+            UPDATE emails_index SET snippet = COALESCE(
+                (SELECT build_snippet(c.body_text) FROM email_content c WHERE c.email_id = emails_index.id), '')
+        """)
+    
+    # 批量写入使用的语句（executemany 和连接的语句缓存共用同一条SQL）
+    INSERT_INDEX_SQL = """
+        INSERT OR REPLACE INTO emails_index 
+        (id, account_type, message_id, subject, from_email, from_name, 
+         to_emails, date_received, importance_score, has_attachments, 
+         is_read, content_hash, size_bytes, body_loaded, snippet, folder, uid, updated_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """
+    # 已有内容时原地更新（保持rowid不变并触发全文索引的更新触发器）
+    UPSERT_CONTENT_SQL = """
+        INSERT INTO email_content 
+        (email_id, subject, from_name, body_text, body_html, attachments_json)
+        VALUES (?, ?, ?, ?, ?, ?)
+        ON CONFLICT(email_id) DO UPDATE SET
+            subject = excluded.subject,
+            from_name = excluded.from_name,
+            body_text = excluded.body_text,
+            body_html = excluded.body_html,
+            attachments_json = excluded.attachments_json
+    """
+    # 单条SQL中 IN (...) 的参数个数上限（低于SQLite默认的999）
+    BULK_PARAM_CHUNK = 500
     
     def store_email(self, email_data: Dict[str, Any]) -> bool:
         """存储邮件到缓存"""
+        outcomes = self.store_emails_bulk([email_data])
+        return bool(outcomes) and outcomes[0]['status'] != 'failed'
+    
+    def store_emails_bulk(self, emails: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """在一个事务中批量存储邮件
+        
+        emails_index、email_content 各用一次 executemany 写入（全文索引由触发器同步），整批只提交一次。
+        整批写入失败时回滚并逐条重试，只有出错的邮件标记为失败。
+        
+        Returns:
+            List[Dict]: 与输入顺序一致的结果，包含 id 和 status：
+            inserted（新邮件）、updated（替换已有记录）、kept_content（只更新邮件头，保留已加载的正文）、
+            failed（失败，附带 error）
+        """
+        outcomes = [{'id': email_data.get('mail_id', ''), 'status': None} for email_data in emails]
+        if not emails:
+            return outcomes
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                # 计算内容哈希
-                content_str = f"{email_data.get('subject', '')}{email_data.get('body_text', '')}"
-                content_hash = hashlib.md5(content_str.encode()).hexdigest()
-                
-                # 存储邮件索引
-                conn.execute("""
-                    INSERT OR REPLACE INTO emails_index 
-                    (id, account_type, message_id, subject, from_email, from_name, 
-                     to_emails, date_received, importance_score, has_attachments, 
-                     is_read, content_hash, size_bytes, updated_at)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                """, (
-                    email_data.get('mail_id', ''),
-                    email_data.get('account_type', 'icloud'),
-                    email_data.get('message_id', ''),
-                    email_data.get('subject', ''),
-                    email_data.get('sender', ''),
-                    email_data.get('sender', '').split('<')[0].strip(),
-                    json.dumps([email_data.get('recipient', '')]),
-                    email_data.get('parsed_date', datetime.now().isoformat()),
-                    self._calculate_importance(email_data),
-                    email_data.get('has_attachments', False),
-                    False,  # 默认未读
-                    content_hash,
-                    email_data.get('size', 0),
-                    datetime.now().isoformat()
-                ))
-                
-                # 存储邮件内容
-                conn.execute("""
-                    INSERT OR REPLACE INTO email_content 
-                    (email_id, body_text, body_html, attachments_json)
-                    VALUES (?, ?, ?, ?)
-                """, (
-                    email_data.get('mail_id', ''),
-                    email_data.get('body_text', ''),
-                    email_data.get('body_html', ''),
-                    json.dumps(email_data.get('attachments', []))
-                ))
-                
-                # 更新全文搜索索引
-                conn.execute("""
-                    INSERT OR REPLACE INTO email_fts 
-                    (email_id, subject, body_text, from_name)
-                    VALUES (?, ?, ?, ?)
-                """, (
-                    email_data.get('mail_id', ''),
-                    email_data.get('subject', ''),
-                    email_data.get('body_text', ''),
-                    email_data.get('sender', '').split('<')[0].strip()
-                ))
-                
-                return True
+            conn = self.connect()
+            existing = self._load_existing(conn, [outcome['id'] for outcome in outcomes])
+            
+            prepared = []
+            for index, email_data in enumerate(emails):
+                try:
+                    rows = self._prepare_rows(email_data, existing.get(outcomes[index]['id']))
+                except Exception as e:
+                    outcomes[index].update(status='failed', error=str(e))
+                    continue
+                # 同一批中重复的邮件按顺序处理，后一条看到的是前一条写入后的状态
+                existing[rows['id']] = (rows['index'][13], rows['index'][14])
+                outcomes[index]['status'] = rows['status']
+                prepared.append((index, rows))
+            
+            try:
+                with conn:
+                    self._write_rows(conn, [rows for _, rows in prepared])
+            except sqlite3.Error:
+                # 整批已回滚，逐条写入以找出失败的邮件
+                for index, rows in prepared:
+                    try:
+                        with conn:
+                            self._write_rows(conn, [rows])
+                    except sqlite3.Error as e:
+                        outcomes[index].update(status='failed', error=str(e))
         except Exception as e:
             # 移除print语句，避免MCP JSON解析错误
-            return False
+            for outcome in outcomes:
+                if outcome['status'] != 'failed':
+                    outcome.update(status='failed', error=str(e))
+        return outcomes
+    
+    def _load_existing(self, conn: sqlite3.Connection, email_ids: List[str]) -> Dict[str, Tuple[Any, Any]]:
+        """分块读取已缓存邮件的 body_loaded 和摘要"""
+        existing = {}
+        unique_ids = list(dict.fromkeys(email_ids))
+        for start in range(0, len(unique_ids), self.BULK_PARAM_CHUNK):
+            chunk = unique_ids[start:start + self.BULK_PARAM_CHUNK]
+            placeholders = ','.join('?' * len(chunk))
+            for email_id, body_loaded, snippet in conn.execute(
+                    f"SELECT id, body_loaded, snippet FROM emails_index WHERE id IN ({placeholders})", chunk):
+                existing[email_id] = (body_loaded, snippet)
+        return existing
+    
+    def _prepare_rows(self, email_data: Dict[str, Any], existing: Optional[Tuple[Any, Any]]) -> Dict[str, Any]:
+        """生成一封邮件要写入的索引、内容和全文索引行
+        
+        Args:
+            existing: 已缓存记录的 (body_loaded, snippet)，未缓存时为None
+        """
+        email_id = email_data.get('mail_id', '')
+        body_loaded = email_data.get('body_loaded', True)
+        folder, uid = split_email_id(email_id)
+        
+        # 只有邮件头的记录不能覆盖已经加载过的正文
+        keep_content = bool(existing and existing[0] and not body_loaded)
+        if keep_content:
+            body_loaded = True
+        
+        # 列表视图只读取摘要列；有正文时由正文生成，否则使用预览获取的摘要
+        snippet = (build_snippet(email_data.get('body_text'))
+                   or build_snippet(email_data.get('body_html'), html=True)
+                   or email_data.get('snippet', ''))
+        if keep_content or (existing and not snippet):
+            snippet = existing[1] or snippet
+        
+        # 计算内容哈希
+        content_str = f"{email_data.get('subject', '')}{email_data.get('body_text', '')}"
+        content_hash = hashlib.md5(content_str.encode()).hexdigest()
+        from_name = email_data.get('sender', '').split('<')[0].strip()
+        
+        rows = {
+            'id': email_id,
+            'status': 'kept_content' if keep_content else ('updated' if existing else 'inserted'),
+            'index': (
+                email_id,
+                email_data.get('account_type', 'icloud'),
+                email_data.get('message_id', ''),
+                email_data.get('subject', ''),
+                email_data.get('sender', ''),
+                from_name,
+                json.dumps([email_data.get('recipient', '')]),
+                email_data.get('parsed_date', datetime.now().isoformat()),
+                self._calculate_importance(email_data),
+                email_data.get('has_attachments', False),
+                email_data.get('is_read', False),
+                content_hash,
+                email_data.get('size', 0),
+                body_loaded,
+                snippet,
+                folder,
+                uid,
+                datetime.now().isoformat()
+            ),
+            'content': None
+        }
+        if not keep_content:
+            rows['content'] = (
+                email_id,
+                email_data.get('subject', ''),
+                from_name,
+                email_data.get('body_text', ''),
+                email_data.get('body_html', ''),
+                json.dumps(email_data.get('attachments', []))
+            )
+        return rows
+    
+    def _write_rows(self, conn: sqlite3.Connection, rows: List[Dict[str, Any]]) -> None:
+        """在调用方的事务中写入 _prepare_rows 生成的行"""
+        # 同一批中重复的邮件只保留最后一次写入
+        index_rows = {row['id']: row['index'] for row in rows}
+        content_rows = {row['id']: row['content'] for row in rows if row['content'] is not None}
+        conn.executemany(self.INSERT_INDEX_SQL, list(index_rows.values()))
+        # 存储邮件内容，触发器同时更新全文搜索索引（原有索引行被替换，不会重复）
+        conn.executemany(self.UPSERT_CONTENT_SQL, list(content_rows.values()))
     
-    def get_recent_emails(self, count: int = 10, account_type: str = 'icloud') -> List[Dict[str, Any]]:
-        """快速获取最近邮件"""
+    def get_recent_emails(self, count: int = 10, account_type: str = 'icloud',
+                          with_content: bool = True, folder: Optional[str] = 'INBOX') -> List[Dict[str, Any]]:
+        """快速获取最近邮件
+        
+        Args:
+            with_content: 为False时只读取索引表（含snippet摘要），不读取正文和附件
+            folder: 文件夹，为None时包含所有文件夹
+        """
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self.connect() as conn:
                 conn.row_factory = sqlite3.Row
-                cursor = conn.execute("""
-                    SELECT e.*, c.body_text, c.body_html, c.attachments_json
-                    FROM emails_index e
-                    LEFT JOIN email_content c ON e.id = c.email_id
-                    WHERE e.account_type = ?
-                    ORDER BY e.date_received DESC
-                    LIMIT ?
-                """, (account_type, count))
+                folder_filter = "" if folder is None else "AND e.folder = ?"
+                params = (account_type,) + (() if folder is None else (folder,)) + (count,)
+                if with_content:
+                    cursor = conn.execute(f"""
+                        SELECT e.*, c.body_text, c.body_html, c.attachments_json
+                        FROM emails_index e
+                        LEFT JOIN email_content c ON e.id = c.email_id
+                        WHERE e.account_type = ? {folder_filter}
+                        ORDER BY e.date_received DESC
+                        LIMIT ?
+                    """, params)
+                else:
+                    cursor = conn.execute(f"""
+                        SELECT e.* FROM emails_index e
+                        WHERE e.account_type = ? {folder_filter}
+                        ORDER BY e.date_received DESC
+                        LIMIT ?
+                    """, params)
                 
                 emails = []
                 for row in cursor.fetchall():
                     email_dict = dict(row)
                     # 解析JSON字段
                     email_dict['to_emails'] = json.loads(email_dict['to_emails'] or '[]')
-                    email_dict['attachments'] = json.loads(email_dict['attachments_json'] or '[]')
+                    if with_content:
+                        email_dict['attachments'] = json.loads(email_dict['attachments_json'] or '[]')
                     emails.append(email_dict)
                 
                 return emails
@@ -226,20 +762,60 @@ class SQLiteCache:
             print(f"[缓存错误] 获取最近邮件失败: {e}")
             return []
     
-    def search_emails(self, query: str, limit: int = 20) -> List[Dict[str, Any]]:
-        """全文搜索邮件"""
+    def get_email(self, email_id: str) -> Optional[Dict[str, Any]]:
+        """按ID获取单封邮件（含正文）"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self.connect() as conn:
                 conn.row_factory = sqlite3.Row
-                cursor = conn.execute("""
-                    SELECT e.*, c.body_text, c.body_html
-                    FROM email_fts
-                    JOIN emails_index e ON email_fts.email_id = e.id
+                row = conn.execute("""
+                    SELECT e.*, c.body_text, c.body_html, c.attachments_json
+                    FROM emails_index e
                     LEFT JOIN email_content c ON e.id = c.email_id
-                    WHERE email_fts MATCH ?
-                    ORDER BY e.date_received DESC
-                    LIMIT ?
-                """, (query, limit))
+                    WHERE e.id = ?
+                """, (email_id,)).fetchone()
+                if not row:
+                    return None
+                email_dict = dict(row)
+                email_dict['to_emails'] = json.loads(email_dict['to_emails'] or '[]')
+                email_dict['attachments'] = json.loads(email_dict['attachments_json'] or '[]')
+                return email_dict
+        except Exception as e:
+            # 移除print语句，避免MCP JSON解析错误
+            return None
+    
+    def search_emails(self, query: str, limit: int = 20, with_content: bool = True,
+                      folder: Optional[str] = None) -> List[Dict[str, Any]]:
+        """全文搜索邮件（默认跨所有文件夹）
+        
+        Args:
+            with_content: 为False时不读取正文，匹配上下文由FTS5的snippet()生成（match_preview字段）
+            folder: 只搜索指定文件夹
+        """
+        try:
+            with self.connect() as conn:
+                conn.row_factory = sqlite3.Row
+                folder_filter = "" if folder is None else "AND e.folder = ?"
+                params = (query,) + (() if folder is None else (folder,)) + (limit,)
+                if with_content:
+                    cursor = conn.execute(f"""
+                        SELECT e.*, c.body_text, c.body_html
+                        FROM email_fts
+                        JOIN email_content c ON c.id = email_fts.rowid
+                        JOIN emails_index e ON e.id = c.email_id
+                        WHERE email_fts MATCH ? {folder_filter}
+                        ORDER BY e.date_received DESC
+                        LIMIT ?
+                    """, params)
+                else:
+                    cursor = conn.execute(f"""
+                        SELECT e.*, snippet(email_fts, 1, '**', '**', '...', 24) AS match_preview
+                        FROM email_fts
+                        JOIN email_content c ON c.id = email_fts.rowid
+                        JOIN emails_index e ON e.id = c.email_id
+                        WHERE email_fts MATCH ? {folder_filter}
+                        ORDER BY e.date_received DESC
+                        LIMIT ?
+                    """, params)
                 
                 results = []
                 for row in cursor.fetchall():
@@ -252,10 +828,251 @@ class SQLiteCache:
             # 移除print语句，避免MCP JSON解析错误
             return []
     
+    def filter_matches(self, query: str, email_ids: List[str]) -> List[str]:
+        """返回 email_ids 中匹配全文搜索条件的邮件ID（查询失败时保守地全部返回）"""
+        matched = []
+        try:
+            conn = self.connect()
+            for start in range(0, len(email_ids), self.BULK_PARAM_CHUNK):
+                chunk = email_ids[start:start + self.BULK_PARAM_CHUNK]
+                matched.extend(row[0] for row in conn.execute(f"""
+                    SELECT c.email_id FROM email_fts
+                    JOIN email_content c ON c.id = email_fts.rowid
+                    WHERE email_fts MATCH ? AND c.email_id IN ({','.join('?' * len(chunk))})
+                """, [query] + chunk))
+            return matched
+        except Exception as e:
+            # 移除print语句，避免MCP JSON解析错误
+            return list(email_ids)
+    
+    def get_sync_state(self, account_type: str, folder: str) -> Optional[Dict[str, Any]]:
+        """获取文件夹的同步检查点"""
+        try:
+            with self.connect() as conn:
+                conn.row_factory = sqlite3.Row
+                row = conn.execute("""
+                    SELECT * FROM sync_state WHERE account_type = ? AND folder = ?
+                """, (account_type, folder)).fetchone()
+                return dict(row) if row else None
+        except Exception as e:
+            # 移除print语句，避免MCP JSON解析错误
+            return None
+    
+    def update_sync_state(self, account_type: str, folder: str, uidvalidity: int, last_uid: int,
+                          highestmodseq: Optional[int] = None) -> bool:
+        """保存文件夹的同步检查点（highestmodseq为None时保留原值）"""
+        try:
+            with self.connect() as conn:
+                conn.execute("""
+                    INSERT INTO sync_state
+                    (account_type, folder, uidvalidity, last_uid, highestmodseq, updated_at)
+                    VALUES (?, ?, ?, ?, COALESCE(?, 0), ?)
+                    ON CONFLICT(account_type, folder) DO UPDATE SET
+                        uidvalidity = excluded.uidvalidity,
+                        last_uid = excluded.last_uid,
+                        highestmodseq = COALESCE(?, sync_state.highestmodseq),
+                        updated_at = excluded.updated_at
+                """, (account_type, folder, uidvalidity, last_uid, highestmodseq,
+                      datetime.now().isoformat(), highestmodseq))
+                return True
+        except Exception as e:
+            # 移除print语句，避免MCP JSON解析错误
+            return False
+    
+    def get_sync_states(self, account_type: str) -> List[Dict[str, Any]]:
+        """获取账户下所有已同步文件夹的检查点"""
+        try:
+            with self.connect() as conn:
+                conn.row_factory = sqlite3.Row
+                rows = conn.execute("SELECT * FROM sync_state WHERE account_type = ?", (account_type,)).fetchall()
+                return [dict(row) for row in rows]
+        except Exception as e:
+            # 移除print语句，避免MCP JSON解析错误
+            return []
+    
+    def add_coverage(self, account_type: str, folder: str, uidvalidity: int,
+                     uid_start: int, uid_end: int) -> bool:
+        """记录已完整同步的UID区间，与相邻或重叠的区间合并
+        
+        UIDVALIDITY不同的旧区间同时删除。
+        """
+        if uid_start > uid_end:
+            return False
+        try:
+            with self.connect() as conn:
+                conn.execute("""
+                    DELETE FROM sync_coverage WHERE account_type = ? AND folder = ? AND uidvalidity != ?
+                """, (account_type, folder, uidvalidity))
+                ranges = conn.execute("""
+                    SELECT uid_start, uid_end FROM sync_coverage WHERE account_type = ? AND folder = ?
+                """, (account_type, folder)).fetchall()
+                
+                merged = []
+                for start, end in sorted(list(ranges) + [(uid_start, uid_end)]):
+                    if merged and start <= merged[-1][1] + 1:
+                        merged[-1][1] = max(merged[-1][1], end)
+                    else:
+                        merged.append([start, end])
+                
+                conn.execute("DELETE FROM sync_coverage WHERE account_type = ? AND folder = ?", (account_type, folder))
+                conn.executemany("""
+                    INSERT INTO sync_coverage (account_type, folder, uidvalidity, uid_start, uid_end)
+                    VALUES (?, ?, ?, ?, ?)
+                """, [(account_type, folder, uidvalidity, start, end) for start, end in merged])
+                return True
+        except Exception as e:
+            # 移除print语句，避免MCP JSON解析错误
+            return False
+    
+    def get_coverage(self, account_type: str, folder: str, uidvalidity: int) -> List[Tuple[int, int]]:
+        """获取文件夹已完整同步的UID区间（升序）"""
+        try:
+            with self.connect() as conn:
+                rows = conn.execute("""
+                    SELECT uid_start, uid_end FROM sync_coverage
+                    WHERE account_type = ? AND folder = ? AND uidvalidity = ?
+                    ORDER BY uid_start
+                """, (account_type, folder, uidvalidity)).fetchall()
+                return [(row[0], row[1]) for row in rows]
+        except Exception as e:
+            # 移除print语句，避免MCP JSON解析错误
+            return []
+    
+    # 保留的服务器搜索结果条数（按最近使用淘汰）
+    SEARCH_CACHE_LIMIT = 500
+    
+    def get_search_result(self, account_type: str, folder: str, criteria: str) -> Optional[Dict[str, Any]]:
+        """获取缓存的服务器搜索结果
+        
+        Returns:
+            Optional[Dict]: uidvalidity、uidnext 和 uids（UID列表），未缓存时为None
+        """
+        try:
+            with self.connect() as conn:
+                row = conn.execute("""
+                    SELECT uidvalidity, uidnext, uids FROM search_cache
+                    WHERE account_type = ? AND folder = ? AND criteria = ?
+                """, (account_type, folder, criteria)).fetchone()
+                if not row:
+                    return None
+                return {'uidvalidity': row[0], 'uidnext': row[1], 'uids': parse_id_set(row[2] or '')}
+        except Exception as e:
+            # 移除print语句，避免MCP JSON解析错误
+            return None
+    
+    def save_search_result(self, account_type: str, folder: str, criteria: str,
+                           uidvalidity: int, uidnext: int, uids: List[int]) -> bool:
+        """保存服务器搜索结果（UID集合压缩为 1:5,7 形式存储）"""
+        try:
+            with self.connect() as conn:
+                conn.execute("""
+                    INSERT OR REPLACE INTO search_cache
+                    (account_type, folder, criteria, uidvalidity, uidnext, uids, updated_at)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                """, (account_type, folder, criteria, uidvalidity, uidnext, build_id_set(uids),
+                      datetime.now().isoformat()))
+                conn.execute("""
+                    DELETE FROM search_cache WHERE rowid NOT IN
+                    (SELECT rowid FROM search_cache ORDER BY updated_at DESC LIMIT ?)
+                """, (self.SEARCH_CACHE_LIMIT,))
+                return True
+        except Exception as e:
+            # 移除print语句，避免MCP JSON解析错误
+            return False
+    
+    def get_header_only_uids(self, account_type: str, folder: str) -> List[int]:
+        """获取文件夹中只缓存了邮件头（正文未加载、未进入全文索引）的UID"""
+        try:
+            with self.connect() as conn:
+                rows = conn.execute("""
+                    SELECT uid FROM emails_index
+                    WHERE account_type = ? AND folder = ? AND uid IS NOT NULL AND NOT body_loaded
+                    ORDER BY uid
+                """, (account_type, folder)).fetchall()
+                return [row[0] for row in rows]
+        except Exception as e:
+            # 移除print语句，避免MCP JSON解析错误
+            return []
+    
+    def get_cached_ids(self, account_type: str, folder: Optional[str] = None) -> List[str]:
+        """获取指定账户（及文件夹）已缓存的邮件ID列表"""
+        try:
+            with self.connect() as conn:
+                if folder is None:
+                    cursor = conn.execute("SELECT id FROM emails_index WHERE account_type = ?", (account_type,))
+                else:
+                    cursor = conn.execute("SELECT id FROM emails_index WHERE account_type = ? AND folder = ?",
+                                          (account_type, folder))
+                return [row[0] for row in cursor.fetchall()]
+        except Exception as e:
+            # 移除print语句，避免MCP JSON解析错误
+            return []
+    
+    def get_cached_uids(self, account_type: str, folder: str) -> List[int]:
+        """获取文件夹中已缓存邮件的UID（升序）"""
+        try:
+            with self.connect() as conn:
+                cursor = conn.execute("""
+                    SELECT uid FROM emails_index
+                    WHERE account_type = ? AND folder = ? AND uid IS NOT NULL
+                    ORDER BY uid
+                """, (account_type, folder))
+                return [row[0] for row in cursor.fetchall()]
+        except Exception as e:
+            # 移除print语句，避免MCP JSON解析错误
+            return []
+    
+    def get_folder_counts(self, account_type: str) -> Dict[str, int]:
+        """各文件夹已缓存的邮件数"""
+        try:
+            with self.connect() as conn:
+                cursor = conn.execute("""
+                    SELECT folder, COUNT(*) FROM emails_index WHERE account_type = ? GROUP BY folder
+                """, (account_type,))
+                return {row[0]: row[1] for row in cursor.fetchall()}
+        except Exception as e:
+            # 移除print语句，避免MCP JSON解析错误
+            return {}
+    
+    def update_read_flags(self, read_flags: Dict[str, bool]) -> int:
+        """批量更新邮件已读状态
+        
+        Args:
+            read_flags: {邮件ID: 是否已读}
+        """
+        if not read_flags:
+            return 0
+        try:
+            with self.connect() as conn:
+                now = datetime.now().isoformat()
+                cursor = conn.executemany("""
+                    UPDATE emails_index SET is_read = ?, updated_at = ?
+                    WHERE id = ? AND is_read IS NOT ?
+                """, [(is_read, now, email_id, is_read) for email_id, is_read in read_flags.items()])
+                return cursor.rowcount
+        except Exception as e:
+            # 移除print语句，避免MCP JSON解析错误
+            return 0
+    
+    def delete_emails(self, email_ids: List[str]) -> int:
+        """从缓存中删除服务器上已不存在的邮件"""
+        if not email_ids:
+            return 0
+        try:
+            with self.connect() as conn:
+                params = [(email_id,) for email_id in email_ids]
+                # 全文索引行由 email_content 的删除触发器移除
+                conn.executemany("DELETE FROM email_content WHERE email_id = ?", params)
+                cursor = conn.executemany("DELETE FROM emails_index WHERE id = ?", params)
+                return cursor.rowcount
+        except Exception as e:
+            # 移除print语句，避免MCP JSON解析错误
+            return 0
+    
     def get_cache_stats(self) -> Dict[str, Any]:
         """获取缓存统计信息"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self.connect() as conn:
                 cursor = conn.execute("SELECT COUNT(*) FROM emails_index")
                 total_emails = cursor.fetchone()[0]
                 
@@ -268,11 +1085,15 @@ class SQLiteCache:
                 """)
                 recent_emails = cursor.fetchone()[0]
                 
+                # WAL模式下未检查点的写入在 -wal 文件中
+                db_size = sum(os.path.getsize(path) for path in (self.db_path, self.db_path + '-wal')
+                              if os.path.exists(path))
                 return {
                     'total_emails': total_emails,
                     'cached_content': cached_content,
                     'recent_emails': recent_emails,
-                    'db_size_mb': os.path.getsize(self.db_path) / 1024 / 1024 if os.path.exists(self.db_path) else 0
+                    'db_size_mb': db_size / 1024 / 1024,
+                    'connections': self.connections.stats()
                 }
         except Exception as e:
             # 移除print语句，避免MCP JSON解析错误
@@ -309,18 +1130,26 @@ class EmailCacheManager:
     """邮件缓存管理器 - 统一缓存接口"""
     
     def __init__(self):
-        self.memory_cache = MemoryCache(max_size=100, ttl_seconds=300)  # 5分钟
-        self.sqlite_cache = SQLiteCache()
+        cache_settings = config_manager.get_cache_settings()
+        memory = cache_settings.get('memory', {})
+        max_mb = memory.get('max_mb', 32)
+        self.memory_cache = MemoryCache(
+            max_size=int(memory.get('max_size', 1000)),
+            ttl_seconds=int(memory.get('ttl_seconds', 300)),  # 5分钟
+            max_bytes=int(float(max_mb) * 1024 * 1024) if max_mb else None
+        )
+        self.sqlite_cache = SQLiteCache(settings=cache_settings.get('sqlite', {}))
         self.stats = {
             'hits': {'memory': 0, 'sqlite': 0, 'miss': 0},
             'operations': {'get': 0, 'set': 0, 'search': 0}
         }
     
-    def get_recent_emails(self, count: int = 10, account_type: str = 'icloud') -> List[Dict[str, Any]]:
+    def get_recent_emails(self, count: int = 10, account_type: str = 'icloud',
+                          with_content: bool = True, folder: Optional[str] = 'INBOX') -> List[Dict[str, Any]]:
         """获取最近邮件 - 优先从缓存"""
         self.stats['operations']['get'] += 1
         
-        cache_key = f"recent_{account_type}_{count}"
+        cache_key = f"recent_{account_type}_{count}_{folder or '*'}" + ("" if with_content else "_list")
         
         # L1: 内存缓存
         cached_emails = self.memory_cache.get(cache_key)
@@ -329,11 +1158,17 @@ class EmailCacheManager:
             return cached_emails
         
         # L2: SQLite缓存
-        emails = self.sqlite_cache.get_recent_emails(count, account_type)
+        emails = self.sqlite_cache.get_recent_emails(count, account_type, with_content, folder)
         if emails:
             self.stats['hits']['sqlite'] += 1
-            # 回填到内存缓存
-            self.memory_cache.set(cache_key, emails)
+            # 回填到内存缓存；列表已满时，只有不早于最后一封的邮件写入才会改变列表
+            self.memory_cache.set(cache_key, emails, {
+                'kind': 'recent',
+                'account': account_type,
+                'folder': folder,
+                'since': emails[-1].get('date_received') if len(emails) >= count else None,
+                'ids': frozenset(str(email.get('id')) for email in emails)
+            })
             return emails
         
         # 缓存未命中
@@ -341,24 +1176,92 @@ class EmailCacheManager:
         return []
     
     def store_emails(self, emails: List[Dict[str, Any]]) -> int:
-        """批量存储邮件到缓存"""
+        """批量存储邮件到缓存（整批一个事务），返回成功写入的数量"""
+        outcomes = self.store_emails_bulk(emails)
+        return sum(1 for outcome in outcomes if outcome['status'] != 'failed')
+    
+    def store_emails_bulk(self, emails: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """批量存储邮件到缓存，返回每封邮件的结果（见 SQLiteCache.store_emails_bulk）"""
         self.stats['operations']['set'] += 1
+        outcomes = self.sqlite_cache.store_emails_bulk(emails)
         
-        stored_count = 0
-        for email in emails:
-            if self.sqlite_cache.store_email(email):
-                stored_count += 1
+        written = [{
+            'id': str(outcome['id']),
+            'account': email.get('account_type', 'icloud'),
+            'folder': split_email_id(outcome['id'])[0],
+            'date': email.get('parsed_date'),
+            'indexed': outcome['status'] != 'kept_content'
+        } for email, outcome in zip(emails, outcomes) if outcome['status'] != 'failed']
+        if written:
+            self._invalidate_written(written)
         
-        # 清空相关的内存缓存
-        self.memory_cache.clear()
+        return outcomes
+    
+    def _invalidate_written(self, written: List[Dict[str, Any]]) -> int:
+        """只失效受本次写入影响的内存缓存条目
         
-        return stored_count
+        - 最近邮件列表：同账户、同文件夹且日期不早于列表最后一封（或列表未满）的写入
+        - 搜索结果：写入的邮件已在结果中，或新写入的内容匹配该查询（用全文索引判断）
+        """
+        written_ids = {change['id'] for change in written}
+        indexed_ids = [change['id'] for change in written if change['indexed']]
+        matches = {}  # 查询 -> 本次写入中匹配的邮件ID
+        # 日期可能带不同的时区偏移，按时间点比较而不是按字符串比较
+        written_dates = {change['id']: _aware_datetime(change['date']) for change in written}
+        
+        def is_newer(change: Dict[str, Any], since: Any) -> bool:
+            since = _aware_datetime(since) if since is not None else None
+            date = written_dates[change['id']]
+            # 无法解析的日期保守地视为受影响
+            return since is None or date is None or date >= since
+        
+        def affected(tags: Dict[str, Any]) -> bool:
+            if tags['ids'] & written_ids:
+                return True
+            if tags['kind'] == 'recent':
+                return any(change['account'] == tags['account']
+                           and tags['folder'] in (None, change['folder'])
+                           and is_newer(change, tags['since'])
+                           for change in written)
+            if tags['kind'] == 'search':
+                if not indexed_ids:
+                    return False
+                if tags['query'] not in matches:
+                    matches[tags['query']] = set(self.sqlite_cache.filter_matches(tags['query'], indexed_ids))
+                return any(tags['folder'] in (None, split_email_id(email_id)[0])
+                           for email_id in matches[tags['query']])
+            return True
+        
+        return self.memory_cache.invalidate_where(affected)
+    
+    def _invalidate_ids(self, email_ids) -> int:
+        """失效包含指定邮件的内存缓存条目（标记变化、删除不影响不含这些邮件的列表和搜索结果）"""
+        email_ids = {str(email_id) for email_id in email_ids}
+        return self.memory_cache.invalidate_where(lambda tags: bool(tags.get('ids', frozenset()) & email_ids))
     
-    def search_emails(self, query: str, limit: int = 20) -> List[Dict[str, Any]]:
-        """搜索邮件"""
+    def invalidate_account(self, account_type: str) -> int:
+        """失效指定账户的最近邮件列表和所有搜索结果内存缓存"""
+        return self.memory_cache.invalidate_where(
+            lambda tags: tags.get('account') == account_type or tags.get('kind') == 'search')
+    
+    def invalidate_folder(self, account_type: str, folder: str) -> int:
+        """失效依赖指定文件夹的内存缓存条目（跨文件夹的列表和搜索结果也会失效）"""
+        def affected(tags: Dict[str, Any]) -> bool:
+            if tags.get('kind') == 'recent':
+                return tags['account'] == account_type and tags['folder'] in (None, folder)
+            if tags.get('kind') == 'search':
+                return tags['folder'] in (None, folder)
+            return True
+        
+        return self.memory_cache.invalidate_where(affected)
+    
+    def search_emails(self, query: str, limit: int = 20, with_content: bool = True,
+                      folder: Optional[str] = None) -> List[Dict[str, Any]]:
+        """搜索邮件（默认跨所有文件夹）"""
         self.stats['operations']['search'] += 1
         
-        cache_key = f"search_{hashlib.md5(query.encode()).hexdigest()}_{limit}"
+        cache_key = (f"search_{hashlib.md5(query.encode()).hexdigest()}_{limit}_{folder or '*'}"
+                     + ("" if with_content else "_list"))
         
         # 检查内存缓存
         cached_results = self.memory_cache.get(cache_key)
@@ -367,16 +1270,87 @@ class EmailCacheManager:
             return cached_results
         
         # 执行搜索
-        results = self.sqlite_cache.search_emails(query, limit)
+        results = self.sqlite_cache.search_emails(query, limit, with_content, folder)
         if results:
             self.stats['hits']['sqlite'] += 1
             # 缓存搜索结果
-            self.memory_cache.set(cache_key, results)
+            self.memory_cache.set(cache_key, results, {
+                'kind': 'search',
+                'query': query,
+                'folder': folder,
+                'ids': frozenset(str(email.get('id')) for email in results)
+            })
         else:
             self.stats['hits']['miss'] += 1
         
         return results
     
+    def get_email(self, email_id: str) -> Optional[Dict[str, Any]]:
+        """获取单封缓存邮件（不经过内存缓存）"""
+        self.stats['operations']['get'] += 1
+        email_data = self.sqlite_cache.get_email(email_id)
+        if email_data:
+            self.stats['hits']['sqlite'] += 1
+        else:
+            self.stats['hits']['miss'] += 1
+        return email_data
+    
+    def get_sync_state(self, account_type: str, folder: str = 'INBOX') -> Optional[Dict[str, Any]]:
+        """获取同步检查点"""
+        return self.sqlite_cache.get_sync_state(account_type, folder)
+    
+    def update_sync_state(self, account_type: str, folder: str, uidvalidity: int, last_uid: int,
+                          highestmodseq: Optional[int] = None) -> bool:
+        """更新同步检查点"""
+        return self.sqlite_cache.update_sync_state(account_type, folder, uidvalidity, last_uid, highestmodseq)
+    
+    def get_sync_states(self, account_type: str = 'icloud') -> List[Dict[str, Any]]:
+        """获取所有已同步文件夹的检查点"""
+        return self.sqlite_cache.get_sync_states(account_type)
+    
+    def add_coverage(self, account_type: str, folder: str, uidvalidity: int,
+                     uid_start: int, uid_end: int) -> bool:
+        """记录已完整同步的UID区间"""
+        return self.sqlite_cache.add_coverage(account_type, folder, uidvalidity, uid_start, uid_end)
+    
+    def get_coverage(self, account_type: str, folder: str, uidvalidity: int) -> List[Tuple[int, int]]:
+        """获取已完整同步的UID区间"""
+        return self.sqlite_cache.get_coverage(account_type, folder, uidvalidity)
+    
+    def get_search_result(self, account_type: str, folder: str, criteria: str) -> Optional[Dict[str, Any]]:
+        """获取缓存的服务器搜索结果"""
+        return self.sqlite_cache.get_search_result(account_type, folder, criteria)
+    
+    def save_search_result(self, account_type: str, folder: str, criteria: str,
+                           uidvalidity: int, uidnext: int, uids: List[int]) -> bool:
+        """保存服务器搜索结果"""
+        return self.sqlite_cache.save_search_result(account_type, folder, criteria, uidvalidity, uidnext, uids)
+    
+    def get_header_only_uids(self, account_type: str = 'icloud', folder: str = 'INBOX') -> List[int]:
+        """获取只缓存了邮件头的UID"""
+        return self.sqlite_cache.get_header_only_uids(account_type, folder)
+    
+    def get_cached_ids(self, account_type: str = 'icloud', folder: Optional[str] = None) -> List[str]:
+        """获取已缓存的邮件ID"""
+        return self.sqlite_cache.get_cached_ids(account_type, folder)
+    
+    def get_cached_uids(self, account_type: str = 'icloud', folder: str = 'INBOX') -> List[int]:
+        """获取文件夹中已缓存邮件的UID"""
+        return self.sqlite_cache.get_cached_uids(account_type, folder)
+    
+    def get_folder_counts(self, account_type: str = 'icloud') -> Dict[str, int]:
+        """各文件夹已缓存的邮件数"""
+        return self.sqlite_cache.get_folder_counts(account_type)
+    
+    def apply_mailbox_changes(self, read_flags: Dict[str, bool], expunged_ids: List[str],
+                              account_type: str = 'icloud') -> Dict[str, int]:
+        """应用服务器端的标记变化和删除，不重新获取邮件正文"""
+        updated = self.sqlite_cache.update_read_flags(read_flags)
+        deleted = self.sqlite_cache.delete_emails(expunged_ids)
+        if updated or deleted:
+            self._invalidate_ids(list(read_flags) + list(expunged_ids))
+        return {'flags_updated': updated, 'expunged': deleted}
+    
     def get_performance_stats(self) -> Dict[str, Any]:
         """获取性能统计"""
         total_operations = sum(self.stats['operations'].values())
@@ -400,41 +1374,61 @@ class EmailCacheManager:
         self.memory_cache.clear()
         # SQLite缓存保留，只清空内存
     
-    def clear_cache(self, account_type: str = None):
+    def clear_cache(self, account_type: str = None, folder: str = None):
         """清空指定类型的缓存
         
         Args:
             account_type: 账户类型（如'icloud'），为None时清空所有缓存
+            folder: 只清空该账户下指定文件夹的缓存
         """
-        # 清空内存缓存
-        self.memory_cache.clear()
-        
+        if account_type and folder:
+            try:
+                with self.sqlite_cache.connect() as conn:
+                    scope = "SELECT id FROM emails_index WHERE account_type = ? AND folder = ?"
+                    conn.execute(f"DELETE FROM email_content WHERE email_id IN ({scope})", (account_type, folder))
+                    conn.execute("DELETE FROM emails_index WHERE account_type = ? AND folder = ?", (account_type, folder))
+                    conn.execute("DELETE FROM sync_state WHERE account_type = ? AND folder = ?", (account_type, folder))
+                    conn.execute("DELETE FROM sync_coverage WHERE account_type = ? AND folder = ?", (account_type, folder))
+                    conn.execute("DELETE FROM search_cache WHERE account_type = ? AND folder = ?", (account_type, folder))
+                    conn.commit()
+            except Exception as e:
+                # 移除print语句，避免MCP JSON解析错误
+                pass
+            # 其他文件夹的内存缓存条目不受影响
+            self.invalidate_folder(account_type, folder)
         # 如果指定了账户类型，清空对应的SQLite缓存
-        if account_type:
+        elif account_type:
             try:
-                with sqlite3.connect(self.sqlite_cache.db_path) as conn:
-                    conn.execute("DELETE FROM emails_index WHERE account_type = ?", (account_type,))
+                with self.sqlite_cache.connect() as conn:
+                    # 先删除依赖emails_index的内容（触发器同时移除全文索引），再删除索引表本身
                     conn.execute("DELETE FROM email_content WHERE email_id IN (SELECT id FROM emails_index WHERE account_type = ?)", (account_type,))
-                    conn.execute("DELETE FROM email_fts WHERE email_id IN (SELECT id FROM emails_index WHERE account_type = ?)", (account_type,))
+                    conn.execute("DELETE FROM emails_index WHERE account_type = ?", (account_type,))
+                    conn.execute("DELETE FROM sync_state WHERE account_type = ?", (account_type,))
+                    conn.execute("DELETE FROM sync_coverage WHERE account_type = ?", (account_type,))
+                    conn.execute("DELETE FROM search_cache WHERE account_type = ?", (account_type,))
                     conn.commit()
                     # 移除print语句，避免MCP JSON解析错误
                     pass
             except Exception as e:
                 # 移除print语句，避免MCP JSON解析错误  
                 pass
+            self.invalidate_account(account_type)
         else:
             # 清空所有SQLite缓存
             try:
-                with sqlite3.connect(self.sqlite_cache.db_path) as conn:
+                with self.sqlite_cache.connect() as conn:
                     conn.execute("DELETE FROM emails_index")
                     conn.execute("DELETE FROM email_content")
-                    conn.execute("DELETE FROM email_fts")
+                    conn.execute("DELETE FROM sync_state")
+                    conn.execute("DELETE FROM sync_coverage")
+                    conn.execute("DELETE FROM search_cache")
                     conn.commit()
                     # 移除print语句，避免MCP JSON解析错误
                     pass
             except Exception as e:
                 # 移除print语句，避免MCP JSON解析错误
                 pass
+            self.memory_cache.clear()
 
 
 # 全局缓存管理器实例
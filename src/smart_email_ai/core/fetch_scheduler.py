@@ -0,0 +1,118 @@
+"""
+取件优先级调度 - Smart Email AI核心组件
+
+后台同步（首次导入、多文件夹回填）和用户发起的单封邮件获取共用同一个连接池。
+调度器为每个线程标记优先级：交互请求在连接池中优先获得连接，并可使用额外保留的连接；
+批量同步每获取完一批就检查是否有交互请求在等待，有则先让出连接
+
+特性：
+- 两个优先级：interactive（默认）和 bulk（后台同步、批量导入）
+- 优先级按线程记录，并行获取的工作线程沿用提交线程的优先级
+- 按优先级统计请求延迟（p50/p95/p99，含等待连接的时间）和吞吐量
+"""
+
+import math
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Dict, List
+
+# 优先级：数值越小越优先
+INTERACTIVE = 0
+BULK = 1
+PRIORITY_NAMES = {INTERACTIVE: 'interactive', BULK: 'bulk'}
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """最近秩法计算百分位数（values无需排序）"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = math.ceil(pct / 100 * len(ordered))
+    return ordered[min(len(ordered), max(1, rank)) - 1]
+
+
+class FetchScheduler:
+    """记录线程优先级并统计各优先级的获取延迟和吞吐量"""
+
+    def __init__(self, window: int = 1000):
+        """初始化调度器
+
+        Args:
+            window: 每个优先级保留的最近请求数，用于计算百分位和吞吐量
+        """
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._window = window
+        self._classes = {priority: self._new_class() for priority in PRIORITY_NAMES}
+        self.yields = 0
+
+    def _new_class(self) -> Dict[str, Any]:
+        return {'requests': 0, 'items': 0, 'samples': deque(maxlen=self._window)}
+
+    def current_priority(self) -> int:
+        """当前线程的优先级（未设置时为交互请求）"""
+        return getattr(self._local, 'priority', INTERACTIVE)
+
+    @contextmanager
+    def priority(self, priority: int):
+        """在上下文中把当前线程标记为指定优先级"""
+        previous = getattr(self._local, 'priority', None)
+        self._local.priority = priority
+        try:
+            yield
+        finally:
+            if previous is None:
+                del self._local.priority
+            else:
+                self._local.priority = previous
+
+    @contextmanager
+    def track(self, items: int = 1):
+        """统计一次获取请求的耗时；嵌套调用只由最外层记录"""
+        depth = getattr(self._local, 'depth', 0)
+        self._local.depth = depth + 1
+        started = time.time()
+        try:
+            yield
+        finally:
+            self._local.depth = depth
+            if depth == 0:
+                self.record(self.current_priority(), started, time.time(), items)
+
+    def record(self, priority: int, started: float, ended: float, items: int = 1) -> None:
+        """记录一次已完成的请求"""
+        with self._lock:
+            stats = self._classes.get(priority)
+            if stats is None:
+                stats = self._classes[priority] = self._new_class()
+            stats['requests'] += 1
+            stats['items'] += items
+            stats['samples'].append((started, ended, items))
+
+    def record_yield(self) -> None:
+        """批量任务为交互请求让出一次连接"""
+        with self._lock:
+            self.yields += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """各优先级的请求数、延迟百分位（毫秒）和最近窗口内的吞吐量（封/秒）"""
+        with self._lock:
+            classes = {priority: (stats['requests'], stats['items'], list(stats['samples']))
+                       for priority, stats in self._classes.items()}
+            yields = self.yields
+
+        result: Dict[str, Any] = {'yields': yields}
+        for priority, (requests, items, samples) in classes.items():
+            latencies = [(ended - started) * 1000 for started, ended, _ in samples]
+            span = max(ended for _, ended, _ in samples) - min(started for started, _, _ in samples) if samples else 0
+            result[PRIORITY_NAMES.get(priority, str(priority))] = {
+                'requests': requests,
+                'items': items,
+                'p50_ms': round(percentile(latencies, 50), 1),
+                'p95_ms': round(percentile(latencies, 95), 1),
+                'p99_ms': round(percentile(latencies, 99), 1),
+                'throughput': round(sum(count for _, _, count in samples) / span, 1) if span > 0 else 0.0
+            }
+        return result
@@ -8,16 +8,55 @@ iCloud邮箱连接器 - Smart Email AI核心组件
 - SSL/TLS安全连接
 - 多编码邮件解析
 - 错误处理和连接管理
+- 连接池：多个工具调用和批量获取并行使用多条IMAP连接
+- IDLE推送：后台监听新邮件并实时写入缓存
+- 批量导入：大批量同步时多进程解析邮件
+- 多文件夹同步：LIST枚举文件夹，各文件夹独立检查点，在多条连接上并行同步
+- 传输压缩：服务器支持COMPRESS=DEFLATE时压缩所有连接的收发数据
+- 连接守护：NOOP保活，连接中断时按退避策略重连并重放一次被中断的操作
+- 搜索结果缓存：服务器搜索结果按UIDNEXT增量更新，重复搜索只查询新邮件
+- 取件优先级：后台同步为bulk优先级，查看邮件等交互请求优先获得连接
+- 自适应并发：按AIMD调整同时进行的批量FETCH数，遇到限流响应时退避重试
 - 与Smart Email AI系统集成
 """
 
+import base64
 import imaplib
+import quopri
 import ssl
 import email
 import json
-from datetime import datetime, timedelta
-from typing import Dict, List, Optional, Any
-from .email_cache import email_cache_manager
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Any, Iterator, Set, Tuple, Callable
+from .email_cache import email_cache_manager, MessageLRUCache, build_snippet, make_email_id, split_email_id
+from .imap_pool import IMAPConnectionPool
+from .imap_idle import IdleWatcher
+from .imap_compress import CompressionStats, enable_compression
+from .imap_supervisor import ConnectionSupervisor, RECOVERABLE_ERRORS, connect_with_retry
+from .fetch_scheduler import FetchScheduler, BULK
+from .rate_control import AIMDController, is_throttle_error
+from .search_planner import SearchPlanner, quote_search_string
+from .ingest_pipeline import IngestPipeline
+from .message_parser import (
+    attachment_info, attachments_from_parts, decode_header, estimate_size, extract_html_body,
+    extract_text_body, parse_date, parse_message
+)
+from .imap_protocol import (
+    build_id_set, parse_fetch_response, parse_id_set, parse_status, parse_esearch,
+    parse_envelope, parse_bodystructure, parse_list_response, quote_mailbox, as_text,
+    normalize_search_criteria
+)
+
+try:
+    from ..interfaces.config_interface import config_manager
+except ImportError:
+    # 处理直接运行时的导入问题
+    from interfaces.config_interface import config_manager
 
 
 class iCloudConnector:
@@ -34,9 +73,77 @@ class iCloudConnector:
         self.PASSWORD = password or "fsil-npvx-rbdo-vman"  # 应用专用密码
         self.IMAP_SERVER = "imap.mail.me.com"
         self.IMAP_PORT = 993
-        self.mail = None
+        self.mail = None  # 主连接（同时属于连接池）
+        self.pool = None
         self.connected = False
-        self.email_cache = {}  # 简单的邮件缓存
+        self._local = threading.local()  # 当前线程借出的连接
+        self.idle_watchers = {}  # 文件夹 -> IdleWatcher
+        self.today_source = None  # 最近一次 get_today_emails 的数据来源：cache / server
+        self.supervisor = None  # 后台保活和重连
+        self.reconnect_stats = {'replays': 0, 'replay_failures': 0, 'last_error': None}
+        self.search_cache_stats = {'hits': 0, 'incremental': 0, 'misses': 0}
+        self.fetch_scheduler = FetchScheduler()  # 线程优先级和各优先级的延迟统计
+        self.capabilities = set()
+        self.enabled_extensions = set()
+        self.message_flags = {}  # FETCH得到、尚未构建记录的邮件标记（_finalize_record 取用后删除）
+        self.message_structure = {}  # 最近一次FETCH得到的邮件大小和BODYSTRUCTURE，解析时取用
+        self.uidvalidity = {}  # 文件夹 -> 最近一次SELECT得到的UIDVALIDITY
+        self._stats_cache = {}  # 文件夹 -> (时间戳, 邮箱统计)
+        
+        performance = config_manager.get_performance_settings()
+        # 邮件对象缓存：按 (文件夹, UIDVALIDITY, UID) 索引，按字节数限制容量
+        self.email_cache = MessageLRUCache(
+            max_bytes=int(float(performance.get('message_cache_max_mb', 64)) * 1024 * 1024),
+            store_raw=bool(performance.get('message_cache_store_raw', True))
+        )
+        self.fetch_batch_size = max(1, int(performance.get('fetch_batch_size', 25)))
+        self.lazy_body_loading = bool(performance.get('lazy_body_loading', True))
+        self.max_connections = max(1, int(performance.get('concurrent_connections', 5)))
+        self.interactive_reserve = max(0, int(performance.get('interactive_reserved_connections', 1)))
+        self.idle_push = bool(performance.get('idle_push', False))
+        self.stats_ttl = float(performance.get('mailbox_stats_ttl', 30))
+        self.snippet_preview_bytes = max(0, int(performance.get('snippet_preview_bytes', 4096)))
+        self.compression = bool(performance.get('imap_compression', True))
+        self.compression_level = min(9, max(1, int(performance.get('compression_level', 6))))
+        self.compression_stats = CompressionStats()
+        folders = performance.get('folders', {}) or {}
+        self.folder_settings = {
+            'include': list(folders.get('include') or []),
+            'exclude': list(folders.get('exclude') or []),
+            'exclude_flags': [flag.lower() for flag in folders.get('exclude_flags', ['\\Junk', '\\Trash'])],
+            'parallel': int(folders.get('parallel', 0))
+        }
+        ingest = performance.get('ingest', {}) or {}
+        self.ingest_settings = {
+            'min_messages': int(ingest.get('min_messages', 200)),
+            'workers': int(ingest.get('workers', 0)) or None,
+            'fetch_queue_size': int(ingest.get('fetch_queue_size', 200)),
+            'parse_queue_size': int(ingest.get('parse_queue_size', 8)),
+            'write_queue_size': int(ingest.get('write_queue_size', 500)),
+            'write_batch_size': int(ingest.get('write_batch_size', 100))
+        }
+        
+        rate_control = performance.get('rate_control', {}) or {}
+        # 批量FETCH的并发数在 1 到连接池容量之间自适应；request_delay 为限流后的首次暂停时间
+        self.rate_controller = AIMDController(
+            max_limit=self.max_connections,
+            enabled=bool(rate_control.get('enabled', True)),
+            base_delay=float(performance.get('request_delay', 0.1)),
+            max_delay=float(rate_control.get('max_delay', 30)),
+            spike_ratio=float(rate_control.get('latency_spike_ratio', 2.5))
+        )
+        
+        self.search_coverage_max_age = float(performance.get('search_coverage_max_age', 300))
+        self.keepalive_interval = float(performance.get('keepalive_interval', 300))
+        self.min_connections = max(0, int(performance.get('keepalive_min_connections', 1)))
+        security = config_manager.get_security_settings()
+        self.connection_timeout = float(security.get('connection_timeout', 30)) or None
+        self.max_retry_attempts = max(1, int(security.get('max_retry_attempts', 3)))
+        
+        strategy = config_manager.get_cache_settings().get('strategy', {})
+        self.initial_sync_count = int(strategy.get('recent_emails_cache_count', 50))
+        
+        self.timezone = self._configured_timezone()
         
     def connect(self) -> bool:
         """连接到iCloud邮箱
@@ -45,43 +152,30 @@ class iCloudConnector:
             bool: 连接是否成功
         """
         try:
-            # 创建安全SSL上下文，处理证书验证问题
-            context = ssl.create_default_context()
+            if self.supervisor:
+                self.supervisor.stop()
+                self.supervisor = None
+            if self.pool:
+                # 重新连接时先关闭旧连接池
+                self.pool.close_all()
+                self.pool = None
             
-            # 首先尝试标准SSL连接
-            try:
-                self.mail = imaplib.IMAP4_SSL(
-                    self.IMAP_SERVER, 
-                    self.IMAP_PORT, 
-                    ssl_context=context
-                )
-                # 移除print语句，避免MCP JSON解析错误
-            except ssl.SSLError as ssl_err:
-                # 如果SSL验证失败，尝试禁用证书验证（仅用于开发/测试）
-                # 移除print语句，避免MCP JSON解析错误
-                self._log_info(f"标准SSL连接失败: {ssl_err}")
-                self._log_info("🔧 尝试使用宽松SSL设置...")
-                
-                # 创建宽松的SSL上下文
-                context = ssl.create_default_context()
-                context.check_hostname = False
-                context.verify_mode = ssl.CERT_NONE
-                
-                self.mail = imaplib.IMAP4_SSL(
-                    self.IMAP_SERVER, 
-                    self.IMAP_PORT, 
-                    ssl_context=context
-                )
-                # 移除print语句，避免MCP JSON解析错误
-                self._log_info("⚠️ 使用宽松SSL连接成功（降级模式）")
+            # 能力列表和已启用的扩展以主连接为准，其他连接（连接池、IDLE监听）不修改
+            self.mail = self._open_connection_with_retry(primary=True)
             
-            # 登录验证
-            self.mail.login(self.EMAIL, self.PASSWORD)
+            # 主连接作为连接池的第一条连接，其余连接按需创建（网络错误时退避重试）
+            self.pool = IMAPConnectionPool(self._open_connection_with_retry, max_size=self.max_connections,
+                                           interactive_reserve=self.interactive_reserve)
+            self.pool.add(self.mail, 'INBOX')
             
-            # 选择收件箱
-            self.mail.select('INBOX')
+            # 选择收件箱并记录UIDVALIDITY
+            self._select_folder('INBOX')
             
             self.connected = True
+            if self.keepalive_interval > 0:
+                # 后台保活，空闲后服务器断开的连接会被提前发现并重建
+                self.supervisor = ConnectionSupervisor(self.pool, self.keepalive_interval, self.min_connections)
+                self.supervisor.start()
             # 移除print语句，避免MCP JSON解析错误
             self._log_info("🎉 iCloud邮箱连接和登录成功")
             return True
@@ -101,9 +195,15 @@ class iCloudConnector:
             return False
     
     def disconnect(self) -> None:
-        """安全断开iCloud连接"""
+        """安全断开iCloud连接（关闭连接池中的所有连接）"""
+        self.stop_idle_watcher()
+        if self.supervisor:
+            self.supervisor.stop()
+            self.supervisor = None
         try:
-            if self.mail and self.connected:
+            if self.pool:
+                self.pool.close_all()
+            elif self.mail and self.connected:
                 self.mail.close()
                 self.mail.logout()
         except:
@@ -111,61 +211,170 @@ class iCloudConnector:
         finally:
             self.connected = False
             self.mail = None
+            self.pool = None
             self.email_cache.clear()
+            self.message_flags.clear()
+            self.message_structure.clear()
+            self.uidvalidity.clear()
+            self._stats_cache.clear()
+    
+    def start_idle_watcher(self, folder: str = 'INBOX',
+                           on_change: Callable[[Dict[str, Any]], None] = None) -> bool:
+        """启动后台IDLE监听，新邮件和删除通知到达时自动增量同步到缓存
+        
+        Args:
+            folder: 监听的文件夹
+            on_change: 每次同步完成后的回调
+            
+        Returns:
+            bool: 是否已在监听
+        """
+        if not self.connected:
+            return False
+        if 'IDLE' not in self.capabilities:
+            self._log_info("服务器不支持IDLE，跳过推送监听")
+            return False
+        
+        watcher = self.idle_watchers.get(folder)
+        if watcher and watcher.is_alive():
+            return True
+        
+        watcher = IdleWatcher(self, folder, on_change=on_change)
+        self.idle_watchers[folder] = watcher
+        watcher.start()
+        return True
     
-    def get_mailbox_stats(self) -> Dict[str, Any]:
+    def stop_idle_watcher(self, folder: str = None) -> None:
+        """停止IDLE监听（folder为None时停止全部）"""
+        folders = [folder] if folder else list(self.idle_watchers)
+        for name in folders:
+            watcher = self.idle_watchers.pop(name, None)
+            if watcher:
+                watcher.stop()
+    
+    def get_idle_status(self) -> Dict[str, Any]:
+        """获取IDLE监听状态"""
+        return {
+            folder: {'active': watcher.active, **watcher.stats}
+            for folder, watcher in self.idle_watchers.items()
+        }
+    
+    def get_message_cache_stats(self) -> Dict[str, Any]:
+        """获取邮件对象缓存统计信息"""
+        return self.email_cache.stats()
+    
+    def get_connection_health(self) -> Dict[str, Any]:
+        """获取连接守护状态：保活、重连和操作重放次数"""
+        supervisor = self.supervisor
+        return {
+            'keepalive_interval': self.keepalive_interval,
+            'supervisor_active': bool(supervisor and supervisor.is_alive()),
+            'supervisor': dict(supervisor.stats) if supervisor else {},
+            'replays': self.reconnect_stats['replays'],
+            'replay_failures': self.reconnect_stats['replay_failures'],
+            'last_error': self.reconnect_stats['last_error'],
+            'pool': self.get_pool_stats()
+        }
+    
+    def get_fetch_scheduler_stats(self) -> Dict[str, Any]:
+        """获取取件调度统计：各优先级的延迟百分位、吞吐量和让路次数"""
+        stats = self.fetch_scheduler.stats()
+        pool = self.get_pool_stats()
+        stats['priority_waits'] = pool.get('priority_waits', 0)
+        stats['interactive_reserve'] = self.interactive_reserve
+        return stats
+    
+    def get_rate_control_stats(self) -> Dict[str, Any]:
+        """获取自适应并发控制状态：当前并发上限、进行中的批次和限流/延迟突增次数"""
+        return self.rate_controller.snapshot()
+    
+    def get_compression_stats(self) -> Dict[str, Any]:
+        """获取COMPRESS=DEFLATE传输统计（压缩前后的收发字节数）"""
+        stats = self.compression_stats.snapshot()
+        stats['enabled'] = self.compression
+        stats['supported'] = 'COMPRESS=DEFLATE' in self.capabilities
+        return stats
+    
+    def get_pool_stats(self) -> Dict[str, Any]:
+        """获取连接池统计信息"""
+        if not self.pool:
+            return {'max_size': self.max_connections, 'size': 0, 'idle': 0, 'in_use': 0}
+        return self.pool.stats()
+    
+    def get_mailbox_stats(self, folder: str = 'INBOX', use_cache: bool = True) -> Dict[str, Any]:
         """获取邮箱统计信息
         
+        总数和未读数来自 STATUS，今日/本周邮件数使用 SEARCH RETURN (COUNT)
+        （服务器不支持ESEARCH时退化为普通SEARCH），结果在短时间内缓存，
+        同步到新邮件或变化时失效。
+        
+        Args:
+            folder: 统计的文件夹
+            use_cache: 是否使用统计缓存
+            
         Returns:
             Dict: 包含邮箱统计信息的字典
         """
         if not self.connected:
             return {"error": "未连接到邮箱"}
         
+        cached = self._stats_cache.get(folder)
+        if use_cache and cached and time.time() - cached[0] < self.stats_ttl:
+            return dict(cached[1])
+        
         try:
             stats = {}
+            now = datetime.now(self.timezone)
+            today = now.strftime("%d-%b-%Y")
+            week_ago = (now - timedelta(days=7)).strftime("%d-%b-%Y")
             
-            # 获取邮件总数
-            status, count = self.mail.select('INBOX')
-            stats['total_emails'] = int(count[0]) if status == 'OK' else 0
-            
-            # 获取未读邮件数
-            status, unread = self.mail.search(None, 'UNSEEN')
-            stats['unread_count'] = len(unread[0].split()) if unread[0] else 0
-            
-            # 获取今日邮件数
-            today = datetime.now().strftime("%d-%b-%Y")
-            status, today_mails = self.mail.search(None, f'SINCE {today}')
-            stats['today_count'] = len(today_mails[0].split()) if today_mails[0] else 0
+            def collect(mail: imaplib.IMAP4) -> None:
+                status, data = mail.status(quote_mailbox(folder), '(MESSAGES UNSEEN UIDNEXT)')
+                if status != 'OK' or not data or not data[0]:
+                    raise mail.error(f"STATUS {folder} 失败: {status} {data}")
+                mailbox_status = parse_status(data[-1])
+                stats['total_emails'] = mailbox_status.get('messages', 0)
+                stats['unread_count'] = mailbox_status.get('unseen', 0)
+                stats['uidnext'] = mailbox_status.get('uidnext')
+                
+                # 获取今日和本周邮件数（只返回数量）
+                stats['today_count'] = self._search_count(mail, f'SINCE {today}')
+                stats['week_count'] = self._search_count(mail, f'SINCE {week_ago}')
             
-            # 获取本周邮件数
-            week_ago = (datetime.now() - timedelta(days=7)).strftime("%d-%b-%Y")
-            status, week_mails = self.mail.search(None, f'SINCE {week_ago}')
-            stats['week_count'] = len(week_mails[0].split()) if week_mails[0] else 0
+            self._with_reconnect(collect, folder)
             
             stats['email_address'] = self.EMAIL
             stats['connection_status'] = 'connected'
             stats['last_update'] = datetime.now().isoformat()
             
-            return stats
+            self._stats_cache[folder] = (time.time(), stats)
+            return dict(stats)
             
         except Exception as e:
             return {"error": f"获取邮箱统计失败: {str(e)}"}
     
-    def search_emails(self, criteria: str) -> List[bytes]:
+    def invalidate_mailbox_stats(self, folder: str = None) -> None:
+        """使邮箱统计缓存失效（folder为None时清空全部）"""
+        if folder is None:
+            self._stats_cache.clear()
+        else:
+            self._stats_cache.pop(folder, None)
+    
+    def search_emails(self, criteria: str, folder: str = None) -> List[bytes]:
         """搜索邮件
         
         Args:
             criteria: IMAP搜索条件
+            folder: 要搜索的文件夹（默认为当前选中的文件夹）
             
         Returns:
-            List[bytes]: 邮件ID列表
+            List[bytes]: 邮件UID列表（UID在邮件被删除后不会重新编号）
         """
         if not self.connected:
             return []
         
         try:
-            status, messages = self.mail.search(None, criteria)
+            status, messages = self._with_reconnect(lambda mail: mail.uid('SEARCH', criteria), folder)
             if status == 'OK' and messages[0]:
                 return messages[0].split()
             return []
@@ -177,15 +386,16 @@ class iCloudConnector:
         """安全获取邮件对象
         
         Args:
-            mail_id: 邮件ID
+            mail_id: 邮件UID
             
         Returns:
             Optional[email.message.Message]: 邮件对象或None
         """
         # 检查缓存
-        cache_key = mail_id.decode() if isinstance(mail_id, bytes) else str(mail_id)
-        if cache_key in self.email_cache:
-            return self.email_cache[cache_key]
+        cache_key = self._message_key(mail_id)
+        cached = self.email_cache.get(cache_key) if cache_key else None
+        if cached is not None:
+            return cached
         
         try:
             # 确保mail_id是bytes类型
@@ -194,7 +404,8 @@ class iCloudConnector:
             
             # 移除print语句，避免MCP JSON解析错误
             # 修复：使用BODY.PEEK[]而不是RFC822，避免标记邮件为已读
-            status, msg_data = self.mail.fetch(mail_id, '(BODY.PEEK[])')
+            with self.fetch_scheduler.track():
+                status, msg_data = self._with_reconnect(lambda mail: mail.uid('FETCH', mail_id, '(BODY.PEEK[])'))
             # 移除print语句，避免MCP JSON解析错误
             
             if status == 'OK' and msg_data and len(msg_data) > 0:
@@ -226,8 +437,9 @@ class iCloudConnector:
                         self._log_error(f"未知的邮件数据类型: {type(raw_email)}")
                         return None
                     
-                    # 缓存邮件对象
-                    self.email_cache[cache_key] = msg
+                    # 缓存邮件对象；原始邮件长度即RFC822.SIZE
+                    if cache_key and isinstance(raw_email, bytes):
+                        self.email_cache.put(cache_key, raw_email, msg)
                     subject = self._decode_header(msg.get('Subject', '无主题'))
                     self._log_info(f"成功解析邮件: {subject[:50]}")
                     return msg
@@ -244,65 +456,282 @@ class iCloudConnector:
             self._log_error(f"详细错误: {traceback.format_exc()}")
             return None
     
-    def parse_email_content(self, msg: email.message.Message) -> Dict[str, Any]:
+    def fetch_emails_batch(self, mail_ids: List[bytes], batch_size: int = None,
+                           use_uid: bool = True) -> Iterator[Tuple[str, email.message.Message]]:
+        """批量获取邮件对象，每批只发送一条FETCH命令
+        
+        服务器返回的每个字面量到达后立即解析并产出，无需等待整批完成。
+        批次多于一个时分配到连接池的多条连接上并行获取。
+        
+        Args:
+            mail_ids: 当前选中文件夹中的邮件ID列表（序号或UID）
+            batch_size: 每批邮件数量（默认使用 performance.fetch_batch_size）
+            use_uid: mail_ids是否为UID
+            
+        Yields:
+            Tuple[str, email.message.Message]: (缓存邮件ID, 邮件对象)，按到达顺序
+        """
+        if not self.connected:
+            return
+        
+        # 序号会因删除而重新编号，只缓存按UID获取的邮件
+        folder = self._current_folder()
+        uidvalidity = self.uidvalidity.get(folder) if use_uid else None
+        pending = []
+        for mail_id in mail_ids:
+            key = mail_id.decode() if isinstance(mail_id, bytes) else str(mail_id)
+            msg = self.email_cache.get((folder, uidvalidity, int(key))) if uidvalidity is not None else None
+            if msg is not None:
+                yield make_email_id(folder, key), msg
+            else:
+                pending.append(key)
+        
+        for mail_id, raw_email, fetched in self.fetch_raw_emails(pending, batch_size, use_uid):
+            msg = email.message_from_bytes(raw_email)
+            if uidvalidity is not None:
+                self.email_cache.put((folder, uidvalidity, split_email_id(mail_id)[1]), raw_email, msg)
+            # 调用方在同一线程内随即用 _build_email_record 取用标记和结构
+            self.message_flags[mail_id] = fetched['flags']
+            self.message_structure[mail_id] = {'size': fetched['size'], 'parts': fetched['parts']}
+            try:
+                yield mail_id, msg
+            finally:
+                # 调用方未构建记录或提前停止迭代时丢弃
+                self.message_flags.pop(mail_id, None)
+                self.message_structure.pop(mail_id, None)
+    
+    def fetch_raw_emails(self, mail_ids: List[bytes], batch_size: int = None,
+                         use_uid: bool = True) -> Iterator[Tuple[str, bytes, Dict[str, Any]]]:
+        """批量获取原始邮件（不解析、不经过邮件对象缓存）
+        
+        标记和大小随原始邮件一起产出，不写入连接器的共享状态，
+        调用方可以把它们交给其他线程或进程处理。
+        
+        Args:
+            mail_ids: 当前选中文件夹中的邮件ID列表（序号或UID）
+            batch_size: 每批邮件数量（默认使用 performance.fetch_batch_size）
+            use_uid: mail_ids是否为UID
+            
+        Yields:
+            Tuple[str, bytes, Dict]: (缓存邮件ID或序号, 原始邮件bytes, flags/size/parts)，按到达顺序
+        """
+        if not self.connected or not mail_ids:
+            return
+        
+        folder = self._current_folder()
+        batch_size = batch_size or self.fetch_batch_size
+        ids = [mail_id.decode() if isinstance(mail_id, bytes) else str(mail_id) for mail_id in mail_ids]
+        # 同时获取服务器统计的邮件和各部分大小，解析时无需重新序列化邮件
+        items = '(UID FLAGS RFC822.SIZE BODYSTRUCTURE BODY.PEEK[])' if use_uid else '(FLAGS RFC822.SIZE BODYSTRUCTURE BODY.PEEK[])'
+        
+        def fetch_batch(batch: List[str]) -> Iterator[Tuple[str, bytes, Dict[str, Any]]]:
+            for seq, attrs in self._stream_fetch(build_id_set(batch), items, use_uid):
+                raw_email = attrs.get('BODY[]')
+                if not raw_email:
+                    continue
+                mail_id = make_email_id(folder, attrs.get('UID', seq)) if use_uid else str(seq)
+                yield mail_id, raw_email, self._fetched_metadata(attrs)
+        
+        batches = [ids[start:start + batch_size] for start in range(0, len(ids), batch_size)]
+        # 序号只在当前连接上有效，不能分配到其他连接
+        yield from self._map_batches(batches, fetch_batch, parallel=use_uid)
+    
+    def fetch_envelopes(self, mail_ids: List[bytes], batch_size: int = None,
+                        with_snippets: bool = True) -> List[Dict[str, Any]]:
+        """列表模式：只获取邮件头信息，不下载正文和附件
+        
+        每封邮件只传输 ENVELOPE、RFC822.SIZE、FLAGS、BODYSTRUCTURE 和 INTERNALDATE，
+        返回的记录 body_loaded 为 False，正文在首次需要时再通过 get_email_content 加载。
+        启用摘要预览时，每批再获取主文本部分的前几KB（BODY.PEEK[1]<0.4096>）生成snippet。
+        
+        Args:
+            mail_ids: 当前选中文件夹中的邮件UID列表
+            batch_size: 每批邮件数量（默认使用 performance.fetch_batch_size）
+            with_snippets: 是否获取正文开头生成摘要（performance.snippet_preview_bytes 为0时不获取）
+            
+        Returns:
+            List[Dict]: 邮件头记录，按服务器返回顺序
+        """
+        if not self.connected or not mail_ids:
+            return []
+        
+        folder = self._current_folder()
+        batch_size = batch_size or self.fetch_batch_size
+        ids = [mail_id.decode() if isinstance(mail_id, bytes) else str(mail_id) for mail_id in mail_ids]
+        items = '(UID FLAGS RFC822.SIZE INTERNALDATE ENVELOPE BODYSTRUCTURE)'
+        
+        with_snippets = with_snippets and self.snippet_preview_bytes > 0
+        
+        def fetch_batch(batch: List[str]) -> Iterator[Dict[str, Any]]:
+            records = {}
+            parts_by_uid = {}
+            for seq, attrs in self._stream_fetch(build_id_set(batch), items, use_uid=True):
+                if 'UID' not in attrs:
+                    continue
+                try:
+                    uid = str(attrs['UID'])
+                    parts = parse_bodystructure(attrs.get('BODYSTRUCTURE'))
+                    record = self._build_envelope_record(make_email_id(folder, uid), attrs, parts)
+                except Exception as e:
+                    self._log_error(f"邮件头解析失败 (UID: {attrs.get('UID')}): {str(e)}")
+                    continue
+                if not with_snippets:
+                    yield record
+                    continue
+                records[uid] = record
+                parts_by_uid[uid] = parts
+            
+            if records:
+                # 在同一连接上获取本批邮件的正文开头
+                for uid, snippet in self._fetch_snippets(parts_by_uid).items():
+                    records[uid]['snippet'] = snippet
+                yield from records.values()
+        
+        batches = [ids[start:start + batch_size] for start in range(0, len(ids), batch_size)]
+        return list(self._map_batches(batches, fetch_batch))
+    
+    def _fetch_snippets(self, parts_by_uid: Dict[str, List[Dict[str, Any]]]) -> Dict[str, str]:
+        """只获取每封邮件主文本部分的前几KB并生成摘要
+        
+        主文本部分编号相同的邮件（通常为 1 或 1.1）合并为一条FETCH命令。
+        
+        Args:
+            parts_by_uid: 邮件UID -> BODYSTRUCTURE叶子部分
+            
+        Returns:
+            Dict[str, str]: 邮件UID -> 摘要
+        """
+        by_section = {}
+        for mail_id, parts in parts_by_uid.items():
+            part = self._primary_text_part(parts)
+            if part:
+                by_section.setdefault(part['part'], {})[mail_id] = part
+        
+        snippets = {}
+        for section, targets in by_section.items():
+            items = f'(UID BODY.PEEK[{section}]<0.{self.snippet_preview_bytes}>)'
+            try:
+                for seq, attrs in self._stream_fetch(build_id_set(targets), items, use_uid=True):
+                    mail_id = str(attrs.get('UID'))
+                    data = next((value for key, value in attrs.items()
+                                 if key.upper().startswith(f'BODY[{section}]')), None)
+                    if mail_id in targets and isinstance(data, bytes):
+                        snippets[mail_id] = self._decode_preview(data, targets[mail_id])
+            except imaplib.IMAP4.error as e:
+                self._log_error(f"获取正文预览失败 (部分 {section}): {str(e)}")
+        return snippets
+    
+    @staticmethod
+    def _primary_text_part(parts: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        """选择用于预览的正文部分：优先text/plain，其次text/html"""
+        for content_type in ('text/plain', 'text/html'):
+            for part in parts:
+                if part['content_type'] == content_type and part['disposition'] != 'attachment':
+                    return part
+        return None
+    
+    def _decode_preview(self, data: bytes, part: Dict[str, Any]) -> str:
+        """解码截断的正文片段并生成摘要（截断处不完整的编码直接丢弃）"""
+        encoding = part.get('encoding')
+        try:
+            if encoding == 'base64':
+                data = b''.join(data.split())
+                data = base64.b64decode(data[:len(data) - len(data) % 4])
+            elif encoding == 'quoted-printable':
+                data = quopri.decodestring(data)
+        except Exception:
+            return ''
+        charset = part.get('params', {}).get('charset') or 'utf-8'
+        try:
+            text = data.decode(charset, errors='ignore')
+        except LookupError:
+            text = data.decode('utf-8', errors='ignore')
+        return build_snippet(text, html=part['content_type'] == 'text/html')
+    
+    def _stream_fetch(self, id_set: str, items: str, use_uid: bool = False) -> Iterator[Tuple[int, Dict[str, Any]]]:
+        """发送一条FETCH命令，并在响应到达时逐封产出解析结果
+        
+        直接驱动imaplib的响应读取循环，而不是等待整个命令完成后再处理。
+        
+        Raises:
+            imaplib.IMAP4.error: FETCH命令返回NO/BAD
+        """
+        with self._connection() as conn:
+            conn.untagged_responses.pop('FETCH', None)
+            if use_uid:
+                tag = conn._command('UID', 'FETCH', id_set, items)
+            else:
+                tag = conn._command('FETCH', id_set, items)
+            
+            try:
+                while conn.tagged_commands.get(tag) is None:
+                    conn._get_response()
+                    fragments = conn.untagged_responses.pop('FETCH', None)
+                    if fragments:
+                        for seq, attrs in parse_fetch_response(fragments):
+                            yield seq, attrs
+            except GeneratorExit:
+                # 调用方提前停止迭代时，读完剩余响应以保持连接状态一致
+                while conn.tagged_commands.get(tag) is None:
+                    conn._get_response()
+                conn.untagged_responses.pop('FETCH', None)
+                conn.tagged_commands.pop(tag, None)
+                raise
+            
+            typ, data = conn.tagged_commands.pop(tag)
+            if typ != 'OK':
+                raise conn.error(f"FETCH {id_set} 失败: {typ} {data}")
+    
+    def parse_email_content(self, msg: email.message.Message, size: int = None,
+                            parts: List[Dict[str, Any]] = None) -> Dict[str, Any]:
         """解析邮件内容为结构化数据
         
         Args:
             msg: 邮件对象
+            size: 服务器返回的RFC822.SIZE（未提供时估算）
+            parts: 服务器返回的BODYSTRUCTURE叶子部分，用于附件信息和大小
             
         Returns:
             Dict: 结构化的邮件数据
         """
-        try:
-            parsed = {
-                'subject': self._decode_header(msg.get('Subject', '')),
-                'sender': self._decode_header(msg.get('From', '')),
-                'recipient': self._decode_header(msg.get('To', '')),
-                'date': msg.get('Date', ''),
-                'message_id': msg.get('Message-ID', ''),
-                'body_text': self._extract_text_body(msg),
-                'body_html': self._extract_html_body(msg),
-                'attachments': self._get_attachment_info(msg),
-                'is_multipart': msg.is_multipart(),
-                'content_type': msg.get_content_type(),
-                'size': self._estimate_size(msg)
-            }
-            
-            # 添加计算字段
-            parsed['body_length'] = len(parsed['body_text'])
-            parsed['has_attachments'] = len(parsed['attachments']) > 0
-            parsed['parsed_date'] = self._parse_date(parsed['date'])
-            
-            return parsed
-            
-        except Exception as e:
-            self._log_error(f"邮件解析失败: {str(e)}")
-            return {
-                'error': f"邮件解析失败: {str(e)}",
-                'subject': '解析失败',
-                'body_text': '邮件内容解析失败'
-            }
-    
-    def get_recent_emails(self, count: int = 10, use_cache: bool = True) -> List[Dict[str, Any]]:
+        parsed = parse_message(msg, size, parts)
+        if 'error' in parsed:
+            self._log_error(parsed['error'])
+        return parsed
+    
+    def get_recent_emails(self, count: int = 10, use_cache: bool = True,
+                          with_bodies: bool = True) -> List[Dict[str, Any]]:
         """获取最近的邮件列表（带缓存优化）
         
         Args:
             count: 要获取的邮件数量
             use_cache: 是否使用缓存
+            with_bodies: 是否需要邮件正文；为False时只返回邮件头（列表模式）
             
         Returns:
             List[Dict]: 解析后的邮件数据列表
         """
-        # 🚀 优先从缓存获取
+        # 🚀 优先从缓存获取（列表模式只读取索引和摘要）
         if use_cache:
-            cached_emails = email_cache_manager.get_recent_emails(count, 'icloud')
+            cached_emails = email_cache_manager.get_recent_emails(count, 'icloud', with_content=with_bodies)
             if cached_emails:
                 # 移除print语句，避免MCP JSON解析错误
-                return cached_emails
+                if with_bodies:
+                    return self.load_missing_bodies(cached_emails)
+                return [self._normalize_cached_email(e) for e in cached_emails]
         
         if not self.connected:
             return []
         
+        # 缓存为空时通过增量同步填充缓存，再从缓存读取
+        if use_cache:
+            self.sync_new_emails(initial_count=max(count, self.initial_sync_count))
+            cached_emails = email_cache_manager.get_recent_emails(count, 'icloud', with_content=with_bodies)
+            if cached_emails:
+                if with_bodies:
+                    return self.load_missing_bodies(cached_emails)
+                return [self._normalize_cached_email(e) for e in cached_emails]
+        
         try:
             # 移除print语句，避免MCP JSON解析错误
             start_time = datetime.now()
@@ -316,60 +745,25 @@ class iCloudConnector:
             recent_ids = mail_ids[-count:] if len(mail_ids) >= count else mail_ids
             recent_ids.reverse()  # 最新的在前面
             
-            emails = []
-            for i, mail_id in enumerate(recent_ids, 1):
-                try:
-                    # 获取邮件对象
-                    msg = self.fetch_email(mail_id)
-                    if msg:
-                        # 解析邮件内容
-                        parsed_email = self.parse_email_content(msg)
-                        
-                        # 添加额外字段
-                        parsed_email['mail_id'] = mail_id.decode() if isinstance(mail_id, bytes) else str(mail_id)
-                        parsed_email['account_type'] = 'icloud'
-                        
-                        # 格式化日期字段供缓存使用
-                        if parsed_email.get('parsed_date'):
-                            parsed_email['date_received'] = parsed_email['parsed_date']
-                        
-                        # 计算重要性分数（简单算法）
-                        importance_score = 50  # 基础分数
-                        subject = parsed_email.get('subject', '').lower()
-                        
-                        # 重要关键词加分
-                        important_keywords = ['urgent', '紧急', '重要', 'important', 'asap', '立即']
-                        for keyword in important_keywords:
-                            if keyword in subject:
-                                importance_score += 20
-                                break
-                        
-                        # 有附件加分
-                        if parsed_email.get('has_attachments', False):
-                            importance_score += 10
-                        
-                        # 邮件长度影响
-                        body_length = parsed_email.get('body_length', 0)
-                        if body_length > 1000:
-                            importance_score += 5
-                        elif body_length < 100:
-                            importance_score -= 10
-                        
-                        parsed_email['importance_score'] = min(100, max(0, importance_score))
-                        
-                        emails.append(parsed_email)
-                        
-                        # 添加调试信息
-                        date_info = parsed_email.get('date', '无日期')[:19]
-                        # 移除print语句，避免MCP JSON解析错误
-                        pass
-                    else:
+            # 按批次一次性获取，边接收边解析
+            parsed_by_id = {}
+            if with_bodies:
+                for mail_id, msg in self.fetch_emails_batch(recent_ids):
+                    try:
+                        parsed_by_id[mail_id] = self._build_email_record(mail_id, msg)
+                    except Exception as e:
                         # 移除print语句，避免MCP JSON解析错误
-                        pass
-                        
-                except Exception as e:
-                    # 移除print语句，避免MCP JSON解析错误
-                    continue
+                        continue
+            else:
+                for record in self.fetch_envelopes(recent_ids):
+                    parsed_by_id[record['mail_id']] = record
+            
+            # 恢复最新在前的顺序
+            emails = []
+            for mail_id in recent_ids:
+                key = mail_id.decode() if isinstance(mail_id, bytes) else str(mail_id)
+                if key in parsed_by_id:
+                    emails.append(parsed_by_id[key])
             
             # 💾 存储到缓存以加速后续访问
             if emails and use_cache:
@@ -391,9 +785,359 @@ class iCloudConnector:
             self._log_error(f"详细错误: {traceback.format_exc()}")
             return []
     
+    def sync_new_emails(self, folder: str = 'INBOX', initial_count: int = None,
+                        fetch_bodies: bool = None) -> Dict[str, Any]:
+        """基于UID检查点增量同步邮件到缓存
+        
+        只获取 UID last_uid+1:* 范围内的新邮件；仅当UIDVALIDITY变化
+        （或尚无检查点）时才清空该文件夹的缓存并重新同步最近的邮件。
+        
+        Args:
+            folder: 要同步的文件夹
+            initial_count: 全量同步时获取的最近邮件数量
+            fetch_bodies: 是否同时下载正文（默认由 performance.lazy_body_loading 决定）
+            
+        Returns:
+            Dict: 同步结果，包含 mode (full/incremental/unchanged) 和 fetched 数量
+        """
+        if not self.connected:
+            return {"error": "未连接到邮箱"}
+        
+        try:
+            # 后台同步使用bulk优先级，每批之间为交互请求让出连接
+            with self.fetch_scheduler.priority(BULK):
+                # 连接中断时在新连接上重新执行一次（检查点只在完成后更新，重放是安全的）
+                return self._with_reconnect(lambda mail: self._sync_folder(folder, initial_count, fetch_bodies), folder)
+            
+        except Exception as e:
+            self._log_error(f"增量同步失败: {str(e)}")
+            return {"error": f"增量同步失败: {str(e)}"}
+    
+    def _sync_folder(self, folder: str, initial_count: int = None,
+                     fetch_bodies: bool = None) -> Dict[str, Any]:
+        """sync_new_emails 的实现：在一条连接上完成选择、比对和获取"""
+        # 选择、比对和获取都在同一条连接上完成，保证UIDNEXT等状态一致
+        with self._connection(folder):
+            mailbox = self._select_folder(folder)
+            uidvalidity = mailbox.get('uidvalidity')
+            uidnext = mailbox.get('uidnext')
+            state = email_cache_manager.get_sync_state('icloud', folder)
+            changes = {'flags_updated': 0, 'expunged': 0}
+        
+            if state and uidvalidity is not None and state['uidvalidity'] == uidvalidity:
+                mode = 'incremental'
+                last_uid = state['last_uid'] or 0
+            
+                # 先同步已缓存邮件的标记变化和删除（不获取正文）
+                changes = self.sync_flag_changes(mailbox, state)
+            
+                if uidnext is not None and uidnext <= last_uid + 1:
+                    new_uids = []
+                else:
+                    # n+1:* 总会包含当前最大UID，需要过滤掉已同步的部分
+                    new_uids = [uid for uid in self.search_emails(f'UID {last_uid + 1}:*')
+                                if int(uid) > last_uid]
+                if not new_uids and not changes['flags_updated'] and not changes['expunged']:
+                    mode = 'unchanged'
+            else:
+                # UIDVALIDITY变化：原有UID全部失效，需要全量重新同步
+                mode = 'full'
+                email_cache_manager.clear_cache('icloud', folder)
+                self.email_cache.discard_folder(folder, keep_uidvalidity=uidvalidity)
+                last_uid = 0
+                all_uids = self.search_emails('ALL')
+                count = initial_count or self.initial_sync_count
+                new_uids = all_uids[-count:] if count > 0 else []
+        
+            if fetch_bodies is None:
+                fetch_bodies = not self.lazy_body_loading
+        
+            emails = []
+            fetched = 0
+            if fetch_bodies and len(new_uids) >= self.ingest_settings['min_messages']:
+                # 大批量导入：多进程解析，单线程批量写入
+                fetched = self.ingest_emails(new_uids, folder)['stored']
+            elif fetch_bodies:
+                for mail_id, msg in self.fetch_emails_batch(new_uids):
+                    try:
+                        emails.append(self._build_email_record(mail_id, msg))
+                    except Exception:
+                        continue
+            else:
+                # 列表模式：只写入邮件头，正文按需加载
+                emails = self.fetch_envelopes(new_uids)
+        
+            stored = fetched
+            if emails:
+                stored = email_cache_manager.store_emails(emails)
+                fetched = len(emails)
+            if mode != 'unchanged':
+                self.invalidate_mailbox_stats(folder)
+        
+            highest_uid = max([last_uid] + [int(uid) for uid in new_uids])
+            if uidnext is not None:
+                highest_uid = max(highest_uid, uidnext - 1)
+            if uidvalidity is not None:
+                email_cache_manager.update_sync_state('icloud', folder, uidvalidity, highest_uid,
+                                                      mailbox.get('highestmodseq'))
+                # 本次范围内的邮件全部写入缓存后记录为已覆盖，搜索时无需再到服务器查找
+                if stored >= len(new_uids):
+                    if mode != 'full':
+                        coverage_start = last_uid + 1
+                    elif len(new_uids) == len(all_uids):
+                        coverage_start = 1
+                    else:
+                        coverage_start = min((int(uid) for uid in new_uids), default=highest_uid + 1)
+                    email_cache_manager.add_coverage('icloud', folder, uidvalidity, coverage_start, highest_uid)
+        
+            return {'mode': mode, 'fetched': fetched, 'folder': folder,
+                    'uidvalidity': uidvalidity, 'last_uid': highest_uid,
+                    'flags_updated': changes['flags_updated'], 'expunged': changes['expunged']}
+    
+    def ingest_emails(self, mail_ids: List[bytes], folder: str = 'INBOX') -> Dict[str, Any]:
+        """通过导入流水线批量下载、解析并缓存邮件
+        
+        获取、解析（进程池）和写入（单线程）三个阶段之间使用有界队列，
+        适合首次同步等大批量导入场景。
+        
+        Args:
+            mail_ids: 邮件UID列表
+            folder: 邮件所在文件夹
+            
+        Returns:
+            Dict: fetched / parsed / stored / failed 数量和耗时
+        """
+        settings = self.ingest_settings
+        pipeline = IngestPipeline(
+            self,
+            workers=settings['workers'],
+            fetch_queue_size=settings['fetch_queue_size'],
+            parse_queue_size=settings['parse_queue_size'],
+            write_queue_size=settings['write_queue_size'],
+            write_batch_size=settings['write_batch_size']
+        )
+        result = pipeline.run(mail_ids, folder)
+        self._log_info(f"批量导入完成: {result}")
+        return result
+    
+    def list_folders(self, include_excluded: bool = False) -> List[Dict[str, Any]]:
+        """通过LIST枚举可选中的文件夹
+        
+        跳过 \\Noselect / \\NonExistent 文件夹；默认还跳过 performance.folders 中
+        exclude 列出的名称和带 exclude_flags（如 \\Junk、\\Trash）标记的文件夹。
+        配置了 include 时只保留其中的文件夹。
+        
+        Args:
+            include_excluded: 是否包含被配置排除的文件夹
+            
+        Returns:
+            List[Dict]: name / display_name / delimiter / flags，收件箱在最前
+        """
+        if not self.connected:
+            return []
+        
+        try:
+            status, data = self._with_reconnect(lambda mail: mail.list())
+            if status != 'OK':
+                raise imaplib.IMAP4.error(f"LIST失败: {data}")
+        except Exception as e:
+            self._log_error(f"获取文件夹列表失败: {str(e)}")
+            return []
+        
+        settings = self.folder_settings
+        folders = []
+        for folder in parse_list_response(data or []):
+            if folder['flags'] & {'\\noselect', '\\nonexistent'}:
+                continue
+            if folder['name'].upper() == 'INBOX':
+                folder['name'] = 'INBOX'
+            if not include_excluded and folder['name'] != 'INBOX':
+                if settings['include'] and folder['name'] not in settings['include']:
+                    continue
+                if folder['name'] in settings['exclude'] or folder['flags'] & set(settings['exclude_flags']):
+                    continue
+            folder['flags'] = sorted(folder['flags'])
+            folders.append(folder)
+        folders.sort(key=lambda folder: folder['name'] != 'INBOX')
+        return folders
+    
+    def sync_all_folders(self, folders: List[str] = None, initial_count: int = None,
+                         fetch_bodies: bool = None) -> Dict[str, Any]:
+        """同步多个文件夹，每个文件夹在自己的连接上独立执行增量同步
+        
+        各文件夹使用独立的UID检查点（sync_state），互不影响；一个文件夹同步失败
+        不会影响其他文件夹。单个文件夹同步时可能同时占用两条连接（同步本身和
+        批量导入的获取线程），因此并行数不超过连接池容量的一半。
+        
+        Args:
+            folders: 要同步的文件夹名称，默认为 list_folders() 的结果
+            initial_count: 各文件夹全量同步时获取的最近邮件数量
+            fetch_bodies: 是否同时下载正文
+            
+        Returns:
+            Dict: folders（文件夹 -> 同步结果）、fetched 总数、failed 文件夹数和耗时
+        """
+        if not self.connected:
+            return {"error": "未连接到邮箱"}
+        
+        started = time.time()
+        if folders is None:
+            folders = [folder['name'] for folder in self.list_folders()]
+        folders = list(dict.fromkeys(folders))
+        if not folders:
+            return {'folders': {}, 'fetched': 0, 'failed': 0, 'elapsed': 0.0}
+        
+        limit = max(1, (self.pool.max_size - 1) // 2) if self.pool else 1
+        if self.folder_settings['parallel'] > 0:
+            limit = min(limit, self.folder_settings['parallel'])
+        workers = min(len(folders), limit)
+        
+        def run(folder: str) -> Dict[str, Any]:
+            return self.sync_new_emails(folder, initial_count=initial_count, fetch_bodies=fetch_bodies)
+        
+        results = {}
+        if workers <= 1 or getattr(self._local, 'conn', None) is not None:
+            for folder in folders:
+                results[folder] = run(folder)
+        else:
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='imap-folder-sync') as executor:
+                futures = {executor.submit(run, folder): folder for folder in folders}
+                for future in as_completed(futures):
+                    results[futures[future]] = future.result()
+        
+        return {
+            'folders': {folder: results[folder] for folder in folders},
+            'fetched': sum(result.get('fetched', 0) for result in results.values()),
+            'failed': sum(1 for result in results.values() if 'error' in result),
+            'elapsed': round(time.time() - started, 3)
+        }
+    
+    def sync_flag_changes(self, mailbox: Dict[str, Any], state: Dict[str, Any]) -> Dict[str, int]:
+        """把服务器上的已读标记变化和删除同步到缓存
+        
+        优先使用QRESYNC（CHANGEDSINCE + VANISHED），其次CONDSTORE（CHANGEDSINCE +
+        UID列表比对），服务器都不支持时退化为只获取UID和FLAGS的全量比对。
+        
+        Args:
+            mailbox: _select_folder 返回的已选中文件夹状态
+            state: 该文件夹的同步检查点
+            
+        Returns:
+            Dict: flags_updated 和 expunged 数量
+        """
+        folder = mailbox['folder']
+        last_uid = state.get('last_uid') or 0
+        cached_uids = [uid for uid in email_cache_manager.get_cached_uids('icloud', folder) if uid <= last_uid]
+        cached_ids = {make_email_id(folder, uid) for uid in cached_uids}
+        if not cached_uids:
+            return {'flags_updated': 0, 'expunged': 0}
+        
+        uid_range = f"{cached_uids[0]}:{last_uid}"
+        stored_modseq = state.get('highestmodseq') or 0
+        current_modseq = mailbox.get('highestmodseq')
+        use_modseq = (bool(stored_modseq) and current_modseq is not None
+                      and 'CONDSTORE' in self.capabilities)
+        
+        if use_modseq and current_modseq <= stored_modseq:
+            # 自上次同步以来文件夹没有任何变化
+            return {'flags_updated': 0, 'expunged': 0}
+        
+        if use_modseq and 'QRESYNC' in self.enabled_extensions:
+            flags, vanished = self._fetch_flags(uid_range, f'(CHANGEDSINCE {stored_modseq} VANISHED)')
+            expunged = list(vanished)
+        elif use_modseq:
+            flags, _ = self._fetch_flags(uid_range, f'(CHANGEDSINCE {stored_modseq})')
+            existing = {int(uid) for uid in self.search_emails(f'UID {uid_range}')}
+            expunged = [uid for uid in cached_uids if uid not in existing]
+        else:
+            flags, _ = self._fetch_flags(uid_range)
+            expunged = [uid for uid in cached_uids if uid not in flags]
+        
+        read_flags = {make_email_id(folder, uid): '\\Seen' in uid_flags
+                      for uid, uid_flags in flags.items() if make_email_id(folder, uid) in cached_ids}
+        expunged_ids = [make_email_id(folder, uid) for uid in expunged]
+        for uid, email_id in zip(expunged, expunged_ids):
+            self.email_cache.pop((folder, mailbox.get('uidvalidity'), int(uid)))
+            self.message_flags.pop(email_id, None)
+        
+        return email_cache_manager.apply_mailbox_changes(
+            read_flags, [email_id for email_id in expunged_ids if email_id in cached_ids])
+    
+    def get_email_content(self, mail_id: str) -> Optional[Dict[str, Any]]:
+        """获取单封邮件的完整内容，正文未缓存时从服务器加载并写入缓存
+        
+        Args:
+            mail_id: 缓存邮件ID（收件箱为UID，其他文件夹为 "文件夹:UID"）
+            
+        Returns:
+            Optional[Dict]: 含正文的邮件数据，找不到时返回None
+        """
+        mail_id = mail_id.decode() if isinstance(mail_id, bytes) else str(mail_id)
+        cached = email_cache_manager.get_email(mail_id)
+        if cached and cached.get('body_loaded'):
+            return self._normalize_cached_email(cached)
+        
+        with self.fetch_scheduler.track():
+            loaded = self.load_missing_bodies([cached or {'id': mail_id, 'body_loaded': False}])
+        if loaded and loaded[0].get('body_loaded'):
+            return self._normalize_cached_email(loaded[0])
+        return self._normalize_cached_email(cached) if cached else None
+    
+    def load_missing_bodies(self, emails: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """为只有邮件头的记录批量加载正文（一次FETCH），并写回缓存
+        
+        Args:
+            emails: 缓存或列表模式返回的邮件记录
+            
+        Returns:
+            List[Dict]: 同顺序的记录，已加载的正文合并到对应记录中
+        """
+        missing = [e.get('id', e.get('mail_id')) for e in emails
+                   if not e.get('body_loaded', True) and e.get('id', e.get('mail_id'))]
+        if not missing or not self.connected:
+            return emails
+        
+        # 按文件夹分组，每个文件夹在选中该文件夹的连接上获取
+        uids_by_folder = {}
+        for email_id in missing:
+            folder, uid = split_email_id(email_id)
+            if uid is not None:
+                uids_by_folder.setdefault(folder, []).append(str(uid))
+        
+        def load_folder(folder: str, uids: List[str]) -> Dict[str, Dict[str, Any]]:
+            if folder not in self.uidvalidity:
+                self._select_folder(folder)
+            return {mail_id: self._build_email_record(mail_id, msg)
+                    for mail_id, msg in self.fetch_emails_batch(uids)}
+        
+        loaded = {}
+        for folder, uids in uids_by_folder.items():
+            try:
+                loaded.update(self._with_reconnect(lambda mail: load_folder(folder, uids), folder))
+            except Exception as e:
+                self._log_error(f"加载邮件正文失败 ({folder}): {str(e)}")
+        
+        if loaded:
+            email_cache_manager.store_emails(list(loaded.values()))
+        
+        result = []
+        for email_data in emails:
+            record = loaded.get(str(email_data.get('id', email_data.get('mail_id'))))
+            if record:
+                merged = dict(email_data)
+                merged.update(record)
+                merged['body_loaded'] = True
+                result.append(merged)
+            else:
+                result.append(email_data)
+        return result
+    
     def search_emails_by_content(self, query: str, max_results: int = 20, use_cache: bool = True) -> List[Dict[str, Any]]:
         """根据内容搜索邮件（带缓存优化）
         
+        服务器搜索的UID结果会被缓存，再次搜索时只查询新邮件；
+        已缓存正文的邮件直接从本地读取，其余邮件一次批量获取并写入缓存。
+        
         Args:
             query: 搜索关键词
             max_results: 最大结果数量
@@ -414,153 +1158,776 @@ class iCloudConnector:
         
         try:
             # 移除print语句，避免MCP JSON解析错误
-            start_time = datetime.now()
-            
-            # 构建IMAP搜索条件
-            search_criteria = f'(OR (OR SUBJECT "{query}" FROM "{query}") BODY "{query}")'
-            mail_ids = self.search_emails(search_criteria)
+            text = quote_search_string(query)
+            uids = self.search_uids_cached(f'(OR (OR SUBJECT {text} FROM {text}) BODY {text})')
             
-            # 限制结果数量
-            search_results = mail_ids[-max_results:] if len(mail_ids) > max_results else mail_ids
-            search_results.reverse()
+            # 最新的邮件在前，限制结果数量
+            email_ids = [make_email_id('INBOX', uid) for uid in sorted(uids, reverse=True)[:max_results]]
+            records = [email_cache_manager.get_email(email_id) or {'id': email_id, 'body_loaded': False}
+                       for email_id in email_ids]
             
             emails = []
-            for mail_id in search_results:
-                msg = self.fetch_email(mail_id)
-                if msg:
-                    parsed_email = self.parse_email_content(msg)
-                    parsed_email['mail_id'] = mail_id.decode()
-                    parsed_email['account_type'] = 'icloud'
+            for record in self.load_missing_bodies(records):
+                # 搜索结果缓存后已被删除的邮件无法加载，跳过
+                if record.get('body_loaded') or record.get('subject'):
+                    parsed_email = self._normalize_cached_email(record)
                     parsed_email['search_query'] = query
                     emails.append(parsed_email)
+            return emails
             
-            elapsed_time = (datetime.now() - start_time).total_seconds()
-            # 移除print语句，避免MCP JSON解析错误
+        except Exception as e:
+            self._log_error(f"邮件搜索失败: {str(e)}")
+            return []
+    
+    def search_uids_cached(self, criteria: str, folder: str = 'INBOX') -> List[int]:
+        """带结果缓存的服务器UID搜索
+        
+        结果按规范化的搜索条件缓存，并记录当时的UIDVALIDITY和UIDNEXT。
+        UIDVALIDITY未变时，重复搜索只在 UIDNEXT 之后的新邮件中查询并合并结果；
+        UIDNEXT也未变时不发送SEARCH。
+        
+        Args:
+            criteria: IMAP搜索条件（只适用于不随标记变化的条件，如文本搜索）
+            folder: 要搜索的文件夹
             
-            return emails
+        Returns:
+            List[int]: 匹配的UID（升序）
+        """
+        if not self.connected:
+            return []
+        
+        key = normalize_search_criteria(criteria)
+        cached = email_cache_manager.get_search_result('icloud', folder, key)
+        
+        def search(mail: imaplib.IMAP4) -> List[int]:
+            status, data = mail.status(quote_mailbox(folder), '(UIDVALIDITY UIDNEXT)')
+            mailbox = parse_status(data[-1]) if status == 'OK' and data and data[0] else {}
+            uidvalidity, uidnext = mailbox.get('uidvalidity'), mailbox.get('uidnext')
             
+            if cached and uidvalidity is not None and uidnext is not None \
+                    and cached['uidvalidity'] == uidvalidity:
+                if uidnext <= cached['uidnext']:
+                    self.search_cache_stats['hits'] += 1
+                    return cached['uids']
+                # 只搜索上次搜索之后到达的邮件（n:* 在没有更大UID时会返回最大UID，需过滤）
+                status, data = mail.uid('SEARCH', f"UID {cached['uidnext']}:* {criteria}")
+                if status != 'OK':
+                    raise mail.error(f"SEARCH 失败: {status} {data}")
+                found = [int(uid) for uid in (data[0].split() if data and data[0] else [])]
+                uids = sorted(set(cached['uids']) | {uid for uid in found if uid >= cached['uidnext']})
+                self.search_cache_stats['incremental'] += 1
+            else:
+                status, data = mail.uid('SEARCH', criteria)
+                if status != 'OK':
+                    raise mail.error(f"SEARCH 失败: {status} {data}")
+                uids = sorted(int(uid) for uid in (data[0].split() if data and data[0] else []))
+                self.search_cache_stats['misses'] += 1
+            
+            if uidvalidity is not None and uidnext is not None:
+                email_cache_manager.save_search_result('icloud', folder, key, uidvalidity, uidnext, uids)
+            return uids
+        
+        try:
+            return self._with_reconnect(search, folder)
         except Exception as e:
             self._log_error(f"邮件搜索失败: {str(e)}")
             return []
     
-    # 私有辅助方法
+    def search_hybrid(self, query: str, max_results: int = 20) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+        """按缓存覆盖范围规划的混合搜索：本地全文索引 + 只针对未覆盖UID区间的服务器搜索
+        
+        Args:
+            query: 搜索关键词
+            max_results: 最大结果数量
+            
+        Returns:
+            Tuple[List[Dict], Dict]: 匹配的邮件和搜索统计（local_hits / remote_hits / complete 等）
+        """
+        planner = SearchPlanner(self, max_age=self.search_coverage_max_age)
+        return planner.search(query, max_results)
     
-    def _decode_header(self, header: str) -> str:
-        """解码邮件头部信息"""
-        if not header:
-            return ""
+    def search_date_range(self, start: datetime, end: datetime = None, folder: str = 'INBOX') -> List[bytes]:
+        """在服务器端按到达时间（INTERNALDATE）筛选邮件
+        
+        服务器支持WITHIN时用 YOUNGER/OLDER 精确到秒；否则用按日期比较的 SINCE/BEFORE
+        缩小范围，再只获取 INTERNALDATE 精确过滤。支持SORT时由服务器按到达时间倒序排序。
+        
+        Args:
+            start: 起始时间（含），需带时区
+            end: 结束时间（不含），默认不限
+            folder: 要搜索的文件夹
+            
+        Returns:
+            List[bytes]: 匹配的邮件UID，最新到达的在前
+        """
+        if not self.connected:
+            return []
+        
+        now = datetime.now(timezone.utc)
+        start = start.astimezone(timezone.utc)
+        end = end.astimezone(timezone.utc) if end else None
         
         try:
-            decoded_parts = email.header.decode_header(header)
-            result = ""
+            with self._connection(folder) as mail:
+                if 'WITHIN' in self.capabilities:
+                    criteria = [f'YOUNGER {max(1, int((now - start).total_seconds()))}']
+                    if end and end < now:
+                        criteria.append(f'OLDER {int((now - end).total_seconds())}')
+                    exact = True
+                else:
+                    # SINCE/BEFORE只比较日期且按服务器时区，前后各放宽一天，再按INTERNALDATE精确过滤
+                    criteria = [f'SINCE {(start - timedelta(days=1)).strftime("%d-%b-%Y")}']
+                    if end:
+                        criteria.append(f'BEFORE {(end + timedelta(days=1)).strftime("%d-%b-%Y")}')
+                    exact = False
+                query = ' '.join(criteria)
+                
+                server_sorted = 'SORT' in self.capabilities
+                if server_sorted:
+                    status, data = mail.uid('SORT', '(REVERSE ARRIVAL)', 'UTF-8', query)
+                else:
+                    status, data = mail.uid('SEARCH', query)
+                uids = data[0].split() if status == 'OK' and data and data[0] else []
+                if not server_sorted:
+                    # 未排序时UID顺序即到达顺序
+                    uids.sort(key=int, reverse=True)
+                if exact or not uids:
+                    return uids
+                
+                arrival = self._fetch_internaldates(uids)
             
-            for content, encoding in decoded_parts:
-                if isinstance(content, bytes):
-                    if encoding:
-                        content = content.decode(encoding, errors='ignore')
-                    else:
-                        content = content.decode('utf-8', errors='ignore')
-                result += str(content)
+            matched = [uid for uid in uids
+                       if uid in arrival and arrival[uid] >= start and (end is None or arrival[uid] < end)]
+            if not server_sorted:
+                matched.sort(key=lambda uid: arrival[uid], reverse=True)
+            return matched
             
-            return result
-        except Exception:
-            return str(header)
+        except Exception as e:
+            self._log_error(f"按日期搜索邮件失败: {str(e)}")
+            return []
     
-    def _extract_text_body(self, msg: email.message.Message) -> str:
-        """提取纯文本邮件正文"""
-        body = ""
+    def get_emails_in_range(self, start: datetime, end: datetime = None, limit: int = None,
+                            with_bodies: bool = False) -> List[Dict[str, Any]]:
+        """获取到达时间位于 [start, end) 的收件箱邮件
+        
+        只获取匹配的邮件：已缓存的直接读取缓存，其余按批次获取后写入缓存。
+        
+        Args:
+            start: 起始时间（含），需带时区
+            end: 结束时间（不含），默认不限
+            limit: 最多返回的邮件数量（取最新的）
+            with_bodies: 是否需要邮件正文
+            
+        Returns:
+            List[Dict]: 邮件数据，最新到达的在前
+        """
+        uids = self.search_date_range(start, end)
+        if limit:
+            uids = uids[:limit]
+        ids = [uid.decode() for uid in uids]
+        
+        records = {}
+        for mail_id in ids:
+            cached = email_cache_manager.get_email(mail_id)
+            if cached:
+                records[mail_id] = self._normalize_cached_email(cached)
+        
+        missing = [mail_id for mail_id in ids if mail_id not in records]
+        if missing:
+            try:
+                if with_bodies:
+                    fetched = [self._build_email_record(mail_id, msg)
+                               for mail_id, msg in self.fetch_emails_batch(missing)]
+                else:
+                    fetched = self.fetch_envelopes(missing)
+                if fetched:
+                    email_cache_manager.store_emails(fetched)
+                records.update((record['mail_id'], record) for record in fetched)
+            except Exception as e:
+                self._log_error(f"获取日期范围内的邮件失败: {str(e)}")
+        
+        emails = [records[mail_id] for mail_id in ids if mail_id in records]
+        return self.load_missing_bodies(emails) if with_bodies else emails
+    
+    def get_today_emails(self, limit: int = None, with_bodies: bool = False) -> List[Dict[str, Any]]:
+        """获取配置时区（timezone.default）下今天到达的邮件，最新的在前
+        
+        IDLE监听保持收件箱缓存最新时直接读取本地缓存，否则在服务器上按日期搜索
+        """
+        start = datetime.now(self.timezone).replace(hour=0, minute=0, second=0, microsecond=0)
+        end = start + timedelta(days=1)
+        cached = self._cached_emails_in_range(start, end, limit, with_bodies)
+        if cached is not None:
+            self.today_source = 'cache'
+            return cached
+        self.today_source = 'server'
+        return self.get_emails_in_range(start, end, limit, with_bodies)
+    
+    def _cached_emails_in_range(self, start: datetime, end: datetime, limit: int = None,
+                                with_bodies: bool = False) -> Optional[List[Dict[str, Any]]]:
+        """从本地缓存读取日期位于 [start, end) 的收件箱邮件
         
+        只有IDLE监听在线且最近一次同步成功、并且检查点之前连续覆盖的UID区间
+        已延伸到 start 之前时，缓存中才一定包含该时段的全部邮件；否则返回None，由调用方查询服务器。
+        """
+        watcher = self.idle_watchers.get('INBOX')
+        if watcher is None or not watcher.fresh:
+            return None
+        
+        state = email_cache_manager.get_sync_state('icloud', 'INBOX')
+        if not state or state.get('uidvalidity') is None:
+            return None
+        last_uid = state.get('last_uid') or 0
+        coverage = email_cache_manager.get_coverage('icloud', 'INBOX', state['uidvalidity'])
+        tail = next(((first, last) for first, last in coverage if first <= last_uid <= last), None)
+        if tail is None:
+            return None
+        if tail[0] > 1:
+            # 覆盖区间内最早的邮件必须早于 start，之后到达的邮件才都在缓存中
+            first_uid = next((uid for uid in email_cache_manager.get_cached_uids('icloud', 'INBOX')
+                              if uid >= tail[0]), None)
+            first = email_cache_manager.get_email(make_email_id('INBOX', first_uid)) if first_uid else None
+            first_date = self._cached_datetime(first.get('date_received')) if first else None
+            if first_date is None or first_date >= start:
+                return None
+        
+        # 按日期倒序分页读取，直到早于 start
+        count = max(limit or 0, 50)
+        while True:
+            rows = email_cache_manager.get_recent_emails(count, 'icloud', with_bodies, 'INBOX')
+            dates = [self._cached_datetime(row.get('date_received')) for row in rows]
+            if any(date is None for date in dates):
+                return None
+            if len(rows) < count or (dates and dates[-1] < start):
+                break
+            count *= 2
+        
+        emails = [self._normalize_cached_email(row) for row, date in zip(rows, dates) if start <= date < end]
+        if limit:
+            emails = emails[:limit]
+        return self.load_missing_bodies(emails) if with_bodies else emails
+    
+    def _cached_datetime(self, value: Any) -> Optional[datetime]:
+        """把缓存中的ISO日期转为带时区的时间（无时区时按配置时区），无法解析时返回None"""
         try:
-            if msg.is_multipart():
-                for part in msg.walk():
-                    if part.get_content_type() == "text/plain":
-                        charset = part.get_content_charset() or 'utf-8'
-                        body_bytes = part.get_payload(decode=True)
-                        if body_bytes:
-                            body += body_bytes.decode(charset, errors='ignore')
-            else:
-                if msg.get_content_type() == "text/plain":
-                    charset = msg.get_content_charset() or 'utf-8'
-                    body_bytes = msg.get_payload(decode=True)
-                    if body_bytes:
-                        body = body_bytes.decode(charset, errors='ignore')
-                    else:
-                        body = str(msg.get_payload())
+            parsed = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+        except (TypeError, ValueError):
+            return None
+        return parsed if parsed.tzinfo else parsed.replace(tzinfo=self.timezone)
+    
+    # 私有辅助方法
+    
+    def _open_connection(self, primary: bool = False) -> imaplib.IMAP4_SSL:
+        """创建一条已登录并启用扩展的IMAP连接（连接池的连接工厂）
+        
+        Args:
+            primary: 是否为主连接；只有主连接记录 capabilities 和 enabled_extensions
+        """
+        # 创建安全SSL上下文，处理证书验证问题
+        context = ssl.create_default_context()
+        
+        # 首先尝试标准SSL连接
+        try:
+            conn = imaplib.IMAP4_SSL(
+                self.IMAP_SERVER, 
+                self.IMAP_PORT, 
+                ssl_context=context,
+                timeout=self.connection_timeout
+            )
+            # 移除print语句，避免MCP JSON解析错误
+        except ssl.SSLError as ssl_err:
+            # 如果SSL验证失败，尝试禁用证书验证（仅用于开发/测试）
+            # 移除print语句，避免MCP JSON解析错误
+            self._log_info(f"标准SSL连接失败: {ssl_err}")
+            self._log_info("🔧 尝试使用宽松SSL设置...")
+            
+            # 创建宽松的SSL上下文
+            context = ssl.create_default_context()
+            context.check_hostname = False
+            context.verify_mode = ssl.CERT_NONE
+            
+            conn = imaplib.IMAP4_SSL(
+                self.IMAP_SERVER, 
+                self.IMAP_PORT, 
+                ssl_context=context,
+                timeout=self.connection_timeout
+            )
+            # 移除print语句，避免MCP JSON解析错误
+            self._log_info("⚠️ 使用宽松SSL连接成功（降级模式）")
+        
+        try:
+            # 登录验证
+            conn.login(self.EMAIL, self.PASSWORD)
+            
+            # 登录后能力列表可能变化，重新读取并启用增量同步扩展（ENABLE按连接生效）
+            capabilities = self._read_capabilities(conn)
+            enabled = self._enable_extensions(conn, capabilities)
+            self._enable_compression(conn, capabilities)
         except Exception:
-            body = "文本正文解析失败"
+            try:
+                conn.logout()
+            except Exception:
+                pass
+            raise
+        if primary:
+            self.capabilities = capabilities
+            self.enabled_extensions = enabled
+        return conn
+    
+    def _open_connection_with_retry(self, primary: bool = False) -> imaplib.IMAP4_SSL:
+        """创建连接，网络错误时按带抖动的指数退避重试（security.max_retry_attempts）"""
+        return connect_with_retry(lambda: self._open_connection(primary), self.max_retry_attempts)
+    
+    def _with_reconnect(self, operation: Callable[[imaplib.IMAP4], Any], folder: str = None) -> Any:
+        """在借出的连接上执行操作；连接中断时丢弃失效连接并在新连接上重放一次
+        
+        已在当前线程借出连接的嵌套调用直接执行，由最外层调用负责重放。
+        
+        Args:
+            operation: 接收已选中文件夹的连接并执行IMAP命令的函数
+            folder: 需要选中的文件夹
+        """
+        def attempt() -> Any:
+            with self._connection(folder) as mail:
+                return operation(mail)
         
-        return body.strip()
+        if getattr(self._local, 'conn', None) is not None:
+            return attempt()
+        try:
+            return attempt()
+        except RECOVERABLE_ERRORS as e:
+            if self.pool is None or not self.connected:
+                raise
+            self.reconnect_stats['replays'] += 1
+            self.reconnect_stats['last_error'] = str(e)
+            self._log_info(f"IMAP连接中断，重新连接后重试: {str(e)}")
+            # 同一次网络中断通常影响所有空闲连接，先全部检查一遍
+            self.pool.keepalive(0)
+            try:
+                return attempt()
+            except RECOVERABLE_ERRORS:
+                self.reconnect_stats['replay_failures'] += 1
+                raise
     
-    def _extract_html_body(self, msg: email.message.Message) -> str:
-        """提取HTML邮件正文"""
-        html_body = ""
+    @contextmanager
+    def _connection(self, folder: str = None):
+        """从连接池借出连接；同一线程内嵌套调用复用已借出的连接
         
+        Args:
+            folder: 需要选中的文件夹（None表示沿用当前选中的文件夹，新借出时为INBOX）
+        """
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            self.pool.ensure_folder(conn, folder)
+            yield conn
+            return
+        
+        pool = self.pool
+        if pool is None:
+            raise imaplib.IMAP4.error("未连接到邮箱")
+        conn = pool.checkout(folder, priority=self.fetch_scheduler.current_priority())
+        self._local.conn = conn
+        discard = False
         try:
-            if msg.is_multipart():
-                for part in msg.walk():
-                    if part.get_content_type() == "text/html":
-                        charset = part.get_content_charset() or 'utf-8'
-                        body_bytes = part.get_payload(decode=True)
-                        if body_bytes:
-                            html_body += body_bytes.decode(charset, errors='ignore')
-            else:
-                if msg.get_content_type() == "text/html":
-                    charset = msg.get_content_charset() or 'utf-8'
-                    body_bytes = msg.get_payload(decode=True)
-                    if body_bytes:
-                        html_body = body_bytes.decode(charset, errors='ignore')
-        except Exception:
-            html_body = ""
+            yield conn
+        except (imaplib.IMAP4.abort, OSError):
+            # 连接已中断，不再放回连接池
+            discard = True
+            raise
+        finally:
+            # 批量任务让路后持有的可能是另一条连接（重新借出失败时为None）
+            conn = self._local.conn
+            self._local.conn = None
+            if conn is not None:
+                pool.checkin(conn, discard=discard)
+    
+    def _yield_to_interactive(self) -> None:
+        """bulk优先级的线程在两批之间调用：有交互请求等待连接时先归还连接，再重新排队借出
         
-        return html_body.strip()
+        只在调用方不再直接引用已借出连接的位置调用（之后的命令都通过 _connection 取得连接）。
+        """
+        conn = getattr(self._local, 'conn', None)
+        pool = self.pool
+        if conn is None or pool is None or self.fetch_scheduler.current_priority() < BULK:
+            return
+        if not pool.interactive_waiting():
+            return
+        folder = pool.selected_folder(conn)
+        self._local.conn = None
+        pool.checkin(conn)
+        self.fetch_scheduler.record_yield()
+        self._local.conn = pool.checkout(folder, priority=BULK)
     
-    def _get_attachment_info(self, msg: email.message.Message) -> List[Dict[str, str]]:
-        """获取附件信息"""
-        attachments = []
+    def _current_folder(self) -> str:
+        """当前线程已借出连接上选中的文件夹（未借出时为新连接默认的INBOX）"""
+        conn = getattr(self._local, 'conn', None)
+        folder = self.pool.selected_folder(conn) if conn is not None and self.pool else None
+        return folder or 'INBOX'
+    
+    def _message_key(self, mail_id: Any, folder: str = None) -> Optional[Tuple[str, int, int]]:
+        """邮件对象缓存的键 (文件夹, UIDVALIDITY, UID)，UIDVALIDITY未知时返回None"""
+        folder = folder or self._current_folder()
+        uidvalidity = self.uidvalidity.get(folder)
+        if uidvalidity is None:
+            return None
+        return folder, uidvalidity, int(mail_id.decode() if isinstance(mail_id, bytes) else mail_id)
+    
+    def _map_batches(self, batches: List[List[str]], fetch_batch: Callable[[List[str]], Iterator],
+                     parallel: bool = True) -> Iterator:
+        """执行批量获取：单个批次时在当前连接上流式获取，多个批次时分配到连接池并行获取
+        
+        Args:
+            batches: 邮件ID批次
+            fetch_batch: 获取单个批次并逐项产出结果的函数
+            parallel: 是否允许使用其他连接
+            
+        Yields:
+            各批次的结果项（并行时按批次完成顺序）
+        """
+        current = getattr(self._local, 'conn', None)
+        # 当前线程已占用一条连接时，工作线程只能使用其余连接
+        available = self.pool.max_size - (1 if current is not None else 0) if self.pool else 1
+        workers = min(len(batches), available) if parallel else 1
+        scheduler = self.fetch_scheduler
+        if workers <= 1:
+            for index, batch in enumerate(batches):
+                if index:
+                    self._yield_to_interactive()
+                with scheduler.track(len(batch)):
+                    yield from self._fetch_with_backoff(batch, fetch_batch, stream=True)
+            return
         
+        folder = self.pool.selected_folder(current) if current is not None else None
+        priority = scheduler.current_priority()
+        
+        def run(batch: List[str]) -> List[Any]:
+            # 工作线程沿用提交线程的优先级；每批单独借出连接，批次之间交互请求可以插队
+            with scheduler.priority(priority), scheduler.track(len(batch)):
+                return list(self._fetch_with_backoff(batch, fetch_batch, folder))
+        
+        executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='imap-fetch')
         try:
-            if msg.is_multipart():
-                for part in msg.walk():
-                    if part.get_content_disposition() == 'attachment':
-                        filename = part.get_filename()
-                        if filename:
-                            attachments.append({
-                                'filename': self._decode_header(filename),
-                                'content_type': part.get_content_type(),
-                                'size': len(part.get_payload()) if part.get_payload() else 0
-                            })
-        except Exception:
-            pass
+            futures = [executor.submit(run, batch) for batch in batches]
+            for future in as_completed(futures):
+                yield from future.result()
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+    
+    def _fetch_with_backoff(self, batch: List[str], fetch_batch: Callable[[List[str]], Iterator],
+                            folder: str = None, stream: bool = False) -> Iterator:
+        """在自适应并发控制下获取一个批次，收到限流响应时退避后重试
         
-        return attachments
+        Args:
+            batch: 邮件ID批次
+            fetch_batch: 获取单个批次并逐项产出结果的函数
+            folder: 需要选中的文件夹（None表示沿用当前连接）
+            stream: 结果是否边获取边交给调用方（此时耗时包含调用方的处理时间，不用于延迟检测；
+                已产出结果后不再重试）
+        """
+        controller = self.rate_controller
+        bulk = self.fetch_scheduler.current_priority() >= BULK
+        for attempt in range(self.max_retry_attempts):
+            controller.acquire(bulk)
+            started = None
+            delivered = 0
+            throttled = False
+            try:
+                with self._connection(folder):
+                    started = time.time()
+                    for item in fetch_batch(batch):
+                        delivered += 1
+                        yield item
+                return
+            except imaplib.IMAP4.error as e:
+                throttled = is_throttle_error(e)
+                if not throttled or delivered or attempt == self.max_retry_attempts - 1:
+                    raise
+                self._log_info(f"服务器限流，退避后重试 ({attempt + 1}/{self.max_retry_attempts}): {str(e)}")
+            finally:
+                controller.release(started or time.time(), len(batch), throttled, sample=not stream)
     
-    def _estimate_size(self, msg: email.message.Message) -> int:
-        """估算邮件大小"""
+    def _read_capabilities(self, conn: imaplib.IMAP4) -> Set[str]:
+        """读取服务器在该连接上声明的能力列表"""
+        capabilities = set()
+        status, data = conn.capability()
+        if status == 'OK' and data and data[-1]:
+            capabilities = set(data[-1].decode().upper().split())
+        return capabilities
+    
+    def _enable_extensions(self, conn: imaplib.IMAP4, capabilities: Set[str]) -> Set[str]:
+        """启用QRESYNC或CONDSTORE，使SELECT返回HIGHESTMODSEQ，返回该连接上已启用的扩展"""
+        enabled = set()
+        if 'ENABLE' in capabilities:
+            for extension in ('QRESYNC', 'CONDSTORE'):
+                if extension not in capabilities:
+                    continue
+                try:
+                    status, _ = conn.enable(extension)
+                    if status == 'OK':
+                        enabled.add(extension)
+                        # QRESYNC隐含启用CONDSTORE
+                        if extension == 'QRESYNC':
+                            enabled.add('CONDSTORE')
+                            break
+                except Exception as e:
+                    self._log_error(f"启用{extension}失败: {str(e)}")
+        return enabled
+    
+    def _enable_compression(self, conn: imaplib.IMAP4, capabilities: Set[str]) -> None:
+        """服务器支持时启用COMPRESS=DEFLATE（须在ENABLE之后、SELECT之前）"""
+        if not self.compression or 'COMPRESS=DEFLATE' not in capabilities:
+            return
         try:
-            return len(str(msg))
-        except:
+            if not enable_compression(conn, self.compression_stats, self.compression_level):
+                self._log_info("服务器拒绝COMPRESS=DEFLATE，使用未压缩连接")
+        except imaplib.IMAP4.abort:
+            raise
+        except Exception as e:
+            self._log_error(f"启用COMPRESS=DEFLATE失败: {str(e)}")
+    
+    def _search_count(self, mail: imaplib.IMAP4, criteria: str) -> int:
+        """统计符合条件的邮件数，支持ESEARCH时服务器只返回数量"""
+        if 'ESEARCH' in self.capabilities:
+            mail.untagged_responses.pop('ESEARCH', None)
+            status, _ = mail.uid('SEARCH', 'RETURN (COUNT)', criteria)
+            responses = mail.untagged_responses.pop('ESEARCH', [])
+            if status != 'OK':
+                raise mail.error(f"SEARCH {criteria} 失败: {status}")
+            for data in responses:
+                return parse_esearch(data).get('count', 0)
             return 0
+        
+        status, data = mail.uid('SEARCH', criteria)
+        if status != 'OK':
+            raise mail.error(f"SEARCH {criteria} 失败: {status}")
+        return len(data[0].split()) if data and data[0] else 0
     
-    def _parse_date(self, date_str: str) -> Optional[str]:
-        """解析邮件日期为标准ISO格式"""
+    def _fetch_flags(self, uid_range: str, modifier: str = None) -> Tuple[Dict[int, List[str]], List[int]]:
+        """只获取UID和FLAGS（可选CHANGEDSINCE修饰），返回 ({UID: 标记}, VANISHED的UID)"""
+        with self._connection() as mail:
+            mail.untagged_responses.pop('VANISHED', None)
+            args = [uid_range, '(UID FLAGS)'] + ([modifier] if modifier else [])
+            status, data = mail.uid('FETCH', *args)
+            if status != 'OK':
+                raise mail.error(f"获取邮件标记失败: {data}")
+            _, vanished_data = mail.response('VANISHED')
+        
+        flags = {}
+        if data and data[0] is not None:
+            for seq, attrs in parse_fetch_response(data):
+                if 'UID' in attrs:
+                    flags[int(attrs['UID'])] = attrs.get('FLAGS') or []
+        
+        vanished = []
+        for item in vanished_data or []:
+            if item:
+                text = item.decode() if isinstance(item, bytes) else str(item)
+                vanished.extend(parse_id_set(text.replace('(EARLIER)', '')))
+        return flags, vanished
+    
+    def _fetch_internaldates(self, uids: List[bytes]) -> Dict[bytes, datetime]:
+        """只获取UID和INTERNALDATE，返回 {UID: 到达时间}"""
+        arrival = {}
+        for start in range(0, len(uids), self.fetch_batch_size * 10):
+            id_set = build_id_set(uids[start:start + self.fetch_batch_size * 10])
+            for seq, attrs in self._stream_fetch(id_set, '(UID INTERNALDATE)', use_uid=True):
+                received = self._parse_internaldate(attrs.get('INTERNALDATE'))
+                if 'UID' in attrs and received:
+                    arrival[str(attrs['UID']).encode()] = received
+        return arrival
+    
+    @staticmethod
+    def _parse_internaldate(value: Any) -> Optional[datetime]:
+        """解析INTERNALDATE（如 "17-Jul-1996 02:44:25 -0700"）"""
         try:
-            if not date_str:
-                return None
-            
-            # 清理日期字符串
-            date_str = date_str.strip()
-            
-            # 使用email.utils解析日期
-            from email.utils import parsedate_to_datetime
-            dt = parsedate_to_datetime(date_str)
+            return datetime.strptime(as_text(value).strip(), '%d-%b-%Y %H:%M:%S %z')
+        except ValueError:
+            return None
+    
+    @staticmethod
+    def _configured_timezone() -> timezone:
+        """读取 timezone.default（如 "UTC+8"、"UTC-05:30"），默认UTC+8"""
+        setting = str(config_manager.get_timezone_settings().get('default', 'UTC+8')).strip().upper()
+        match = re.fullmatch(r'UTC(?:([+-])(\d{1,2})(?::?(\d{2}))?)?', setting)
+        if not match:
+            return timezone(timedelta(hours=8))
+        if not match.group(1):
+            return timezone.utc
+        offset = timedelta(hours=int(match.group(2)), minutes=int(match.group(3) or 0))
+        return timezone(offset if match.group(1) == '+' else -offset)
+    
+    def _select_folder(self, folder: str = 'INBOX') -> Dict[str, Any]:
+        """选择文件夹并读取SELECT响应中的EXISTS/UIDVALIDITY/UIDNEXT/HIGHESTMODSEQ"""
+        with self._connection() as mail:
+            for code in ('UIDVALIDITY', 'UIDNEXT', 'HIGHESTMODSEQ'):
+                mail.untagged_responses.pop(code, None)
             
-            # 转换为ISO格式字符串
-            return dt.isoformat()
+            status, count = mail.select(quote_mailbox(folder))
+            if status != 'OK':
+                raise mail.error(f"选择文件夹失败: {folder}")
+            self.pool.mark_selected(mail, folder)
             
-        except Exception as e:
-            self._log_error(f"日期解析失败 '{date_str}': {e}")
-            # 如果解析失败，尝试返回原始字符串
-            return date_str.strip() if date_str else None
+            mailbox = {'folder': folder, 'exists': int(count[0]) if count and count[0] else 0}
+            for code in ('UIDVALIDITY', 'UIDNEXT', 'HIGHESTMODSEQ'):
+                _, values = mail.response(code)
+                value = values[-1] if values else None
+                mailbox[code.lower()] = int(value) if value else None
+        
+        uidvalidity = mailbox.get('uidvalidity')
+        if uidvalidity is not None:
+            if self.uidvalidity.get(folder) not in (None, uidvalidity):
+                # UIDVALIDITY变化后旧UID全部失效，释放对应的缓存
+                self.email_cache.discard_folder(folder, keep_uidvalidity=uidvalidity)
+            self.uidvalidity[folder] = uidvalidity
+        return mailbox
+    
+    def _build_envelope_record(self, mail_id: str, attrs: Dict[str, Any],
+                               parts: List[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """根据ENVELOPE/BODYSTRUCTURE等FETCH数据构建不含正文的邮件记录"""
+        envelope = parse_envelope(attrs.get('ENVELOPE'))
+        if parts is None:
+            parts = parse_bodystructure(attrs.get('BODYSTRUCTURE'))
+        self.message_flags[mail_id] = attrs.get('FLAGS') or []
+        
+        def format_addresses(addresses) -> str:
+            formatted = []
+            for name, addr in addresses:
+                name = self._decode_header(name)
+                formatted.append(f"{name} <{addr}>" if name else addr)
+            return ', '.join(formatted)
+        
+        attachments = self._attachments_from_parts(parts)
+        
+        date_str = envelope.get('date') or as_text(attrs.get('INTERNALDATE'))
+        parsed_email = {
+            'subject': self._decode_header(envelope.get('subject', '')),
+            'sender': format_addresses(envelope.get('from', [])),
+            'recipient': format_addresses(envelope.get('to', [])),
+            'date': date_str,
+            'message_id': envelope.get('message_id', ''),
+            'body_text': '',
+            'body_html': '',
+            'attachments': attachments,
+            'is_multipart': len(parts) > 1,
+            'content_type': parts[0]['content_type'] if len(parts) == 1 else 'multipart/mixed',
+            'size': int(attrs.get('RFC822.SIZE') or 0),
+            'body_length': 0,
+            'has_attachments': len(attachments) > 0,
+            'parsed_date': self._parse_date(date_str),
+            'body_loaded': False
+        }
+        return self._finalize_record(mail_id, parsed_email)
+    
+    def _build_email_record(self, mail_id: str, msg: email.message.Message) -> Dict[str, Any]:
+        """解析邮件并补充缓存所需的附加字段"""
+        structure = self.message_structure.pop(mail_id, {})
+        parsed_email = self.parse_email_content(msg, structure.get('size'), structure.get('parts'))
+        parsed_email['body_loaded'] = True
+        return self._finalize_record(mail_id, parsed_email)
+    
+    def _normalize_cached_email(self, cached: Dict[str, Any]) -> Dict[str, Any]:
+        """把缓存行的字段名映射为与服务器解析结果一致的字段名"""
+        email_data = dict(cached)
+        email_data.setdefault('mail_id', cached.get('id'))
+        email_data.setdefault('sender', cached.get('from_email', ''))
+        email_data.setdefault('date', cached.get('date_received', ''))
+        email_data.setdefault('size', cached.get('size_bytes', 0))
+        if 'recipient' not in email_data:
+            recipients = cached.get('to_emails') or []
+            email_data['recipient'] = ', '.join(recipients) if isinstance(recipients, list) else str(recipients)
+        return email_data
+    
+    def _finalize_record(self, mail_id: str, parsed_email: Dict[str, Any],
+                         flags: List[str] = None) -> Dict[str, Any]:
+        """补充缓存所需的附加字段
+        
+        Args:
+            mail_id: 缓存邮件ID
+            parsed_email: 解析结果
+            flags: FETCH得到的标记（未提供时从 message_flags 取用）
+        """
+        # 添加额外字段
+        parsed_email['mail_id'] = mail_id
+        parsed_email['account_type'] = 'icloud'
+        parsed_email['folder'], parsed_email['uid'] = split_email_id(mail_id)
+        # 标记只在构建记录时使用一次，取用后删除，避免长期运行时每封邮件都留下一项
+        if flags is None:
+            flags = self.message_flags.pop(mail_id, [])
+        parsed_email['is_read'] = '\\Seen' in flags
+        
+        # 格式化日期字段供缓存使用
+        if parsed_email.get('parsed_date'):
+            parsed_email['date_received'] = parsed_email['parsed_date']
+        
+        # 计算重要性分数（简单算法）
+        importance_score = 50  # 基础分数
+        subject = parsed_email.get('subject', '').lower()
+        
+        # 重要关键词加分
+        important_keywords = ['urgent', '紧急', '重要', 'important', 'asap', '立即']
+        for keyword in important_keywords:
+            if keyword in subject:
+                importance_score += 20
+                break
+        
+        # 有附件加分
+        if parsed_email.get('has_attachments', False):
+            importance_score += 10
+        
+        # 邮件长度影响（只有邮件头时正文长度未知，不参与评分）
+        body_length = parsed_email.get('body_length', 0)
+        if not parsed_email.get('body_loaded', True):
+            pass
+        elif body_length > 1000:
+            importance_score += 5
+        elif body_length < 100:
+            importance_score -= 10
+        
+        parsed_email['importance_score'] = min(100, max(0, importance_score))
+        return parsed_email
+    
+    def _decode_header(self, header: str) -> str:
+        """解码邮件头部信息"""
+        return decode_header(header)
+    
+    def _extract_text_body(self, msg: email.message.Message) -> str:
+        """提取纯文本邮件正文"""
+        return extract_text_body(msg)
+    
+    def _extract_html_body(self, msg: email.message.Message) -> str:
+        """提取HTML邮件正文"""
+        return extract_html_body(msg)
+    
+    def _get_attachment_info(self, msg: email.message.Message) -> List[Dict[str, str]]:
+        """获取附件信息"""
+        return attachment_info(msg)
+    
+    def _attachments_from_parts(self, parts: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """根据BODYSTRUCTURE叶子部分构建附件信息（size为服务器统计的编码后字节数）"""
+        return attachments_from_parts(parts)
+    
+    def _fetched_metadata(self, attrs: Dict[str, Any]) -> Dict[str, Any]:
+        """从FETCH结果中取出构建记录所需的标记、RFC822.SIZE和BODYSTRUCTURE"""
+        size = attrs.get('RFC822.SIZE')
+        structure = attrs.get('BODYSTRUCTURE')
+        return {
+            'flags': attrs.get('FLAGS') or [],
+            'size': int(size) if size is not None else len(attrs.get('BODY[]') or b''),
+            'parts': parse_bodystructure(structure) if structure else None
+        }
+    
+    def _record_structure(self, mail_id: str, attrs: Dict[str, Any]) -> None:
+        """记录FETCH返回的RFC822.SIZE和BODYSTRUCTURE，供随后的解析使用"""
+        fetched = self._fetched_metadata(attrs)
+        self.message_structure[mail_id] = {'size': fetched['size'], 'parts': fetched['parts']}
+    
+    def _estimate_size(self, msg: email.message.Message) -> int:
+        """估算邮件大小（服务器未提供RFC822.SIZE时使用，不重新序列化邮件）"""
+        return estimate_size(msg)
+    
+    def _parse_date(self, date_str: str) -> Optional[str]:
+        """解析邮件日期为标准ISO格式"""
+        return parse_date(date_str)
     
     def _log_error(self, error_msg: str) -> None:
         """记录错误信息（静默模式，避免MCP JSON解析错误）"""
@@ -0,0 +1,161 @@
+"""
+IMAP COMPRESS=DEFLATE支持 - Smart Email AI核心组件
+
+按RFC 4978在已登录的imaplib连接上启用DEFLATE压缩，
+首次同步和大邮件下载时传输的base64附件、HTML正文通常可压缩数倍
+
+特性：
+- 压缩在TLS之上进行，双向均为raw DEFLATE流（每条命令/响应后SYNC_FLUSH）
+- 替换连接的读取文件和send方法，imaplib其余逻辑不变
+- 统计压缩前后的收发字节数，供性能统计工具展示
+"""
+
+import imaplib
+import ssl
+import threading
+import zlib
+from typing import Any, Dict
+
+# 每次从套接字读取的字节数
+_RECV_SIZE = 65536
+
+
+class CompressionStats:
+    """压缩传输的字节计数（多条连接共享）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.connections = 0
+        self.bytes_received = 0  # 网络上收到的压缩字节
+        self.bytes_inflated = 0  # 解压后的字节
+        self.bytes_sent = 0  # 网络上发送的压缩字节
+        self.bytes_deflated = 0  # 压缩前的字节
+
+    def add(self, **counters: int) -> None:
+        with self._lock:
+            for name, value in counters.items():
+                setattr(self, name, getattr(self, name) + value)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            received, inflated = self.bytes_received, self.bytes_inflated
+            sent, deflated = self.bytes_sent, self.bytes_deflated
+            connections = self.connections
+        return {
+            'connections': connections,
+            'bytes_received': received,
+            'bytes_inflated': inflated,
+            'bytes_sent': sent,
+            'bytes_deflated': deflated,
+            'bytes_saved': (inflated - received) + (deflated - sent),
+            'receive_ratio': round(inflated / received, 2) if received else 0.0
+        }
+
+
+class DeflateStream:
+    """替换imaplib连接的 file 对象：从套接字读取并解压，发送时压缩"""
+
+    def __init__(self, sock, stats: CompressionStats, level: int = 6):
+        self.sock = sock
+        self.stats = stats
+        self._inflater = zlib.decompressobj(-zlib.MAX_WBITS)
+        self._deflater = zlib.compressobj(level, zlib.DEFLATED, -zlib.MAX_WBITS)
+        self._buffer = bytearray()
+        self._send_lock = threading.Lock()
+
+    def _fill(self) -> bool:
+        """读取一块压缩数据并解压到缓冲区，连接关闭时返回False"""
+        data = self.sock.recv(_RECV_SIZE)
+        if not data:
+            return False
+        inflated = self._inflater.decompress(data)
+        self._buffer += inflated
+        self.stats.add(bytes_received=len(data), bytes_inflated=len(inflated))
+        return True
+
+    def read(self, size: int) -> bytes:
+        while len(self._buffer) < size:
+            if not self._fill():
+                break
+        data = bytes(self._buffer[:size])
+        del self._buffer[:size]
+        return data
+
+    def readline(self, limit: int = -1) -> bytes:
+        while True:
+            end = self._buffer.find(b'\n') + 1
+            if end or 0 <= limit <= len(self._buffer) or not self._fill():
+                break
+        if not end:
+            end = len(self._buffer)
+        if limit >= 0:
+            end = min(end, limit)
+        line = bytes(self._buffer[:end])
+        del self._buffer[:end]
+        return line
+
+    def send(self, data: bytes) -> None:
+        with self._send_lock:
+            compressed = self._deflater.compress(data) + self._deflater.flush(zlib.Z_SYNC_FLUSH)
+            self.sock.sendall(compressed)
+        self.stats.add(bytes_sent=len(compressed), bytes_deflated=len(data))
+
+    def pending(self) -> int:
+        """已解压但尚未读取的字节数（加上TLS层缓冲的数据）"""
+        return len(self._buffer) + getattr(self.sock, 'pending', lambda: 0)()
+
+    def close(self) -> None:
+        # 套接字由imaplib的shutdown关闭
+        self._buffer.clear()
+
+
+def enable_compression(conn: imaplib.IMAP4, stats: CompressionStats, level: int = 6) -> bool:
+    """发送 COMPRESS DEFLATE，服务器接受后把连接切换为压缩传输
+
+    Returns:
+        bool: 是否已启用压缩（服务器拒绝时连接保持不压缩）
+    """
+    if isinstance(getattr(conn, 'file', None), DeflateStream):
+        return True
+    # imaplib只允许通过 _command 发送 imaplib.Commands 中登记的命令；直接发送带标签的命令，
+    # 不修改全进程共享的命令表
+    tag = conn._new_tag()
+    conn.send(tag + b' COMPRESS DEFLATE' + imaplib.CRLF)
+    status, _ = conn._command_complete('COMPRESS', tag)
+    if status != 'OK':
+        return False
+    stream = DeflateStream(conn.sock, stats, level)
+    conn.file = stream
+    conn.send = stream.send
+    stats.add(connections=1)
+    return True
+
+
+def pending_input(conn: imaplib.IMAP4) -> int:
+    """连接上已到达但尚未读取的字节数，用于在select之前判断是否已有数据
+
+    包括TLS层缓冲的数据，以及之前的readline已读入 conn.file 缓冲区、尚未消费的行
+    （例如与 "+ idling" 同一次读取到达的 "* N EXISTS"）
+    """
+    file = getattr(conn, 'file', None)
+    if isinstance(file, DeflateStream):
+        return file.pending()
+    return getattr(conn.sock, 'pending', lambda: 0)() + _buffered_input(file, conn.sock)
+
+
+def _buffered_input(file, sock) -> int:
+    """imaplib读取文件（BufferedReader）中已缓冲的字节数，不阻塞
+
+    peek在缓冲区为空时会从套接字读取，因此临时切换为非阻塞模式：
+    没有数据时立即返回，而不是等到下一个数据包
+    """
+    if file is None or sock is None or not hasattr(file, 'peek'):
+        return 0
+    timeout = sock.gettimeout()
+    try:
+        sock.settimeout(0.0)
+        return len(file.peek(1))
+    except (BlockingIOError, ssl.SSLWantReadError, ssl.SSLWantWriteError):
+        return 0
+    finally:
+        sock.settimeout(timeout)
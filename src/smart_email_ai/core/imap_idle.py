@@ -0,0 +1,173 @@
+"""
+IMAP IDLE推送监听 - Smart Email AI核心组件
+
+在独立连接上保持IDLE状态，服务器推送新邮件或删除通知时
+立即触发增量同步，使本地缓存无需轮询即可保持最新
+
+特性：
+- 每个账户/文件夹一个后台线程和一条专用连接（不占用连接池）
+- 收到 EXISTS / EXPUNGE / VANISHED / FETCH 通知后拉取增量并写入缓存
+- 按RFC 2177建议在29分钟内重新发出IDLE，避免服务器断开
+- 连接中断后按指数退避自动重连
+"""
+
+import imaplib
+import select
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+from .imap_compress import pending_input
+from .imap_protocol import quote_mailbox
+
+# 需要触发同步的未标记响应
+_CHANGE_RESPONSES = (b'EXISTS', b'EXPUNGE', b'VANISHED', b'FETCH')
+
+
+class IdleWatcher(threading.Thread):
+    """后台IDLE监听线程"""
+
+    def __init__(self, connector, folder: str = 'INBOX', idle_timeout: float = 29 * 60,
+                 on_change: Optional[Callable[[Dict[str, Any]], None]] = None,
+                 max_reconnect_delay: float = 300.0):
+        """初始化IDLE监听
+
+        Args:
+            connector: iCloudConnector实例，用于创建专用连接和执行增量同步
+            folder: 监听的文件夹
+            idle_timeout: 重新发出IDLE的间隔（秒）
+            on_change: 每次同步完成后的回调，参数为同步结果
+            max_reconnect_delay: 重连等待时间上限（秒）
+        """
+        super().__init__(name=f"imap-idle-{folder}", daemon=True)
+        self.connector = connector
+        self.folder = folder
+        self.idle_timeout = idle_timeout
+        self.on_change = on_change
+        self.max_reconnect_delay = max_reconnect_delay
+
+        self.conn = None
+        self.synced = False  # 最近一次同步是否成功（重连后在补齐同步完成前为False）
+        self._stop_event = threading.Event()
+        self.stats = {'notifications': 0, 'syncs': 0, 'reconnects': 0, 'last_sync': None, 'last_error': None}
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """停止监听并关闭专用连接"""
+        self._stop_event.set()
+        if self.is_alive() and threading.current_thread() is not self:
+            self.join(timeout)
+
+    @property
+    def active(self) -> bool:
+        """是否正处于IDLE监听状态"""
+        return self.is_alive() and self.conn is not None and not self._stop_event.is_set()
+
+    @property
+    def fresh(self) -> bool:
+        """正在监听且最近一次同步成功，文件夹缓存可视为最新"""
+        return self.active and self.synced
+
+    def run(self) -> None:
+        delay = 1.0
+        while not self._stop_event.is_set():
+            try:
+                self._open()
+                if 'IDLE' not in self.connector.capabilities:
+                    self.stats['last_error'] = "服务器不支持IDLE"
+                    break
+                delay = 1.0
+                # 建立监听前先补齐离线期间的变化
+                self._sync()
+                while not self._stop_event.is_set():
+                    if self._idle_once():
+                        self.stats['notifications'] += 1
+                        self._sync()
+            except Exception as e:
+                self.stats['last_error'] = str(e)
+                self.stats['reconnects'] += 1
+                self._stop_event.wait(delay)
+                delay = min(delay * 2, self.max_reconnect_delay)
+            finally:
+                self._close()
+
+    def _open(self) -> None:
+        """创建专用连接并选中文件夹"""
+        self._close()
+        self.synced = False
+        self.conn = self.connector._open_connection()
+        status, data = self.conn.select(quote_mailbox(self.folder))
+        if status != 'OK':
+            raise imaplib.IMAP4.error(f"选择文件夹失败: {self.folder} {data}")
+
+    def _close(self) -> None:
+        conn, self.conn = self.conn, None
+        if conn is not None:
+            try:
+                conn.logout()
+            except Exception:
+                pass  # 忽略断开连接时的错误
+
+    def _idle_once(self) -> bool:
+        """发出一次IDLE并等待通知
+
+        Returns:
+            bool: 是否收到需要同步的变化通知
+        """
+        conn = self.conn
+        tag = conn._new_tag()
+        conn.send(tag + b' IDLE\r\n')
+        line = conn.readline()
+        if not line.startswith(b'+'):
+            raise imaplib.IMAP4.error(f"IDLE被拒绝: {line!r}")
+
+        changed = False
+        deadline = time.time() + self.idle_timeout
+        while not self._stop_event.is_set() and time.time() < deadline:
+            # 每秒检查一次停止信号；SSL层、读取缓冲区或解压缓冲区中已有的数据不会触发select
+            pending = pending_input(conn)
+            if not pending:
+                readable, _, _ = select.select([conn.sock], [], [], min(1.0, max(0.0, deadline - time.time())))
+                if not readable:
+                    continue
+            line = conn.readline()
+            if not line:
+                raise imaplib.IMAP4.abort("IDLE连接已被服务器关闭")
+            if self._is_change(line):
+                changed = True
+                break
+            if line.startswith(b'* BYE'):
+                raise imaplib.IMAP4.abort(f"服务器结束连接: {line!r}")
+
+        # 结束IDLE并读取剩余响应直到命令完成
+        conn.send(b'DONE\r\n')
+        while True:
+            line = conn.readline()
+            if not line:
+                raise imaplib.IMAP4.abort("IDLE连接已被服务器关闭")
+            if line.startswith(tag):
+                break
+            changed = changed or self._is_change(line)
+        return changed
+
+    @staticmethod
+    def _is_change(line: bytes) -> bool:
+        parts = line.split()
+        if len(parts) < 2 or parts[0] != b'*':
+            return False
+        return parts[1].upper() == b'VANISHED' or (len(parts) > 2 and parts[2].upper() in _CHANGE_RESPONSES)
+
+    def _sync(self) -> None:
+        """通过连接池执行增量同步"""
+        result = self.connector.sync_new_emails(self.folder)
+        if 'error' in result:
+            self.stats['last_error'] = result['error']
+            self.synced = False
+            return
+        self.synced = True
+        self.stats['syncs'] += 1
+        self.stats['last_sync'] = time.time()
+        if self.on_change:
+            try:
+                self.on_change(result)
+            except Exception:
+                pass
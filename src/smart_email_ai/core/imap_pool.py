@@ -0,0 +1,287 @@
+"""
+IMAP连接池 - Smart Email AI核心组件
+
+为iCloudConnector提供线程安全的已认证IMAP连接复用
+
+特性：
+- 连接数上限（对应 performance.concurrent_connections）
+- 借出/归还（checkout/checkin），连接不足时等待
+- 空闲连接健康检查（NOOP），失效连接自动丢弃重建
+- 保活（keepalive）和预热（warm），供后台连接守护定期调用
+- 记录每个连接当前选中的文件夹，避免重复SELECT
+- 优先级：有交互请求等待时批量任务不获取连接，交互请求还可使用额外保留的连接
+"""
+
+import imaplib
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Optional
+
+from .fetch_scheduler import INTERACTIVE
+from .imap_protocol import quote_mailbox
+
+
+class IMAPConnectionPool:
+    """线程安全的IMAP连接池"""
+
+    def __init__(self, factory: Callable[[], imaplib.IMAP4], max_size: int = 5,
+                 default_folder: str = 'INBOX', health_check_interval: float = 60.0,
+                 interactive_reserve: int = 0):
+        """初始化连接池
+
+        Args:
+            factory: 创建已登录连接的函数
+            max_size: 最大连接数
+            default_folder: 新连接默认选中的文件夹
+            health_check_interval: 空闲超过该秒数的连接在借出前先做NOOP检查
+            interactive_reserve: 只供交互请求使用的额外连接数（超出max_size）
+        """
+        self.factory = factory
+        self.max_size = max(1, int(max_size))
+        self.default_folder = default_folder
+        self.health_check_interval = health_check_interval
+        self.interactive_reserve = max(0, int(interactive_reserve))
+
+        self._idle = deque()  # (连接, 最后使用时间)
+        self._folders: Dict[int, Optional[str]] = {}
+        self._size = 0
+        self._closed = False
+        self._interactive_waiting = 0
+        self._cond = threading.Condition()
+        self._stats = {'created': 0, 'reused': 0, 'discarded': 0, 'health_checks': 0, 'waits': 0,
+                       'priority_waits': 0}
+
+    def add(self, conn: imaplib.IMAP4, folder: Optional[str] = None) -> None:
+        """把已创建的连接放入池中（计入连接数上限）"""
+        with self._cond:
+            self._size += 1
+            self._folders[id(conn)] = folder
+            self._idle.append((conn, time.time()))
+            self._cond.notify_all()
+
+    def checkout(self, folder: Optional[str] = None, timeout: Optional[float] = None,
+                 priority: int = INTERACTIVE) -> imaplib.IMAP4:
+        """借出一个可用连接，并确保选中指定文件夹
+
+        交互请求（INTERACTIVE）等待期间，低优先级请求不获取连接；交互请求最多
+        可使用 max_size + interactive_reserve 条连接，批量任务最多 max_size 条。
+
+        Raises:
+            TimeoutError: 等待超时仍无可用连接
+            imaplib.IMAP4.error: 创建或选择文件夹失败
+        """
+        folder = folder or self.default_folder
+        deadline = time.time() + timeout if timeout else None
+        interactive = priority <= INTERACTIVE
+        capacity = self.max_size + (self.interactive_reserve if interactive else 0)
+
+        while True:
+            conn = None
+            create = False
+            with self._cond:
+                if interactive:
+                    self._interactive_waiting += 1
+                try:
+                    while True:
+                        if self._closed:
+                            raise imaplib.IMAP4.error("连接池已关闭")
+                        available = bool(self._idle) or self._size < capacity
+                        if available and not interactive and self._interactive_waiting:
+                            # 让等待中的交互请求先获取连接
+                            self._stats['priority_waits'] += 1
+                        elif self._idle:
+                            conn, last_used = self._idle.pop()
+                            break
+                        elif self._size < capacity:
+                            self._size += 1
+                            create = True
+                            break
+                        self._stats['waits'] += 1
+                        remaining = deadline - time.time() if deadline else None
+                        if remaining is not None and remaining <= 0:
+                            raise TimeoutError("等待IMAP连接超时")
+                        self._cond.wait(remaining)
+                finally:
+                    if interactive:
+                        self._interactive_waiting -= 1
+                        # 唤醒让路的批量请求
+                        self._cond.notify_all()
+
+            if create:
+                try:
+                    conn = self.factory()
+                except Exception:
+                    with self._cond:
+                        self._size -= 1
+                        self._cond.notify_all()
+                    raise
+                with self._cond:
+                    self._folders[id(conn)] = None
+                    self._stats['created'] += 1
+            elif time.time() - last_used > self.health_check_interval and not self._is_healthy(conn):
+                self._discard(conn)
+                continue
+            else:
+                with self._cond:
+                    self._stats['reused'] += 1
+
+            try:
+                self.ensure_folder(conn, folder)
+            except (imaplib.IMAP4.abort, OSError):
+                self._discard(conn)
+                continue
+            except Exception:
+                self.checkin(conn)
+                raise
+            return conn
+
+    def checkin(self, conn: imaplib.IMAP4, discard: bool = False) -> None:
+        """归还连接；discard为True时关闭并丢弃该连接"""
+        if discard:
+            self._discard(conn)
+            return
+        with self._cond:
+            if self._closed:
+                self._size -= 1
+                self._folders.pop(id(conn), None)
+                self._logout(conn)
+                return
+            self._idle.append((conn, time.time()))
+            self._cond.notify_all()
+
+    @contextmanager
+    def connection(self, folder: Optional[str] = None, timeout: Optional[float] = None):
+        """借出连接的上下文管理器，连接异常中断时自动丢弃"""
+        conn = self.checkout(folder, timeout)
+        discard = False
+        try:
+            yield conn
+        except (imaplib.IMAP4.abort, OSError):
+            discard = True
+            raise
+        finally:
+            self.checkin(conn, discard=discard)
+
+    def keepalive(self, idle_for: float) -> Dict[str, int]:
+        """对空闲超过idle_for秒的连接发送NOOP，失效连接直接丢弃
+
+        Returns:
+            Dict: checked（检查的连接数）和 dropped（丢弃的连接数）
+        """
+        now = time.time()
+        with self._cond:
+            stale = [item for item in self._idle if now - item[1] >= idle_for]
+            for item in stale:
+                self._idle.remove(item)
+        dropped = 0
+        for conn, _ in stale:
+            if self._is_healthy(conn):
+                self.checkin(conn)
+            else:
+                self._discard(conn)
+                dropped += 1
+        return {'checked': len(stale), 'dropped': dropped}
+
+    def warm(self, count: int) -> int:
+        """预先建立连接，使连接池中至少有count条连接
+
+        Returns:
+            int: 新建的连接数
+
+        Raises:
+            Exception: 连接工厂的错误
+        """
+        created = 0
+        while True:
+            with self._cond:
+                if self._closed or self._size >= min(count, self.max_size):
+                    return created
+                self._size += 1
+            try:
+                conn = self.factory()
+            except Exception:
+                with self._cond:
+                    self._size -= 1
+                    self._cond.notify_all()
+                raise
+            with self._cond:
+                self._folders[id(conn)] = None
+                self._stats['created'] += 1
+            self.checkin(conn)
+            created += 1
+
+    def interactive_waiting(self) -> bool:
+        """是否有交互请求正在等待连接"""
+        with self._cond:
+            return self._interactive_waiting > 0
+
+    def ensure_folder(self, conn: imaplib.IMAP4, folder: Optional[str]) -> None:
+        """如有需要，在连接上选中指定文件夹"""
+        if not folder or self._folders.get(id(conn)) == folder:
+            return
+        status, data = conn.select(quote_mailbox(folder))
+        if status != 'OK':
+            raise conn.error(f"选择文件夹失败: {folder} {data}")
+        self._folders[id(conn)] = folder
+
+    def selected_folder(self, conn: imaplib.IMAP4) -> Optional[str]:
+        """连接当前选中的文件夹"""
+        return self._folders.get(id(conn))
+
+    def mark_selected(self, conn: imaplib.IMAP4, folder: Optional[str]) -> None:
+        """记录在连接上直接执行SELECT后的文件夹"""
+        self._folders[id(conn)] = folder
+
+    def close_all(self) -> None:
+        """关闭所有空闲连接；借出中的连接在归还时关闭"""
+        with self._cond:
+            self._closed = True
+            idle = list(self._idle)
+            self._idle.clear()
+            self._size -= len(idle)
+            for conn, _ in idle:
+                self._folders.pop(id(conn), None)
+            self._cond.notify_all()
+        for conn, _ in idle:
+            self._logout(conn)
+
+    def stats(self) -> Dict[str, Any]:
+        """连接池统计"""
+        with self._cond:
+            return {
+                'max_size': self.max_size,
+                'size': self._size,
+                'idle': len(self._idle),
+                'in_use': self._size - len(self._idle),
+                'interactive_reserve': self.interactive_reserve,
+                'interactive_waiting': self._interactive_waiting,
+                **self._stats
+            }
+
+    def _is_healthy(self, conn: imaplib.IMAP4) -> bool:
+        """NOOP健康检查"""
+        with self._cond:
+            self._stats['health_checks'] += 1
+        try:
+            status, _ = conn.noop()
+            return status == 'OK'
+        except Exception:
+            return False
+
+    def _discard(self, conn: imaplib.IMAP4) -> None:
+        """丢弃连接并释放名额"""
+        with self._cond:
+            self._size -= 1
+            self._stats['discarded'] += 1
+            self._folders.pop(id(conn), None)
+            self._cond.notify_all()
+        self._logout(conn)
+
+    @staticmethod
+    def _logout(conn: imaplib.IMAP4) -> None:
+        try:
+            conn.logout()
+        except Exception:
+            pass  # 忽略断开连接时的错误
@@ -0,0 +1,419 @@
+"""
+IMAP协议辅助工具 - Smart Email AI核心组件
+
+解析imaplib返回的原始FETCH响应，供批量获取等高效路径使用
+
+特性：
+- 将untagged FETCH片段按邮件分组
+- 解析带字面量(literal)的括号列表结构
+- 解析ENVELOPE和BODYSTRUCTURE，支持只获取邮件头的列表模式
+- 构建紧凑的ID集合（如 1:5,7,9:12）
+- 解析STATUS和ESEARCH响应，统计类查询无需传输完整ID列表
+- 解析LIST响应，处理文件夹名称的引号和修改版UTF-7编码
+- 规范化SEARCH条件，作为服务器搜索结果缓存的键
+"""
+
+import base64
+import re
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+
+# imaplib存储的FETCH片段：普通bytes，或 (头部bytes, 字面量bytes) 元组
+FetchFragment = Union[bytes, Tuple[bytes, bytes]]
+
+_RECORD_START = re.compile(rb'^\s*(\d+) \(')
+_LITERAL_TAIL = re.compile(rb'\{(\d+)\}\s*$')
+_ESEARCH_CORRELATOR = re.compile(rb'^\s*\(TAG "[^"]*"\)\s*')
+_LIST_RESPONSE = re.compile(rb'^\((?P<flags>[^)]*)\)\s+(?P<delimiter>"(?:[^"\\]|\\.)*"|NIL)\s*(?P<name>.*)$', re.I | re.S)
+_SEARCH_PART = re.compile(r'"(?:[^"\\]|\\.)*"|[^"]+')
+_MAILBOX_ATOM = re.compile(r'^[^\s(){%*"\\\]\x00-\x1f\x7f]+$')
+_TOKEN = re.compile(
+    rb'\s*(?:'
+    rb'(?P<open>\()'
+    rb'|(?P<close>\))'
+    rb'|"(?P<quoted>(?:[^"\\]|\\.)*)"'
+    rb'|(?P<atom>[^\s()"\[\]]+(?:\[[^\]]*\](?:<[\d.]+>)?)?)'
+    rb')'
+)
+
+
+class _Literal:
+    """标记字面量在片段流中的位置"""
+
+    __slots__ = ('data',)
+
+    def __init__(self, data: bytes):
+        self.data = data
+
+
+def build_id_set(ids: Iterable[Union[bytes, str, int]]) -> str:
+    """把邮件ID列表压缩为IMAP序列集合字符串
+
+    Args:
+        ids: 邮件ID（序号或UID）
+
+    Returns:
+        str: 形如 "1:5,7,9:12" 的集合字符串
+    """
+    numbers = sorted({int(i.decode() if isinstance(i, bytes) else i) for i in ids})
+    if not numbers:
+        return ''
+
+    ranges = []
+    start = prev = numbers[0]
+    for number in numbers[1:]:
+        if number == prev + 1:
+            prev = number
+            continue
+        ranges.append(f"{start}:{prev}" if start != prev else str(start))
+        start = prev = number
+    ranges.append(f"{start}:{prev}" if start != prev else str(start))
+    return ','.join(ranges)
+
+
+def parse_id_set(id_set: Union[bytes, str]) -> List[int]:
+    """把IMAP序列集合字符串展开为ID列表（不支持 * ）"""
+    if isinstance(id_set, bytes):
+        id_set = id_set.decode('ascii', errors='ignore')
+    ids = []
+    for part in id_set.strip().split(','):
+        if not part or '*' in part:
+            continue
+        if ':' in part:
+            start, end = (int(x) for x in part.split(':', 1))
+            ids.extend(range(min(start, end), max(start, end) + 1))
+        else:
+            ids.append(int(part))
+    return ids
+
+
+def parse_status(data: Union[bytes, str]) -> Dict[str, int]:
+    """解析STATUS响应，如 b'"INBOX" (MESSAGES 10 UNSEEN 2 UIDNEXT 11)'
+
+    Returns:
+        Dict[str, int]: 小写的数据项名称 -> 数值
+    """
+    if isinstance(data, str):
+        data = data.encode('utf-8')
+    start = data.rfind(b'(')
+    if start < 0:
+        return {}
+    tokens = data[start + 1:].rstrip(b') \r\n').split()
+    return {tokens[i].decode('ascii', errors='ignore').lower(): int(tokens[i + 1])
+            for i in range(0, len(tokens) - 1, 2) if tokens[i + 1].isdigit()}
+
+
+def parse_esearch(data: Union[bytes, str]) -> Dict[str, Any]:
+    """解析ESEARCH响应，如 b'(TAG "A5") UID COUNT 3 ALL 1:3'
+
+    Returns:
+        Dict: count/min/max 为整数，all 为ID列表，uid 表示结果是否为UID
+    """
+    if isinstance(data, str):
+        data = data.encode('utf-8')
+    data = _ESEARCH_CORRELATOR.sub(b'', data)
+    tokens = data.split()
+    result: Dict[str, Any] = {'uid': False}
+    i = 0
+    while i < len(tokens):
+        name = tokens[i].upper()
+        if name == b'UID':
+            result['uid'] = True
+            i += 1
+            continue
+        if i + 1 >= len(tokens):
+            break
+        value = tokens[i + 1]
+        if name == b'ALL':
+            result['all'] = parse_id_set(value)
+        elif value.isdigit():
+            result[name.decode('ascii', errors='ignore').lower()] = int(value)
+        i += 2
+    return result
+
+
+def normalize_search_criteria(criteria: str) -> str:
+    """规范化IMAP SEARCH条件：合并空白、关键字转大写、字符串转小写
+
+    IMAP的文本搜索不区分大小写，因此只在大小写或空白上不同的条件得到相同的结果。
+    """
+    parts = []
+    for part in _SEARCH_PART.findall(criteria.strip()):
+        if part.startswith('"'):
+            parts.append(part.lower())
+        else:
+            parts.append(re.sub(r'\s+', ' ', part.upper()))
+    return ''.join(parts)
+
+
+def quote_mailbox(name: str) -> str:
+    """文件夹名称包含空格等特殊字符时加引号（imaplib不会自动处理）"""
+    if _MAILBOX_ATOM.match(name) and name.upper() != 'NIL':
+        return name
+    return '"' + name.replace('\\', '\\\\').replace('"', '\\"') + '"'
+
+
+def decode_mailbox_name(name: str) -> str:
+    """把修改版UTF-7编码的文件夹名称（RFC 3501 5.1.3）解码为可读文本"""
+    if '&' not in name:
+        return name
+    result = []
+    pos = 0
+    while pos < len(name):
+        start = name.find('&', pos)
+        end = name.find('-', start) if start >= 0 else -1
+        if start < 0 or end < 0:
+            result.append(name[pos:])
+            break
+        result.append(name[pos:start])
+        encoded = name[start + 1:end]
+        if not encoded:
+            result.append('&')
+        else:
+            try:
+                data = encoded.replace(',', '/')
+                data += '=' * (-len(data) % 4)
+                result.append(base64.b64decode(data).decode('utf-16-be'))
+            except (ValueError, UnicodeDecodeError):
+                result.append(name[start:end + 1])
+        pos = end + 1
+    return ''.join(result)
+
+
+def parse_list_response(data: List[FetchFragment]) -> List[Dict[str, Any]]:
+    """解析imaplib的LIST结果
+
+    Returns:
+        List[Dict]: 每个文件夹包含 name（发送给服务器的原始名称）、display_name、
+        delimiter、flags（小写，如 \\noselect、\\sent）
+    """
+    folders = []
+    for item in data:
+        if item is None:
+            continue
+        if isinstance(item, tuple):
+            # 名称以字面量形式返回
+            header, name = item[0], item[1]
+        else:
+            header, name = item, None
+        match = _LIST_RESPONSE.match(header.strip())
+        if not match:
+            continue
+        if name is None:
+            name = match.group('name').strip()
+            if name.startswith(b'"') and name.endswith(b'"') and len(name) >= 2:
+                name = re.sub(rb'\\(.)', rb'\1', name[1:-1])
+        delimiter = match.group('delimiter')
+        name = name.decode('utf-8', errors='replace')
+        folders.append({
+            'name': name,
+            'display_name': decode_mailbox_name(name),
+            'delimiter': None if delimiter.upper() == b'NIL' else delimiter[1:-1].decode('ascii', errors='ignore'),
+            'flags': {flag.lower() for flag in match.group('flags').decode('ascii', errors='ignore').split()}
+        })
+    return folders
+
+
+def group_fetch_records(untagged: List[FetchFragment]) -> List[List[FetchFragment]]:
+    """将imaplib的untagged FETCH数据按邮件分组
+
+    一封邮件的响应可能被拆成多个片段（每个字面量一个元组，最后是结尾bytes），
+    新记录总是以 "序号 (" 开头。
+    """
+    records: List[List[FetchFragment]] = []
+    for fragment in untagged:
+        if fragment is None:
+            continue
+        head = fragment[0] if isinstance(fragment, tuple) else fragment
+        if _RECORD_START.match(head) or not records:
+            records.append([fragment])
+        else:
+            records[-1].append(fragment)
+    return records
+
+
+def parse_fetch_record(fragments: List[FetchFragment]) -> Tuple[int, Dict[str, Any]]:
+    """解析单封邮件的FETCH响应
+
+    Returns:
+        Tuple[int, Dict]: (消息序号, {数据项名称: 值})
+        数据项名称统一为大写（如 UID、FLAGS、BODY[]），
+        引号字符串和字面量为bytes，原子为str，NIL为None，列表为list。
+    """
+    stream: List[Union[bytes, _Literal]] = []
+    for fragment in fragments:
+        if isinstance(fragment, tuple):
+            head, literal = fragment
+            stream.append(_LITERAL_TAIL.sub(b'', head))
+            stream.append(_Literal(literal))
+        else:
+            stream.append(fragment)
+
+    first = stream[0] if stream and isinstance(stream[0], bytes) else b''
+    match = _RECORD_START.match(first)
+    if not match:
+        raise ValueError(f"无法识别的FETCH响应: {first[:80]!r}")
+    seq = int(match.group(1))
+    stream[0] = first[match.end() - 1:]
+
+    tokens = list(_tokenize(stream))
+    value, _ = _parse_tokens(tokens, 0)
+    items = value if isinstance(value, list) else []
+
+    attrs: Dict[str, Any] = {}
+    for i in range(0, len(items) - 1, 2):
+        name = items[i]
+        if isinstance(name, bytes):
+            name = name.decode('ascii', errors='ignore')
+        attrs[str(name).upper()] = items[i + 1]
+    return seq, attrs
+
+
+def parse_fetch_response(untagged: List[FetchFragment]) -> List[Tuple[int, Dict[str, Any]]]:
+    """解析完整的untagged FETCH数据列表"""
+    return [parse_fetch_record(record) for record in group_fetch_records(untagged)]
+
+
+def _tokenize(stream: List[Union[bytes, _Literal]]):
+    """把片段流切分为 ( ) 原子 字符串 字面量 记号"""
+    for piece in stream:
+        if isinstance(piece, _Literal):
+            yield ('string', piece.data)
+            continue
+        pos = 0
+        while pos < len(piece):
+            match = _TOKEN.match(piece, pos)
+            if not match or match.end() == pos:
+                break
+            pos = match.end()
+            if match.group('open'):
+                yield ('open', None)
+            elif match.group('close'):
+                yield ('close', None)
+            elif match.group('quoted') is not None:
+                yield ('string', re.sub(rb'\\(.)', rb'\1', match.group('quoted')))
+            elif match.group('atom'):
+                yield ('atom', match.group('atom'))
+
+
+def _parse_tokens(tokens: List[Tuple[str, Any]], pos: int) -> Tuple[Any, int]:
+    """递归解析记号为Python对象"""
+    if pos >= len(tokens):
+        return None, pos
+    kind, value = tokens[pos]
+    if kind == 'open':
+        result = []
+        pos += 1
+        while pos < len(tokens) and tokens[pos][0] != 'close':
+            item, pos = _parse_tokens(tokens, pos)
+            result.append(item)
+        return result, pos + 1
+    if kind == 'atom':
+        atom = value.decode('utf-8', errors='replace')
+        return (None if atom.upper() == 'NIL' else atom), pos + 1
+    if kind == 'string':
+        return value, pos + 1
+    return None, pos + 1
+
+
+def as_text(value: Optional[Union[bytes, str]]) -> str:
+    """把解析结果中的字符串值统一转换为str"""
+    if value is None:
+        return ''
+    if isinstance(value, bytes):
+        return value.decode('utf-8', errors='replace')
+    return str(value)
+
+
+def _format_address(address: List[Any]) -> Tuple[str, str]:
+    """把ENVELOPE地址结构 (name adl mailbox host) 转换为 (名称, 邮箱)"""
+    if not isinstance(address, list) or len(address) < 4:
+        return '', ''
+    name, _, mailbox, host = address[:4]
+    addr = f"{as_text(mailbox)}@{as_text(host)}" if mailbox and host else as_text(mailbox)
+    return as_text(name), addr
+
+
+def parse_envelope(envelope: List[Any]) -> Dict[str, Any]:
+    """解析ENVELOPE结构
+
+    Returns:
+        Dict: date, subject, from, to, cc, message_id（主题和名称保留RFC 2047编码原文）
+    """
+    if not isinstance(envelope, list) or len(envelope) < 10:
+        return {}
+
+    def addresses(value) -> List[Tuple[str, str]]:
+        return [_format_address(item) for item in value] if isinstance(value, list) else []
+
+    return {
+        'date': as_text(envelope[0]),
+        'subject': as_text(envelope[1]),
+        'from': addresses(envelope[2]),
+        'to': addresses(envelope[5]),
+        'cc': addresses(envelope[6]),
+        'in_reply_to': as_text(envelope[8]),
+        'message_id': as_text(envelope[9]),
+    }
+
+
+def _params_dict(value: Any) -> Dict[str, str]:
+    """把 ("KEY" "VALUE" ...) 参数列表转换为字典（键为小写）"""
+    if not isinstance(value, list):
+        return {}
+    return {as_text(value[i]).lower(): as_text(value[i + 1]) for i in range(0, len(value) - 1, 2)}
+
+
+def parse_bodystructure(structure: List[Any], prefix: str = '') -> List[Dict[str, Any]]:
+    """把BODYSTRUCTURE展开为叶子部分列表
+
+    Returns:
+        List[Dict]: 每个部分包含 part（部分编号，如 "1.2"）、content_type、
+        params、encoding、size（编码后的字节数）、disposition、filename
+    """
+    if not isinstance(structure, list) or not structure:
+        return []
+
+    if isinstance(structure[0], list):
+        # multipart: 若干子部分后跟子类型
+        parts = []
+        index = 0
+        for child in structure:
+            if not isinstance(child, list):
+                break
+            index += 1
+            parts.extend(parse_bodystructure(child, f"{prefix}.{index}" if prefix else str(index)))
+        return parts
+
+    main_type = as_text(structure[0]).lower()
+    sub_type = as_text(structure[1]).lower() if len(structure) > 1 else ''
+    params = _params_dict(structure[2]) if len(structure) > 2 else {}
+    encoding = as_text(structure[5]).lower() if len(structure) > 5 else ''
+    try:
+        size = int(structure[6]) if len(structure) > 6 and structure[6] is not None else 0
+    except (TypeError, ValueError):
+        size = 0
+
+    # 扩展字段位置：text/* 多一个行数字段，message/rfc822 多 envelope/body/行数
+    if main_type == 'text':
+        ext_start = 8
+    elif main_type == 'message' and sub_type == 'rfc822':
+        ext_start = 10
+    else:
+        ext_start = 7
+
+    disposition = None
+    disposition_params = {}
+    if len(structure) > ext_start + 1 and isinstance(structure[ext_start + 1], list):
+        disposition_value = structure[ext_start + 1]
+        disposition = as_text(disposition_value[0]).lower() if disposition_value else None
+        disposition_params = _params_dict(disposition_value[1]) if len(disposition_value) > 1 else {}
+
+    return [{
+        'part': prefix or '1',
+        'content_type': f"{main_type}/{sub_type}",
+        'params': params,
+        'encoding': encoding,
+        'size': size,
+        'disposition': disposition,
+        'filename': disposition_params.get('filename') or params.get('name'),
+    }]
@@ -0,0 +1,106 @@
+"""
+IMAP连接守护 - Smart Email AI核心组件
+
+iCloud会断开长时间空闲的连接，而连接器的 connected 状态并不会随之改变。
+连接守护在后台定期对空闲连接发送NOOP保活，发现失效连接后丢弃并重新建立，
+使空闲一段时间后的第一次工具调用无需重新进行TLS握手和LOGIN
+
+特性：
+- 定期NOOP保活，检测并丢弃已失效的连接
+- 连接池中至少保持指定数量的已登录连接
+- 建立连接失败时按带随机抖动的指数退避重试（security.max_retry_attempts）
+"""
+
+import imaplib
+import random
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Tuple, Type
+
+# 可以通过重新连接恢复的错误（认证失败等IMAP4.error不重试）
+RECOVERABLE_ERRORS: Tuple[Type[BaseException], ...] = (imaplib.IMAP4.abort, OSError)
+
+
+def backoff_delay(attempt: int, base: float = 1.0, cap: float = 30.0) -> float:
+    """第attempt次重试前的等待时间：指数增长并加入随机抖动，避免多条连接同时重连"""
+    delay = min(cap, base * (2 ** attempt))
+    return random.uniform(delay / 2, delay)
+
+
+def connect_with_retry(factory: Callable[[], imaplib.IMAP4], attempts: int = 3,
+                       base_delay: float = 1.0, max_delay: float = 30.0,
+                       stop: Optional[threading.Event] = None) -> imaplib.IMAP4:
+    """调用factory建立连接，网络错误时按退避策略重试
+
+    Args:
+        factory: 创建已登录连接的函数
+        attempts: 最多尝试次数
+        base_delay: 首次重试前的基础等待时间（秒）
+        max_delay: 单次等待时间上限（秒）
+        stop: 设置后不再重试
+
+    Raises:
+        最后一次尝试的错误；认证失败等非网络错误立即抛出
+    """
+    attempts = max(1, int(attempts))
+    for attempt in range(attempts):
+        try:
+            return factory()
+        except RECOVERABLE_ERRORS:
+            if attempt == attempts - 1 or (stop is not None and stop.is_set()):
+                raise
+            delay = backoff_delay(attempt, base_delay, max_delay)
+            if stop is not None:
+                if stop.wait(delay):
+                    raise
+            else:
+                time.sleep(delay)
+
+
+class ConnectionSupervisor(threading.Thread):
+    """后台连接守护线程"""
+
+    def __init__(self, pool, keepalive_interval: float = 300.0, min_connections: int = 1,
+                 check_interval: Optional[float] = None):
+        """初始化连接守护
+
+        Args:
+            pool: IMAPConnectionPool实例
+            keepalive_interval: 连接空闲超过该秒数时发送NOOP
+            min_connections: 连接池中保持的最少连接数
+            check_interval: 检查间隔（秒），默认为保活间隔的一半（最长60秒）
+        """
+        super().__init__(name="imap-supervisor", daemon=True)
+        self.pool = pool
+        self.keepalive_interval = max(1.0, float(keepalive_interval))
+        self.min_connections = max(0, int(min_connections))
+        self.check_interval = check_interval or min(60.0, self.keepalive_interval / 2)
+
+        self._stop_event = threading.Event()
+        self.stats = {'checks': 0, 'keepalives': 0, 'dropped': 0, 'reconnects': 0,
+                      'last_check': None, 'last_error': None}
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """停止守护线程"""
+        self._stop_event.set()
+        if self.is_alive() and threading.current_thread() is not self:
+            self.join(timeout)
+
+    def run(self) -> None:
+        while not self._stop_event.wait(self.check_interval):
+            self.check()
+
+    def check(self) -> Dict[str, Any]:
+        """对空闲连接保活，并补足最少连接数"""
+        self.stats['checks'] += 1
+        self.stats['last_check'] = time.time()
+        try:
+            result = self.pool.keepalive(self.keepalive_interval)
+            self.stats['keepalives'] += result['checked']
+            self.stats['dropped'] += result['dropped']
+            self.stats['reconnects'] += self.pool.warm(self.min_connections)
+            self.stats['last_error'] = None
+        except Exception as e:
+            # 重连失败时保留错误，下一轮检查继续尝试
+            self.stats['last_error'] = str(e)
+        return dict(self.stats)
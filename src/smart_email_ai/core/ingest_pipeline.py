@@ -0,0 +1,228 @@
+"""
+批量导入流水线 - Smart Email AI核心组件
+
+大批量同步时把邮件解析从获取线程中拆分出来，充分利用多核CPU
+
+流程：
+    IMAP获取原始邮件 -> 有界队列 -> 进程池解析为字典 -> 有界队列 -> 单一写入线程批量写入缓存
+
+特性：
+- 每个阶段之间的队列都有上限，下游变慢时上游自动等待（背压）
+- MIME解析在进程池中执行，不受GIL限制
+- 只有一个写入线程访问SQLite，按批次写入
+- 进程池不可用时退化为在当前线程内解析
+"""
+
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from typing import Any, Dict, List, Optional, Tuple
+
+from .email_cache import email_cache_manager
+from .fetch_scheduler import BULK
+# 解析进程只需导入纯函数模块，无需创建连接器或打开缓存数据库
+from .message_parser import parse_raw_messages
+
+# 队列结束标记
+_DONE = object()
+
+class IngestPipeline:
+    """获取-解析-写入三段式批量导入流水线"""
+
+    def __init__(self, connector, workers: int = None, fetch_queue_size: int = 200,
+                 parse_queue_size: int = 8, write_queue_size: int = 500,
+                 parse_chunk_size: int = 16, write_batch_size: int = 100):
+        """初始化导入流水线
+
+        Args:
+            connector: iCloudConnector实例，负责获取原始邮件和补充记录字段
+            workers: 解析进程数（默认CPU核数）
+            fetch_queue_size: 等待解析的原始邮件数上限
+            parse_queue_size: 同时在进程池中解析的批次数上限
+            write_queue_size: 等待写入的邮件记录数上限
+            parse_chunk_size: 每次提交给进程池的邮件数
+            write_batch_size: 每次写入缓存的邮件数
+        """
+        self.connector = connector
+        self.workers = max(1, int(workers or os.cpu_count() or 1))
+        self.fetch_queue_size = max(1, int(fetch_queue_size))
+        self.parse_queue_size = max(1, int(parse_queue_size))
+        self.write_queue_size = max(1, int(write_queue_size))
+        self.parse_chunk_size = max(1, int(parse_chunk_size))
+        self.write_batch_size = max(1, int(write_batch_size))
+
+        self.stats = {'fetched': 0, 'parsed': 0, 'stored': 0, 'failed': 0,
+                      'workers': 0, 'elapsed': 0.0}
+
+    def run(self, mail_ids: List[bytes], folder: str = 'INBOX') -> Dict[str, Any]:
+        """获取、解析并写入指定UID的邮件
+
+        Args:
+            mail_ids: 邮件UID列表
+            folder: 邮件所在文件夹
+
+        Returns:
+            Dict: 各阶段处理数量和耗时
+
+        Raises:
+            Exception: 获取或写入阶段的错误（已写入的邮件保留在缓存中）
+        """
+        started = time.time()
+        raw_queue = queue.Queue(maxsize=self.fetch_queue_size)
+        write_queue = queue.Queue(maxsize=self.write_queue_size)
+        stop = threading.Event()
+        errors = []
+
+        producer = threading.Thread(target=self._produce, name='ingest-fetch',
+                                    args=(mail_ids, folder, raw_queue, stop, errors), daemon=True)
+        writer = threading.Thread(target=self._write, name='ingest-write',
+                                  args=(write_queue, stop, errors), daemon=True)
+        producer.start()
+        writer.start()
+        try:
+            self._parse(raw_queue, write_queue, stop)
+        except Exception as e:
+            errors.append(e)
+            stop.set()
+        finally:
+            # 解析阶段结束后通知写入线程；出错时丢弃尚未解析的原始邮件
+            if stop.is_set():
+                self._drain(raw_queue)
+            self._put(write_queue, _DONE, None)
+            producer.join()
+            writer.join()
+
+        self.stats['elapsed'] = round(time.time() - started, 3)
+        if errors:
+            raise errors[0]
+        return dict(self.stats)
+
+    def _produce(self, mail_ids: List[bytes], folder: str, raw_queue: queue.Queue,
+                 stop: threading.Event, errors: List[Exception]) -> None:
+        """获取阶段：流式获取原始邮件放入队列，队列满时等待"""
+        try:
+            # 批量导入为bulk优先级，交互请求可以在两批之间插队
+            with self.connector.fetch_scheduler.priority(BULK), self.connector._connection(folder):
+                for mail_id, raw, fetched in self.connector.fetch_raw_emails(mail_ids):
+                    # 标记和结构随原始邮件经队列传递，不经过连接器的共享状态
+                    if not self._put(raw_queue, (mail_id, raw, fetched), stop):
+                        break
+                    self.stats['fetched'] += 1
+        except Exception as e:
+            errors.append(e)
+            stop.set()
+        finally:
+            # 流水线已停止时解析阶段不再等待结束标记
+            self._put(raw_queue, _DONE, stop)
+
+    def _parse(self, raw_queue: queue.Queue, write_queue: queue.Queue, stop: threading.Event) -> None:
+        """解析阶段：按批次提交到进程池，进行中的批次数达到上限时等待结果"""
+        executor = self._create_executor()
+        pending = set()
+        # 已提交解析、尚未构建记录的邮件标记；只在本线程访问
+        flags_by_id = {}
+        try:
+            done = False
+            while not done and not stop.is_set():
+                chunk = []
+                while len(chunk) < self.parse_chunk_size and not stop.is_set():
+                    try:
+                        item = raw_queue.get(timeout=0.5)
+                    except queue.Empty:
+                        continue
+                    if item is _DONE:
+                        done = True
+                        break
+                    chunk.append(item)
+                    flags_by_id[item[0]] = item[2].get('flags') or []
+                if not chunk:
+                    continue
+
+                if executor is None:
+                    self._emit(parse_raw_messages(chunk), flags_by_id, write_queue, stop)
+                    continue
+
+                pending.add(executor.submit(parse_raw_messages, chunk))
+                if len(pending) >= self.parse_queue_size:
+                    completed, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in completed:
+                        self._emit(future.result(), flags_by_id, write_queue, stop)
+
+            for future in pending:
+                if not stop.is_set():
+                    self._emit(future.result(), flags_by_id, write_queue, stop)
+        finally:
+            if executor is not None:
+                executor.shutdown(wait=True, cancel_futures=True)
+
+    def _emit(self, results: List[Tuple[str, Dict[str, Any]]], flags_by_id: Dict[str, List[str]],
+              write_queue: queue.Queue, stop: threading.Event) -> None:
+        """把解析结果补全为缓存记录并交给写入线程"""
+        for mail_id, parsed_email in results:
+            flags = flags_by_id.pop(mail_id, [])
+            if 'error' in parsed_email:
+                self.stats['failed'] += 1
+                continue
+            parsed_email['body_loaded'] = True
+            record = self.connector._finalize_record(mail_id, parsed_email, flags)
+            self.stats['parsed'] += 1
+            if not self._put(write_queue, record, stop):
+                return
+
+    def _write(self, write_queue: queue.Queue, stop: threading.Event, errors: List[Exception]) -> None:
+        """写入阶段：唯一访问缓存数据库的线程，攒够一批后写入"""
+        batch = []
+        try:
+            while True:
+                item = write_queue.get()
+                if item is not _DONE:
+                    batch.append(item)
+                if batch and (item is _DONE or len(batch) >= self.write_batch_size):
+                    self.stats['stored'] += email_cache_manager.store_emails(batch)
+                    batch = []
+                if item is _DONE:
+                    break
+        except Exception as e:
+            errors.append(e)
+            stop.set()
+            # 继续消费直到结束标记，避免解析阶段阻塞在已满的队列上
+            while write_queue.get() is not _DONE:
+                pass
+
+    def _create_executor(self) -> Optional[ProcessPoolExecutor]:
+        """创建解析进程池，不可用时返回None（在当前线程解析）"""
+        if self.workers <= 1:
+            self.stats['workers'] = 1
+            return None
+        try:
+            executor = ProcessPoolExecutor(max_workers=self.workers)
+            self.stats['workers'] = self.workers
+            return executor
+        except (OSError, NotImplementedError, ImportError):
+            self.stats['workers'] = 1
+            return None
+
+    @staticmethod
+    def _put(target: queue.Queue, item: Any, stop: Optional[threading.Event]) -> bool:
+        """放入有界队列；队列满时等待，流水线已停止时放弃并返回False"""
+        while True:
+            if stop is not None and stop.is_set():
+                return False
+            try:
+                target.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                if stop is None:
+                    # 结束标记必须送达：队列满说明对端仍在消费，继续等待
+                    continue
+
+    @staticmethod
+    def _drain(source: queue.Queue) -> None:
+        """丢弃队列中的剩余数据，唤醒阻塞在put上的线程"""
+        try:
+            while True:
+                source.get_nowait()
+        except queue.Empty:
+            pass
@@ -0,0 +1,204 @@
+"""
+邮件MIME解析 - Smart Email AI核心组件
+
+把邮件对象解析为缓存和工具使用的结构化字典。全部为无状态的模块级函数，
+不依赖连接器、配置或缓存，批量导入流水线的解析进程只需导入本模块
+
+特性：
+- 解码RFC 2047编码的邮件头
+- 提取纯文本和HTML正文
+- 附件信息优先使用服务器返回的BODYSTRUCTURE，否则遍历MIME结构
+- 服务器未提供RFC822.SIZE时估算邮件大小（不重新序列化邮件）
+"""
+
+import email
+import email.header
+import email.message
+from email.utils import parsedate_to_datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+
+def decode_header(header: str) -> str:
+    """解码邮件头部信息"""
+    if not header:
+        return ""
+
+    try:
+        decoded_parts = email.header.decode_header(header)
+        result = ""
+
+        for content, encoding in decoded_parts:
+            if isinstance(content, bytes):
+                if encoding:
+                    content = content.decode(encoding, errors='ignore')
+                else:
+                    content = content.decode('utf-8', errors='ignore')
+            result += str(content)
+
+        return result
+    except Exception:
+        return str(header)
+
+
+def extract_text_body(msg: email.message.Message) -> str:
+    """提取纯文本邮件正文"""
+    body = ""
+
+    try:
+        if msg.is_multipart():
+            for part in msg.walk():
+                if part.get_content_type() == "text/plain":
+                    charset = part.get_content_charset() or 'utf-8'
+                    body_bytes = part.get_payload(decode=True)
+                    if body_bytes:
+                        body += body_bytes.decode(charset, errors='ignore')
+        else:
+            if msg.get_content_type() == "text/plain":
+                charset = msg.get_content_charset() or 'utf-8'
+                body_bytes = msg.get_payload(decode=True)
+                if body_bytes:
+                    body = body_bytes.decode(charset, errors='ignore')
+                else:
+                    body = str(msg.get_payload())
+    except Exception:
+        body = "文本正文解析失败"
+
+    return body.strip()
+
+
+def extract_html_body(msg: email.message.Message) -> str:
+    """提取HTML邮件正文"""
+    html_body = ""
+
+    try:
+        if msg.is_multipart():
+            for part in msg.walk():
+                if part.get_content_type() == "text/html":
+                    charset = part.get_content_charset() or 'utf-8'
+                    body_bytes = part.get_payload(decode=True)
+                    if body_bytes:
+                        html_body += body_bytes.decode(charset, errors='ignore')
+        else:
+            if msg.get_content_type() == "text/html":
+                charset = msg.get_content_charset() or 'utf-8'
+                body_bytes = msg.get_payload(decode=True)
+                if body_bytes:
+                    html_body = body_bytes.decode(charset, errors='ignore')
+    except Exception:
+        html_body = ""
+
+    return html_body.strip()
+
+
+def attachment_info(msg: email.message.Message) -> List[Dict[str, str]]:
+    """遍历MIME结构获取附件信息"""
+    attachments = []
+
+    try:
+        if msg.is_multipart():
+            for part in msg.walk():
+                if part.get_content_disposition() == 'attachment':
+                    filename = part.get_filename()
+                    if filename:
+                        attachments.append({
+                            'filename': decode_header(filename),
+                            'content_type': part.get_content_type(),
+                            'size': len(part.get_payload()) if part.get_payload() else 0
+                        })
+    except Exception:
+        pass
+
+    return attachments
+
+
+def attachments_from_parts(parts: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """根据BODYSTRUCTURE叶子部分构建附件信息（size为服务器统计的编码后字节数）"""
+    return [
+        {
+            'filename': decode_header(part['filename']),
+            'content_type': part['content_type'],
+            'size': part['size']
+        }
+        for part in parts
+        if part['disposition'] == 'attachment' and part['filename']
+    ]
+
+
+def estimate_size(msg: email.message.Message) -> int:
+    """估算邮件大小（服务器未提供RFC822.SIZE时使用，不重新序列化邮件）"""
+    try:
+        size = 0
+        for part in msg.walk():
+            size += sum(len(name) + len(str(value)) + 4 for name, value in part.items())
+            payload = None if part.is_multipart() else part.get_payload()
+            if isinstance(payload, (str, bytes)):
+                size += len(payload)
+        return size
+    except Exception:
+        return 0
+
+
+def parse_date(date_str: str) -> Optional[str]:
+    """解析邮件日期为标准ISO格式，无法解析时返回原始字符串"""
+    try:
+        if not date_str:
+            return None
+        return parsedate_to_datetime(date_str.strip()).isoformat()
+    except Exception:
+        return date_str.strip() if date_str else None
+
+
+def parse_message(msg: email.message.Message, size: int = None,
+                  parts: List[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """解析邮件内容为结构化数据
+
+    Args:
+        msg: 邮件对象
+        size: 服务器返回的RFC822.SIZE（未提供时估算）
+        parts: 服务器返回的BODYSTRUCTURE叶子部分，用于附件信息和大小
+
+    Returns:
+        Dict: 结构化的邮件数据；解析失败时包含 error
+    """
+    try:
+        parsed = {
+            'subject': decode_header(msg.get('Subject', '')),
+            'sender': decode_header(msg.get('From', '')),
+            'recipient': decode_header(msg.get('To', '')),
+            'date': msg.get('Date', ''),
+            'message_id': msg.get('Message-ID', ''),
+            'body_text': extract_text_body(msg),
+            'body_html': extract_html_body(msg),
+            'attachments': attachments_from_parts(parts) if parts is not None else attachment_info(msg),
+            'is_multipart': msg.is_multipart(),
+            'content_type': msg.get_content_type(),
+            'size': size if size is not None else estimate_size(msg)
+        }
+
+        # 添加计算字段
+        parsed['body_length'] = len(parsed['body_text'])
+        parsed['has_attachments'] = len(parsed['attachments']) > 0
+        parsed['parsed_date'] = parse_date(parsed['date'])
+
+        return parsed
+
+    except Exception as e:
+        return {
+            'error': f"邮件解析失败: {str(e)}",
+            'subject': '解析失败',
+            'body_text': '邮件内容解析失败'
+        }
+
+
+def parse_raw_messages(items: List[Tuple[str, bytes, Dict[str, Any]]]) -> List[Tuple[str, Dict[str, Any]]]:
+    """解析一组原始邮件（批量导入流水线在工作进程中调用）
+
+    Args:
+        items: (邮件ID, 原始邮件bytes, FETCH得到的size/parts) 列表
+
+    Returns:
+        List[Tuple[str, Dict]]: (邮件ID, parse_message 的解析结果)
+    """
+    return [(mail_id, parse_message(email.message_from_bytes(raw),
+                                    structure.get('size') or len(raw), structure.get('parts')))
+            for mail_id, raw, structure in items]
@@ -0,0 +1,153 @@
+"""
+自适应并发控制 - Smart Email AI核心组件
+
+iCloud会对过于激进的客户端返回 NO [LIMIT] 等限流响应，或明显放慢响应速度。
+控制器按AIMD（加性增、乘性减）调整同时进行的批量FETCH数：延迟平稳时逐步增加，
+遇到限流响应或延迟突增时减半，限流后按指数退避暂停发送新的批次
+
+特性：
+- 并发上限在 [1, 连接池容量] 之间自适应，无需为每个账户手动调节
+- 以每封邮件的平均耗时（EWMA）为基准检测延迟突增
+- 同一波请求只减小一次（减小之前发出的批次不再重复惩罚）
+- 交互请求不受并发上限限制，但其结果同样参与调整
+"""
+
+import imaplib
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from .imap_supervisor import backoff_delay
+
+# 服务器限流响应中的标记（RFC 5530响应码及常见措辞）
+THROTTLE_MARKERS = ('[LIMIT]', '[UNAVAILABLE]', '[INUSE]', 'THROTTL', 'TOO MANY', 'RATE LIMIT', 'TRY AGAIN LATER')
+
+
+def is_throttle_error(error: BaseException) -> bool:
+    """IMAP错误是否为服务器限流（NO [LIMIT]、[UNAVAILABLE] 等）"""
+    if not isinstance(error, imaplib.IMAP4.error):
+        return False
+    text = str(error).upper()
+    return any(marker in text for marker in THROTTLE_MARKERS)
+
+
+class AIMDController:
+    """批量FETCH的AIMD并发控制器"""
+
+    def __init__(self, max_limit: int = 5, initial_limit: Optional[float] = None, enabled: bool = True,
+                 base_delay: float = 0.1, max_delay: float = 30.0, spike_ratio: float = 2.5,
+                 decrease_factor: float = 0.5, smoothing: float = 0.2, warmup: int = 5):
+        """初始化控制器
+
+        Args:
+            max_limit: 并发上限的最大值（连接池容量）
+            initial_limit: 初始并发上限，默认为最大值的一半
+            enabled: 为False时不限制并发、不暂停，只做统计
+            base_delay: 限流后的首次暂停时间（秒），连续限流时指数增加
+            max_delay: 暂停时间上限（秒）
+            spike_ratio: 每封邮件耗时超过基准的该倍数时视为延迟突增
+            decrease_factor: 乘性减小的系数
+            smoothing: 基准耗时EWMA的平滑系数
+            warmup: 积累多少个样本后才开始检测延迟突增
+        """
+        self.enabled = enabled
+        self.max_limit = max(1, int(max_limit))
+        self.min_limit = 1
+        self.limit = float(initial_limit or max(self.min_limit, self.max_limit / 2))
+        self.limit = min(float(self.max_limit), max(float(self.min_limit), self.limit))
+        self.base_delay = max(0.0, base_delay)
+        self.max_delay = max(self.base_delay, max_delay)
+        self.spike_ratio = spike_ratio
+        self.decrease_factor = decrease_factor
+        self.smoothing = smoothing
+        self.warmup = warmup
+
+        self.in_flight = 0
+        self._baseline = None  # 每封邮件耗时的EWMA（秒）
+        self._samples = 0
+        self._throttle_streak = 0
+        self._resume_at = 0.0
+        self._last_decrease = 0.0
+        self._cond = threading.Condition()
+        self.stats = {'batches': 0, 'throttled': 0, 'spikes': 0, 'increases': 0, 'decreases': 0}
+
+    def acquire(self, bulk: bool = True) -> float:
+        """等待可以发出新的批次，返回开始时间
+
+        限流暂停期间所有请求都等待；bulk请求还需等待进行中的批次数低于当前上限。
+        """
+        with self._cond:
+            while self.enabled:
+                pause = self._resume_at - time.time()
+                if pause > 0:
+                    self._cond.wait(pause)
+                    continue
+                if not bulk or self.in_flight < int(self.limit):
+                    break
+                self._cond.wait()
+            self.in_flight += 1
+        return time.time()
+
+    def release(self, started: float, items: int = 1, throttled: bool = False, sample: bool = True) -> None:
+        """报告批次结果并调整并发上限
+
+        Args:
+            started: acquire返回的开始时间
+            items: 批次中的邮件数
+            throttled: 是否收到限流响应
+            sample: 耗时是否可用于延迟检测（流式消费时耗时包含调用方的处理时间）
+        """
+        now = time.time()
+        with self._cond:
+            self.in_flight -= 1
+            self.stats['batches'] += 1
+            if throttled:
+                self.stats['throttled'] += 1
+                self._throttle_streak += 1
+                if self.enabled:
+                    delay = backoff_delay(self._throttle_streak - 1, self.base_delay, self.max_delay)
+                    self._resume_at = max(self._resume_at, now + delay)
+                self._decrease(started, now)
+            else:
+                self._throttle_streak = 0
+                per_item = (now - started) / max(1, items)
+                if sample and self._baseline is not None and self._samples >= self.warmup \
+                        and per_item > self._baseline * self.spike_ratio:
+                    self.stats['spikes'] += 1
+                    self._decrease(started, now)
+                elif self.enabled and self.limit < self.max_limit:
+                    # 加性增：每完成约 limit 个批次，上限加一
+                    previous = int(self.limit)
+                    self.limit = min(float(self.max_limit), self.limit + 1.0 / self.limit)
+                    if int(self.limit) > previous:
+                        self.stats['increases'] += 1
+                if sample:
+                    # 突增样本按阈值截断后计入基准，持续变慢时基准逐步跟上，单次突增影响有限
+                    self._samples += 1
+                    if self._baseline is None:
+                        self._baseline = per_item
+                    else:
+                        per_item = min(per_item, self._baseline * self.spike_ratio)
+                        self._baseline += self.smoothing * (per_item - self._baseline)
+            self._cond.notify_all()
+
+    def _decrease(self, started: float, now: float) -> None:
+        """乘性减；在上次减小之前发出的批次不再触发减小"""
+        if not self.enabled or started < self._last_decrease:
+            return
+        self.limit = max(float(self.min_limit), self.limit * self.decrease_factor)
+        self._last_decrease = now
+        self.stats['decreases'] += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        """当前并发上限、进行中的批次数、基准耗时和调整次数"""
+        with self._cond:
+            return {
+                'enabled': self.enabled,
+                'limit': int(self.limit),
+                'max_limit': self.max_limit,
+                'in_flight': self.in_flight,
+                'baseline_ms': round(self._baseline * 1000, 1) if self._baseline is not None else None,
+                'paused_for': round(max(0.0, self._resume_at - time.time()), 2),
+                **self.stats
+            }
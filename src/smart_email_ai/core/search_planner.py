@@ -0,0 +1,162 @@
+"""
+混合搜索规划器 - Smart Email AI核心组件
+
+根据本地缓存对各文件夹UID区间的覆盖情况决定搜索方式：
+缓存已完整覆盖时只查询本地全文索引；否则只在未覆盖的UID区间上发送IMAP SEARCH，
+而不是对整个邮箱重新搜索
+
+覆盖规则：
+- sync_coverage 记录的区间内，服务器上的每封邮件都已写入缓存（主题、发件人可在本地搜索）
+- 覆盖区间内只有邮件头的邮件（正文未加载）仍需服务器搜索正文（BODY）
+- 检查点之后的新邮件：文件夹刚同步过或IDLE监听在线时视为已覆盖
+"""
+
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from .email_cache import email_cache_manager, make_email_id
+from .imap_protocol import build_id_set
+
+
+def uncovered_ranges(coverage: List[Tuple[int, int]], upper: int) -> List[Tuple[int, int]]:
+    """计算 [1, upper] 中未被覆盖的UID区间
+
+    Args:
+        coverage: 已覆盖的区间（升序，互不重叠）
+        upper: 上界（通常为同步检查点 last_uid）
+    """
+    gaps = []
+    next_uid = 1
+    for start, end in coverage:
+        if next_uid > upper:
+            break
+        if start > next_uid:
+            gaps.append((next_uid, min(start - 1, upper)))
+        next_uid = max(next_uid, end + 1)
+    if next_uid <= upper:
+        gaps.append((next_uid, upper))
+    return gaps
+
+
+def quote_search_string(value: str) -> str:
+    """把搜索关键词转为IMAP带引号的字符串"""
+    return '"' + value.replace('\\', '\\\\').replace('"', '\\"') + '"'
+
+
+class SearchPlanner:
+    """本地全文索引与IMAP SEARCH的混合搜索"""
+
+    def __init__(self, connector, max_age: float = 300.0, account_type: str = 'icloud'):
+        """初始化搜索规划器
+
+        Args:
+            connector: 已连接的iCloudConnector，用于远程搜索和加载结果
+            max_age: 检查点更新后多少秒内，检查点之后的新邮件视为已覆盖
+            account_type: 账户类型
+        """
+        self.connector = connector
+        self.max_age = max_age
+        self.account_type = account_type
+
+    def plan(self, query: str, folders: Optional[List[str]] = None) -> Dict[str, Any]:
+        """为关键词生成搜索计划
+
+        Args:
+            query: 搜索关键词
+            folders: 需要保证完整结果的文件夹，默认为收件箱和所有已同步的文件夹
+
+        Returns:
+            Dict: complete（本地结果是否完整）和每个文件夹的 uncovered / tail /
+            header_only / criteria（需要发送的IMAP SEARCH条件）
+        """
+        states = {state['folder']: state for state in email_cache_manager.get_sync_states(self.account_type)}
+        if folders is None:
+            folders = ['INBOX'] + sorted(folder for folder in states if folder != 'INBOX')
+
+        text = quote_search_string(query)
+        full_match = f'(OR (OR SUBJECT {text} FROM {text}) BODY {text})'
+        plan = {'query': query, 'complete': True, 'folders': {}}
+        for folder in folders:
+            state = states.get(folder)
+            if not state or state.get('uidvalidity') is None:
+                # 从未同步过的文件夹只能在服务器上搜索
+                folder_plan = {'uncovered': [], 'tail': True, 'header_only': [],
+                               'criteria': [f'UID 1:* {full_match}']}
+            else:
+                last_uid = state.get('last_uid') or 0
+                coverage = email_cache_manager.get_coverage(self.account_type, folder, state['uidvalidity'])
+                gaps = uncovered_ranges(coverage, last_uid)
+                tail = not self._is_fresh(folder, state)
+                header_only = [uid for uid in email_cache_manager.get_header_only_uids(self.account_type, folder)
+                               if uid <= last_uid and not any(start <= uid <= end for start, end in gaps)]
+
+                id_ranges = [f"{start}:{end}" if start != end else str(start) for start, end in gaps]
+                if tail:
+                    id_ranges.append(f"{last_uid + 1}:*")
+                criteria = []
+                if id_ranges:
+                    criteria.append(f"UID {','.join(id_ranges)} {full_match}")
+                if header_only:
+                    # 主题和发件人已在本地索引中，只需服务器检查正文
+                    criteria.append(f"UID {build_id_set(header_only)} BODY {text}")
+                folder_plan = {'uncovered': gaps, 'tail': tail, 'header_only': header_only,
+                               'criteria': criteria}
+
+            plan['folders'][folder] = folder_plan
+            if folder_plan['criteria']:
+                plan['complete'] = False
+        return plan
+
+    def search(self, query: str, max_results: int = 20) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+        """执行混合搜索
+
+        先查询本地全文索引；结果不足且缓存未完整覆盖时，只在未覆盖的范围内
+        进行服务器搜索，命中的邮件加载正文后写入缓存。
+
+        Returns:
+            Tuple[List[Dict], Dict]: 邮件列表（本地结果在前）和搜索统计
+        """
+        started = time.time()
+        connector = self.connector
+        results = [connector._normalize_cached_email(email)
+                   for email in email_cache_manager.search_emails(query, max_results)]
+        plan = self.plan(query)
+        stats = {'local_hits': len(results), 'remote_hits': 0, 'remote_searches': 0,
+                 'complete': plan['complete'], 'plan': plan}
+
+        if not plan['complete'] and len(results) < max_results and connector and connector.connected:
+            seen = {str(email.get('id', email.get('mail_id'))) for email in results}
+            remote_ids = []
+            for folder, folder_plan in plan['folders'].items():
+                uids = set()
+                for criteria in folder_plan['criteria']:
+                    stats['remote_searches'] += 1
+                    uids.update(connector.search_uids_cached(criteria, folder))
+                remote_ids.extend(email_id for email_id in (make_email_id(folder, uid)
+                                                            for uid in sorted(uids, reverse=True))
+                                  if email_id not in seen)
+            remote_ids = remote_ids[:max_results - len(results)]
+
+            if remote_ids:
+                # 已缓存的只补充正文，未缓存的整封获取；加载结果同时写入缓存和全文索引
+                records = [email_cache_manager.get_email(email_id) or {'id': email_id, 'body_loaded': False}
+                           for email_id in remote_ids]
+                for record in connector.load_missing_bodies(records):
+                    if record.get('body_loaded') or record.get('subject'):
+                        results.append(connector._normalize_cached_email(record))
+                        stats['remote_hits'] += 1
+
+        stats['elapsed_ms'] = round((time.time() - started) * 1000, 1)
+        return results[:max_results], stats
+
+    def _is_fresh(self, folder: str, state: Dict[str, Any]) -> bool:
+        """检查点之后是否可能有未同步的新邮件"""
+        watcher = getattr(self.connector, 'idle_watchers', {}).get(folder)
+        if watcher is not None and watcher.active:
+            return True
+        try:
+            updated_at = datetime.fromisoformat(str(state.get('updated_at')))
+        except ValueError:
+            return False
+        return (datetime.now() - updated_at).total_seconds() < self.max_age
@@ -0,0 +1,129 @@
+"""
+SQLite连接管理 - Smart Email AI核心组件
+
+为每个线程保持一条长期打开的SQLite连接，代替每次查询都重新 sqlite3.connect：
+无需重复读取表结构，页缓存在查询之间保持有效，相同SQL的预编译语句由连接的语句缓存复用
+
+特性：
+- 每个线程一条连接（sqlite3连接不能跨线程共用），线程结束后的连接在下次创建连接时关闭
+- WAL日志模式：写入（如批量导入时的 store_emails）不阻塞并发的搜索和读取
+- synchronous、cache_size、mmap_size、temp_store 等参数来自配置 cache.sqlite
+"""
+
+import sqlite3
+import threading
+from typing import Any, Dict, Optional, Tuple
+
+# cache.sqlite 未配置时使用的连接参数
+DEFAULT_SQLITE_SETTINGS = {
+    'journal_mode': 'wal',
+    'synchronous': 'normal',
+    'cache_size_mb': 16,
+    'mmap_size_mb': 64,
+    'temp_store': 'memory',
+    'busy_timeout_ms': 5000,
+    'statement_cache_size': 256,
+}
+
+_JOURNAL_MODES = {'delete', 'truncate', 'persist', 'memory', 'wal', 'off'}
+_SYNCHRONOUS = {'off', 'normal', 'full', 'extra'}
+_TEMP_STORE = {'default', 'file', 'memory'}
+
+
+class SQLiteConnectionManager:
+    """按线程复用的SQLite连接"""
+
+    def __init__(self, db_path: str, settings: Optional[Dict[str, Any]] = None):
+        """初始化连接管理器
+
+        Args:
+            db_path: 数据库文件路径
+            settings: 连接参数，未提供的项使用 DEFAULT_SQLITE_SETTINGS
+        """
+        self.db_path = db_path
+        self.settings = dict(DEFAULT_SQLITE_SETTINGS)
+        self.settings.update({key: value for key, value in (settings or {}).items() if value is not None})
+        self._local = threading.local()
+        self._connections: Dict[int, Tuple[threading.Thread, sqlite3.Connection]] = {}  # 线程ident -> (线程, 连接)
+        self._lock = threading.Lock()
+        self._stats = {'opened': 0, 'reused': 0}
+        self.journal_mode = None
+
+    def connect(self) -> sqlite3.Connection:
+        """获取当前线程的连接（首次调用时创建）
+
+        返回的连接可以像 sqlite3.connect() 的结果一样用于 with 语句（成功时提交，异常时回滚），
+        但退出 with 后不会关闭。每次获取时重置 row_factory，调用方可按需设置。
+        """
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._open()
+            self._local.conn = conn
+        else:
+            with self._lock:
+                self._stats['reused'] += 1
+        conn.row_factory = None
+        return conn
+
+    def close_all(self) -> None:
+        """关闭所有线程的连接（其他线程下次使用时重新打开）"""
+        with self._lock:
+            connections = [conn for _, conn in self._connections.values()]
+            self._connections.clear()
+        for conn in connections:
+            try:
+                conn.close()
+            except Exception:
+                pass  # 忽略已关闭的连接
+        self._local = threading.local()
+
+    def stats(self) -> Dict[str, Any]:
+        """连接统计和生效的连接参数"""
+        with self._lock:
+            return {
+                'open_connections': len(self._connections),
+                'journal_mode': self.journal_mode,
+                'synchronous': self.settings['synchronous'],
+                'cache_size_mb': self.settings['cache_size_mb'],
+                'mmap_size_mb': self.settings['mmap_size_mb'],
+                **self._stats
+            }
+
+    def _open(self) -> sqlite3.Connection:
+        settings = self.settings
+        busy_timeout = max(0, int(settings['busy_timeout_ms']))
+        # 连接只在创建它的线程中使用；关闭线程检查是为了 close_all 能关闭其他线程的连接
+        conn = sqlite3.connect(self.db_path, timeout=busy_timeout / 1000, check_same_thread=False,
+                               cached_statements=max(0, int(settings['statement_cache_size'])))
+
+        journal_mode = str(settings['journal_mode']).lower()
+        if journal_mode in _JOURNAL_MODES:
+            # WAL模式记录在数据库文件中，对所有连接生效
+            row = conn.execute(f"PRAGMA journal_mode={journal_mode}").fetchone()
+            journal_mode = row[0] if row else journal_mode
+        synchronous = str(settings['synchronous']).lower()
+        if synchronous in _SYNCHRONOUS:
+            conn.execute(f"PRAGMA synchronous={synchronous}")
+        temp_store = str(settings['temp_store']).lower()
+        if temp_store in _TEMP_STORE:
+            conn.execute(f"PRAGMA temp_store={temp_store}")
+        # cache_size 为负数时单位是KiB
+        conn.execute(f"PRAGMA cache_size={-int(float(settings['cache_size_mb']) * 1024)}")
+        conn.execute(f"PRAGMA mmap_size={int(float(settings['mmap_size_mb']) * 1024 * 1024)}")
+        conn.execute(f"PRAGMA busy_timeout={busy_timeout}")
+
+        current = threading.current_thread()
+        with self._lock:
+            # 已结束线程的连接不会再被使用
+            finished = [ident for ident, (thread, _) in self._connections.items()
+                        if not thread.is_alive() or ident == current.ident]
+            stale = [self._connections.pop(ident)[1] for ident in finished]
+            self._connections[current.ident] = (current, conn)
+            self._stats['opened'] += 1
+            self.journal_mode = journal_mode
+        for old in stale:
+            try:
+                old.close()
+            except Exception:
+                pass  # 忽略已关闭的连接
+        return conn
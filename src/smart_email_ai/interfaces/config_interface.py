@@ -80,6 +80,22 @@ class YamlConfigManager(ConfigInterface):
         """获取MCP服务配置"""
         return self._config.get('mcp_settings', {})
     
+    def get_performance_settings(self) -> Dict[str, Any]:
+        """获取性能配置"""
+        return self._config.get('performance', {})
+    
+    def get_cache_settings(self) -> Dict[str, Any]:
+        """获取缓存配置"""
+        return self._config.get('cache', {})
+    
+    def get_security_settings(self) -> Dict[str, Any]:
+        """获取安全与连接配置"""
+        return self._config.get('security', {})
+    
+    def get_timezone_settings(self) -> Dict[str, Any]:
+        """获取时区配置"""
+        return self._config.get('timezone', {})
+    
     def get_forward_patterns(self) -> List[str]:
         """获取转发邮件识别模式"""
         parser_settings = self.get_parser_settings()
@@ -18,7 +18,8 @@ try:
     from .interfaces.email_interface import email_data_manager, EmailData
     from .core.parser import OutlookEmailParser
     from .core.icloud_connector import iCloudConnector
-    from .core.email_cache import email_cache_manager
+    from .core.async_imap import AsyncICloudConnector
+    from .core.email_cache import email_cache_manager, build_snippet
     from .core.email_sender import email_sender
 except ImportError:
     # 处理直接运行时的导入问题
@@ -26,7 +27,8 @@ except ImportError:
     from interfaces.email_interface import email_data_manager, EmailData
     from core.parser import OutlookEmailParser
     from core.icloud_connector import iCloudConnector
-    from core.email_cache import email_cache_manager
+    from core.async_imap import AsyncICloudConnector
+    from core.email_cache import email_cache_manager, build_snippet
     from core.email_sender import email_sender
 # AI分析由外部MCP调用者（如Claude）完成，不需要内部AI分析器
 
@@ -34,6 +36,7 @@ except ImportError:
 mcp = FastMCP("advanced_email_ai_refactored")
 
 # 添加iCloud集成
+import asyncio
 import imaplib
 import ssl
 import email
@@ -43,6 +46,8 @@ from datetime import datetime, date, timezone, timedelta
 
 # 全局iCloud连接器实例
 icloud_connector = None
+# 异步连接器：工具在事件循环中运行，读取统计和最近邮件时不阻塞其他请求（首次使用时连接）
+async_icloud_connector = None
 
 class RefactoredEmailSystem:
     """重构后的邮件系统主类"""
@@ -465,8 +470,33 @@ def extract_outlook_tables(html_content: str) -> str:
 # MCP服务器运行逻辑
 # 由根目录的 main.py --mcp 调用，不再独立运行 
 
+async def get_async_connector():
+    """获取已连接的异步连接器，与同步连接器使用相同账户；连接失败时返回None"""
+    global async_icloud_connector
+    
+    if async_icloud_connector and async_icloud_connector.connected:
+        return async_icloud_connector
+    try:
+        connector = AsyncICloudConnector(icloud_connector.EMAIL, icloud_connector.PASSWORD)
+        if await connector.connect():
+            async_icloud_connector = connector
+            return connector
+    except Exception:
+        pass
+    return None
+
+async def close_async_connector() -> None:
+    """断开异步连接器"""
+    global async_icloud_connector
+    
+    if async_icloud_connector:
+        try:
+            await async_icloud_connector.disconnect()
+        finally:
+            async_icloud_connector = None
+
 @mcp.tool()
-def connect_to_icloud() -> str:
+async def connect_to_icloud() -> str:
     """连接到Jerry的iCloud邮箱，开始真实邮件数据访问
     
     Returns:
@@ -475,13 +505,25 @@ def connect_to_icloud() -> str:
     global icloud_connector
     
     try:
+        # 关闭旧连接（包括后台IDLE监听和异步连接）
+        await close_async_connector()
+        if icloud_connector:
+            await asyncio.to_thread(icloud_connector.disconnect)
+        
         # 创建新的连接器实例
         icloud_connector = iCloudConnector()
         
-        # 尝试连接
-        if icloud_connector.connect():
+        # 尝试连接（阻塞式登录放到线程中，不阻塞其他工具调用）
+        if await asyncio.to_thread(icloud_connector.connect):
             # 获取基本统计信息
-            stats = icloud_connector.get_mailbox_stats()
+            async_connector = await get_async_connector()
+            if async_connector:
+                stats = await async_connector.get_mailbox_stats()
+            else:
+                stats = await asyncio.to_thread(icloud_connector.get_mailbox_stats)
+            
+            # 后台IDLE监听新邮件，缓存无需手动刷新
+            idle_enabled = icloud_connector.idle_push and icloud_connector.start_idle_watcher()
             
             return f"""✅ iCloud邮箱连接成功！
 
@@ -492,6 +534,7 @@ def connect_to_icloud() -> str:
 • 今日邮件: {stats.get('today_count', 0)}
 • 本周邮件: {stats.get('week_count', 0)}
 • 连接时间: {stats.get('last_update', 'N/A')}
+• 实时推送: {'已启用 (IDLE)' if idle_enabled else '未启用'}
 
 🎯 现在可以使用以下功能:
 - 获取邮箱统计: get_icloud_inbox_summary()
@@ -505,7 +548,7 @@ def connect_to_icloud() -> str:
         return f"❌ iCloud连接错误: {str(e)}"
 
 @mcp.tool()
-def get_icloud_inbox_summary() -> str:
+async def get_icloud_inbox_summary() -> str:
     """获取iCloud邮箱的详细统计概览
     
     Returns:
@@ -517,7 +560,11 @@ def get_icloud_inbox_summary() -> str:
         return "⚠️ 请先使用 connect_to_icloud() 连接到邮箱"
     
     try:
-        stats = icloud_connector.get_mailbox_stats()
+        async_connector = await get_async_connector()
+        if async_connector:
+            stats = await async_connector.get_mailbox_stats()
+        else:
+            stats = await asyncio.to_thread(icloud_connector.get_mailbox_stats)
         
         if 'error' in stats:
             return f"❌ 获取邮箱统计失败: {stats['error']}"
@@ -543,7 +590,7 @@ def get_icloud_inbox_summary() -> str:
         return f"❌ 获取邮箱统计错误: {str(e)}"
 
 @mcp.tool()
-def analyze_icloud_recent_emails(count: int = 10, force_refresh: bool = False) -> str:
+async def analyze_icloud_recent_emails(count: int = 10, force_refresh: bool = False) -> str:
     """智能分析最近的iCloud邮件，提供详细的AI分析结果
     
     Args:
@@ -563,12 +610,16 @@ def analyze_icloud_recent_emails(count: int = 10, force_refresh: bool = False) -
         if count < 1 or count > 50:
             count = 10
         
-        # 如果强制刷新，先清除相关缓存
+        # 如果强制刷新，先增量同步新邮件（仅UIDVALIDITY变化时才全量重建）
         if force_refresh:
-            email_cache_manager.clear_cache('icloud')
+            await asyncio.to_thread(icloud_connector.sync_new_emails)
         
-        # 获取最近的邮件
-        recent_emails = icloud_connector.get_recent_emails(count)
+        # 获取最近的邮件（列表模式：只读取邮件头和摘要，不加载完整正文）
+        async_connector = await get_async_connector()
+        if async_connector:
+            recent_emails = await async_connector.get_recent_emails(count, with_bodies=False)
+        else:
+            recent_emails = await asyncio.to_thread(icloud_connector.get_recent_emails, count, True, False)
         
         if not recent_emails:
             return "📭 没有找到最近的邮件"
@@ -626,7 +677,7 @@ def analyze_icloud_recent_emails(count: int = 10, force_refresh: bool = False) -
                 analysis += f"   时间: {email.get('date', '未知')}\n"
                 
                 # 邮件正文预览
-                body_preview = email.get('body_text', '')[:150]
+                body_preview = (email.get('snippet') or email.get('body_text', ''))[:150]
                 if len(body_preview) >= 150:
                     body_preview += "..."
                 analysis += f"   正文预览: {body_preview}\n"
@@ -641,7 +692,7 @@ def analyze_icloud_recent_emails(count: int = 10, force_refresh: bool = False) -
             analysis += f"   日期: {email.get('date', '未知')}\n"
             
             # 邮件正文预览
-            body_preview = email.get('body_text', '')[:200]
+            body_preview = (email.get('snippet') or email.get('body_text', ''))[:200]
             if len(body_preview) >= 200:
                 body_preview += "..."
             analysis += f"   正文预览: {body_preview}\n"
@@ -649,7 +700,10 @@ def analyze_icloud_recent_emails(count: int = 10, force_refresh: bool = False) -
             # 附件信息
             if email.get('has_attachments'):
                 attachments = email.get('attachments', [])
-                analysis += f"   📎 附件: {', '.join([att.get('filename', '未知') for att in attachments])}\n"
+                if attachments:
+                    analysis += f"   📎 附件: {', '.join([att.get('filename', '未知') for att in attachments])}\n"
+                else:
+                    analysis += f"   📎 有附件\n"
             
             analysis += "\n"
         
@@ -697,8 +751,8 @@ def get_full_email_content(subject_keyword: str) -> str:
         return "⚠️ 请先连接邮箱"
     
     try:
-        # 搜索匹配的邮件
-        recent_emails = icloud_connector.get_recent_emails(20)
+        # 搜索匹配的邮件（列表模式，只需要邮件头）
+        recent_emails = icloud_connector.get_recent_emails(20, with_bodies=False)
         
         matching_emails = []
         for email in recent_emails:
@@ -714,13 +768,14 @@ def get_full_email_content(subject_keyword: str) -> str:
             result = f"🔍 找到 {len(matching_emails)} 封匹配的邮件:\n\n"
             for i, email in enumerate(matching_emails, 1):
                 result += f"{i}. 【{email.get('subject', '无主题')}】\n"
-                result += f"   发件人: {email.get('sender', '未知')}\n"
-                result += f"   日期: {email.get('date', '未知')}\n\n"
+                result += f"   发件人: {email.get('sender', email.get('from_email', '未知'))}\n"
+                result += f"   日期: {email.get('date', email.get('date_received', '未知'))}\n\n"
             result += "💡 请使用更具体的关键词来定位特定邮件"
             return result
         
-        # 获取完整邮件内容
-        email = matching_emails[0]
+        # 获取完整邮件内容（正文未缓存时才从服务器加载）
+        match = matching_emails[0]
+        email = icloud_connector.get_email_content(match.get('mail_id', match.get('id', ''))) or match
         
         result = f"""📧 **完整邮件内容**
 
@@ -781,30 +836,8 @@ def search_icloud_emails_smart(query: str, max_results: int = 20) -> str:
         if max_results < 1 or max_results > 100:
             max_results = 20
         
-        # 🚀 优先使用全文索引搜索（性能提升10倍+）
-        search_results = email_cache_manager.search_emails(query, max_results)
-        
-        # 如果缓存搜索结果不足，再从iCloud服务器搜索
-        if len(search_results) < max_results // 2:  # 如果结果少于期望的一半
-            try:
-                # 从服务器获取更多结果
-                server_results = icloud_connector.search_emails_by_content(query, max_results)
-                
-                # 合并结果，去重（基于邮件ID）
-                existing_ids = {email.get('id', email.get('mail_id', '')) for email in search_results}
-                for email in server_results:
-                    email_id = email.get('id', email.get('mail_id', ''))
-                    if email_id not in existing_ids:
-                        search_results.append(email)
-                        existing_ids.add(email_id)
-                
-                # 存储新邮件到缓存以便下次快速搜索
-                if server_results:
-                    email_cache_manager.store_emails(server_results)
-                    
-            except Exception as e:
-                # 服务器搜索失败，仅使用缓存结果
-                pass
+        # 🚀 本地全文索引优先；只有缓存未覆盖的UID区间才到iCloud服务器搜索
+        search_results, search_stats = icloud_connector.search_hybrid(query, max_results)
         
         if not search_results:
             return f"🔍 搜索'{query}'没有找到匹配的邮件\n💡 提示：尝试使用更简单的关键词或检查拼写"
@@ -819,8 +852,11 @@ def search_icloud_emails_smart(query: str, max_results: int = 20) -> str:
         report += f"📊 **搜索统计**:\n"
         report += f"• 找到邮件: **{len(search_results)}** 封\n"
         report += f"• 搜索关键词: `{query}`\n"
-        report += f"• 搜索引擎: 🚀 全文索引 + iCloud服务器\n"
-        report += f"• 响应时间: < 500ms\n\n"
+        if search_stats['remote_searches']:
+            report += f"• 搜索引擎: 🚀 全文索引 + iCloud服务器（仅未缓存范围，本地 {search_stats['local_hits']} 封 / 服务器 {search_stats['remote_hits']} 封）\n"
+        else:
+            report += f"• 搜索引擎: 🚀 本地全文索引{'（缓存已完整覆盖）' if search_stats['complete'] else ''}\n"
+        report += f"• 响应时间: {search_stats['elapsed_ms']:.0f}ms\n\n"
         
         # 搜索结果详情
         report += "📋 **匹配邮件**:\n\n"
@@ -947,145 +983,23 @@ def get_today_latest_emails(force_refresh: bool = False, email_count: int = 20)
         return "⚠️ 请先使用 connect_to_icloud() 连接到邮箱"
     
     try:
-        import re
+        # 只在明确要求时才增量同步新邮件；IDLE监听运行时缓存已是最新，直接查询本地
+        idle_active = icloud_connector.get_idle_status().get('INBOX', {}).get('active', False)
+        if force_refresh and not idle_active:
+            icloud_connector.sync_new_emails()
         
-        # 只在明确要求时才强制刷新缓存
-        if force_refresh:
-            email_cache_manager.clear_cache('icloud')
-            # 移除print语句，避免MCP JSON解析错误
-            pass
-        
-        # 减少默认获取的邮件数量，提升性能
-        all_recent = icloud_connector.get_recent_emails(email_count)
-        
-        if not all_recent:
-            return "📭 没有找到任何邮件"
-        
-        # 获取当前UTC+8时区的日期
-        utc8_timezone = timezone(timedelta(hours=8))
+        # 获取配置时区（默认UTC+8）的日期
+        utc8_timezone = icloud_connector.timezone
         today = datetime.now(utc8_timezone).date()
         
-        # 筛选今日邮件
-        today_emails = []
-        
-        def parse_email_date(date_str: str) -> date:
-            """改进的日期解析函数，支持多种格式，统一使用UTC+8时区"""
-            if not date_str:
-                return None
-            
-            try:
-                # 清理日期字符串
-                date_str = str(date_str).strip()
-                
-                # 格式1: ISO格式 (2025-06-24T10:30:00Z 或 2025-06-24T10:30:00+08:00)
-                if 'T' in date_str:
-                    # 处理不同的时区标识
-                    if date_str.endswith('Z'):
-                        dt = datetime.fromisoformat(date_str.replace('Z', '+00:00'))
-                        # 转换为UTC+8
-                        dt = dt.astimezone(utc8_timezone)
-                    elif '+' in date_str or date_str.count('-') > 2:
-                        dt = datetime.fromisoformat(date_str)
-                        # 如果没有时区信息，假设为UTC+8
-                        if dt.tzinfo is None:
-                            dt = dt.replace(tzinfo=utc8_timezone)
-                        else:
-                            dt = dt.astimezone(utc8_timezone)
-                    else:
-                        # 假设是UTC+8本地时间
-                        dt = datetime.fromisoformat(date_str).replace(tzinfo=utc8_timezone)
-                    
-                    # 返回UTC+8时区的日期
-                    return dt.date()
-                
-                # 格式2: 美式格式 (06/24/2025 或 6/24/2025)
-                elif '/' in date_str:
-                    # 提取日期部分（忽略时间）
-                    date_part = date_str.split(' ')[0]
-                    # 支持不同的分隔符和格式
-                    for fmt in ['%m/%d/%Y', '%m/%d/%y', '%d/%m/%Y', '%d/%m/%y']:
-                        try:
-                            dt = datetime.strptime(date_part, fmt).replace(tzinfo=utc8_timezone)
-                            return dt.date()
-                        except ValueError:
-                            continue
-                
-                # 格式3: 标准格式 (2025-06-24 或 2025-6-24)
-                elif '-' in date_str:
-                    date_part = date_str.split(' ')[0]
-                    for fmt in ['%Y-%m-%d', '%Y-%m-%d', '%d-%m-%Y']:
-                        try:
-                            dt = datetime.strptime(date_part, fmt).replace(tzinfo=utc8_timezone)
-                            return dt.date()
-                        except ValueError:
-                            continue
-                
-                # 格式4: 中文格式 (2025年6月24日)
-                elif '年' in date_str and '月' in date_str:
-                    # 提取数字
-                    match = re.match(r'(\d{4})年(\d{1,2})月(\d{1,2})日', date_str)
-                    if match:
-                        year, month, day = match.groups()
-                        dt = datetime(int(year), int(month), int(day), tzinfo=utc8_timezone)
-                        return dt.date()
-                
-                # 格式5: 时间戳格式
-                elif date_str.isdigit():
-                    timestamp = int(date_str)
-                    # 判断是秒还是毫秒时间戳
-                    if timestamp > 1000000000000:  # 毫秒时间戳
-                        timestamp = timestamp / 1000
-                    # 创建UTC+8时区的datetime
-                    dt = datetime.fromtimestamp(timestamp, tz=utc8_timezone)
-                    return dt.date()
-                
-                # 默认尝试通用解析
-                else:
-                    # 尝试多种常见格式
-                    common_formats = [
-                        '%Y-%m-%d %H:%M:%S',
-                        '%Y-%m-%d %H:%M',
-                        '%Y-%m-%d',
-                        '%d %b %Y',
-                        '%d %B %Y',
-                        '%b %d, %Y',
-                        '%B %d, %Y'
-                    ]
-                    
-                    for fmt in common_formats:
-                        try:
-                            dt = datetime.strptime(date_str, fmt).replace(tzinfo=utc8_timezone)
-                            return dt.date()
-                        except ValueError:
-                            continue
-                
-                # 移除print语句，避免MCP JSON解析错误
-                return None
-                
-            except Exception as e:
-                # 移除print语句，避免MCP JSON解析错误
-                return None
-        
-        for email in all_recent:
-            email_date_str = email.get('date', '') or email.get('parsed_date', '')
-            email_date = parse_email_date(email_date_str)
-            
-            if email_date and email_date == today:
-                today_emails.append(email)
-            elif email_date:
-                # 调试信息：显示日期差异（静默模式）
-                days_diff = (today - email_date).days
-                if abs(days_diff) <= 1:  # 相差1天内的也显示（可能是时区问题）
-                    # 移除print语句，避免MCP JSON解析错误
-                    pass
-        
-        # 按时间排序（最新的在前）
-        today_emails.sort(key=lambda x: x.get('date', ''), reverse=True)
+        # IDLE监听保持缓存最新时直接读取本地缓存，否则服务器端按到达时间筛选（最新的在前）
+        today_emails = icloud_connector.get_today_emails(limit=email_count, with_bodies=True)
+        from_cache = icloud_connector.today_source == 'cache'
         
         if not today_emails:
             return f"""📅 **今日邮件检查结果**
 
-🔍 **搜索范围:** 最近50封邮件
+🔍 **搜索范围:** 今日到达的全部邮件 ({'本地缓存，IDLE实时更新' if from_cache else '服务器端日期筛选'})
 📊 **今日邮件:** 0 封
 📅 **当前日期:** {today.strftime('%Y年%m月%d日')}
 ⏰ **检查时间:** {datetime.now().strftime('%H:%M:%S')}
@@ -1099,17 +1013,12 @@ def get_today_latest_emails(force_refresh: bool = False, email_count: int = 20)
 🔄 **建议操作:**
 - 稍后再次检查: get_today_latest_emails(True)
 - 查看所有最近邮件: analyze_icloud_recent_emails(30, True)
-- 检查邮件日期格式是否正确
-
-📋 **调试信息:**
-- 获取到邮件总数: {len(all_recent)}
-- 日期解析成功的邮件数: {sum(1 for email in all_recent if parse_email_date(email.get('date', '')))}
 """
         
         # 构建今日邮件报告
         result = f"""📅 **今日最新邮件** ({len(today_emails)} 封)
 
-🔄 **数据来源:** {'实时iCloud服务器' if force_refresh else '本地缓存'}
+🔄 **数据来源:** {'本地缓存（IDLE实时更新）' if from_cache else '实时iCloud服务器'}
 📅 **当前日期:** {today.strftime('%Y年%m月%d日')}
 ⏰ **检查时间:** {datetime.now().strftime('%H:%M:%S')}
 
@@ -1119,12 +1028,14 @@ def get_today_latest_emails(force_refresh: bool = False, email_count: int = 20)
             # 解析邮件时间
             email_time = "未知时间"
             try:
-                email_date_str = email.get('date', '')
+                email_date_str = email.get('date_received') or email.get('parsed_date') or email.get('date', '')
                 if 'T' in email_date_str:
                     if email_date_str.endswith('Z'):
                         email_dt = datetime.fromisoformat(email_date_str.replace('Z', '+00:00'))
                     else:
                         email_dt = datetime.fromisoformat(email_date_str)
+                    if email_dt.tzinfo:
+                        email_dt = email_dt.astimezone(utc8_timezone)
                     email_time = email_dt.strftime('%H:%M')
                 elif ' ' in email_date_str:
                     # 尝试提取时间部分
@@ -1155,7 +1066,7 @@ def get_today_latest_emails(force_refresh: bool = False, email_count: int = 20)
 • 平均重要性: {sum(email.get('importance_score', 50) for email in today_emails) / len(today_emails):.1f}/100
 
 🔄 **刷新提示:** 如需查看最新邮件，请使用 get_today_latest_emails(True)
-📊 **统计信息:** 从 {len(all_recent)} 封最近邮件中筛选出 {len(today_emails)} 封今日邮件
+📊 **统计信息:** {'本地缓存日期筛选' if from_cache else '服务器端日期筛选'}，共获取 {len(today_emails)} 封今日邮件
 """
         
         return result
@@ -1191,23 +1102,30 @@ def sync_email_cache_with_latest() -> str:
     try:
         from datetime import datetime
         
-        # 1. 清除所有缓存
-        email_cache_manager.clear_cache('icloud')
-        
-        # 2. 强制从iCloud获取最新数据
-        latest_emails = icloud_connector.get_recent_emails(50)  # 获取更多邮件确保完整性
+        # 1. 基于UID检查点增量同步（仅获取上次同步之后的新邮件）
+        sync_result = icloud_connector.sync_new_emails()
+        if 'error' in sync_result:
+            return f"❌ 缓存同步失败: {sync_result['error']}"
         
-        # 3. 重新统计
+        # 2. 重新统计
         stats = icloud_connector.get_mailbox_stats()
         
         sync_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        sync_mode = {
+            'full': '全量重建（UIDVALIDITY变化或首次同步）',
+            'incremental': '增量同步',
+            'unchanged': '无新邮件'
+        }.get(sync_result.get('mode'), sync_result.get('mode'))
         
         return f"""🔄 **邮件缓存同步完成**
 
 ⏰ **同步时间:** {sync_time}
 📊 **同步结果:**
-• 清除缓存: ✅ 完成
-• 重新获取: {len(latest_emails) if latest_emails else 0} 封邮件
+• 同步方式: {sync_mode}
+• 新获取: {sync_result.get('fetched', 0)} 封邮件
+• 已读状态更新: {sync_result.get('flags_updated', 0)} 封
+• 移除已删除邮件: {sync_result.get('expunged', 0)} 封
+• 同步检查点: UID {sync_result.get('last_uid', 0)}
 • 邮箱统计更新: ✅ 完成
 
 📬 **最新统计:**
@@ -1224,7 +1142,57 @@ def sync_email_cache_with_latest() -> str:
 
 
 @mcp.tool()
-def disconnect_icloud() -> str:
+def sync_icloud_folders(folders: str = "") -> str:
+    """同步多个邮箱文件夹（已发送、归档等）到本地缓存
+    
+    通过LIST获取文件夹列表，每个文件夹使用独立的UID检查点，在多条连接上并行增量同步。
+    同步后 search_emails_fts() 可跨文件夹搜索。
+    
+    Args:
+        folders: 逗号分隔的文件夹名称（如 "INBOX,Sent Messages"），留空时同步所有文件夹
+    
+    Returns:
+        str: 各文件夹的同步结果
+    """
+    global icloud_connector
+    
+    if not icloud_connector or not icloud_connector.connected:
+        return "⚠️ 请先使用 connect_to_icloud() 连接到邮箱"
+    
+    try:
+        names = [name.strip() for name in folders.split(',') if name.strip()] or None
+        result = icloud_connector.sync_all_folders(names)
+        if 'error' in result:
+            return f"❌ 文件夹同步失败: {result['error']}"
+        if not result['folders']:
+            return "ℹ️ 没有找到可同步的文件夹"
+        
+        sync_modes = {'full': '全量', 'incremental': '增量', 'unchanged': '无变化'}
+        cached_counts = email_cache_manager.get_folder_counts('icloud')
+        
+        report = f"""📁 **文件夹同步完成**
+
+📊 **总计:** {len(result['folders'])} 个文件夹，新获取 {result['fetched']} 封邮件，耗时 {result['elapsed']:.2f} 秒
+
+"""
+        for folder, folder_result in result['folders'].items():
+            if 'error' in folder_result:
+                report += f"• {folder}: ❌ {folder_result['error']}\n"
+                continue
+            mode = sync_modes.get(folder_result.get('mode'), folder_result.get('mode'))
+            report += (f"• {folder}: {mode}，新获取 {folder_result.get('fetched', 0)} 封，"
+                       f"已缓存 {cached_counts.get(folder, 0)} 封\n")
+        
+        if result['failed']:
+            report += f"\n⚠️ {result['failed']} 个文件夹同步失败，可稍后重试"
+        return report
+        
+    except Exception as e:
+        return f"❌ 文件夹同步失败: {str(e)}"
+
+
+@mcp.tool()
+async def disconnect_icloud() -> str:
     """安全断开iCloud邮箱连接
     
     Returns:
@@ -1233,8 +1201,9 @@ def disconnect_icloud() -> str:
     global icloud_connector
     
     try:
+        await close_async_connector()
         if icloud_connector:
-            icloud_connector.disconnect()
+            await asyncio.to_thread(icloud_connector.disconnect)
             icloud_connector = None
             return "✅ iCloud邮箱连接已安全断开"
         else:
@@ -1249,8 +1218,8 @@ def disconnect_icloud() -> str:
 def get_cached_recent_emails(count: int = 10) -> str:
     """从缓存快速获取最近邮件 (响应时间 <100ms)"""
     try:
-        # 直接从缓存获取，不访问远程服务器
-        cached_emails = email_cache_manager.get_recent_emails(count, 'icloud')
+        # 直接从缓存获取，不访问远程服务器（只读取索引和摘要）
+        cached_emails = email_cache_manager.get_recent_emails(count, 'icloud', with_content=False)
         
         if not cached_emails:
             return """📭 **缓存中暂无邮件数据**
@@ -1287,7 +1256,7 @@ def get_cached_recent_emails(count: int = 10) -> str:
    📤 发件人: {sender}
    📅 时间: {date}
    ⭐ 重要性: {importance}/100
-   📝 正文: {len(email.get('body_text', ''))} 字符
+   📝 摘要: {email.get('snippet', '')[:100] or '（正文未加载）'}
 """
         
         return result
@@ -1308,8 +1277,8 @@ def search_cached_emails(query: str, max_results: int = 20) -> str:
         str: 搜索结果
     """
     try:
-        # 从缓存搜索
-        results = email_cache_manager.search_emails(query, max_results)
+        # 从缓存搜索（匹配上下文由全文索引生成，不读取正文）
+        results = email_cache_manager.search_emails(query, max_results, with_content=False)
         
         if not results:
             return f"🔍 在缓存中搜索'{query}'没有找到匹配的邮件\n💡 提示：尝试使用 search_icloud_emails_smart() 进行完整搜索"
@@ -1321,18 +1290,12 @@ def search_cached_emails(query: str, max_results: int = 20) -> str:
             report += f"{i}. 【{email.get('subject', '无主题')}】\n"
             report += f"   发件人: {email.get('from_email', email.get('sender', '未知'))}\n"
             report += f"   日期: {email.get('date_received', email.get('date', '未知'))}\n"
+            if (email.get('folder') or 'INBOX') != 'INBOX':
+                report += f"   文件夹: {email['folder']}\n"
             
             # 显示匹配的内容预览
-            body_text = email.get('body_text', '')
-            if body_text and query.lower() in body_text.lower():
-                query_pos = body_text.lower().find(query.lower())
-                start = max(0, query_pos - 50)
-                end = min(len(body_text), query_pos + 50)
-                preview = body_text[start:end]
-                if start > 0:
-                    preview = "..." + preview
-                if end < len(body_text):
-                    preview = preview + "..."
+            preview = build_snippet(email.get('match_preview')) or email.get('snippet', '')[:100]
+            if preview:
                 report += f"   内容: {preview}\n"
             
             report += "\n"
@@ -1363,8 +1326,8 @@ def search_emails_fts(query: str, max_results: int = 20) -> str:
         import time
         start_time = time.time()
         
-        # 使用纯全文索引搜索
-        results = email_cache_manager.search_emails(query, max_results)
+        # 使用纯全文索引搜索（匹配上下文由FTS5 snippet()生成，不读取正文）
+        results = email_cache_manager.search_emails(query, max_results, with_content=False)
         
         search_time = (time.time() - start_time) * 1000  # 转换为毫秒
         
@@ -1402,35 +1365,14 @@ def search_emails_fts(query: str, max_results: int = 20) -> str:
                 except:
                     pass
             
+            folder = email.get('folder') or 'INBOX'
             report += f"**{i}.** {subject}\n"
-            report += f"   👤 {sender} | 📅 {date}\n"
+            report += f"   👤 {sender} | 📅 {date}" + (f" | 📁 {folder}" if folder != 'INBOX' else "") + "\n"
             
-            # 显示匹配内容（高亮）
-            body_text = email.get('body_text', '')
-            if body_text and query.lower() in body_text.lower():
-                query_pos = body_text.lower().find(query.lower())
-                if query_pos != -1:
-                    start = max(0, query_pos - 60)
-                    end = min(len(body_text), query_pos + 60)
-                    preview = body_text[start:end].strip()
-                    
-                    # 简单高亮
-                    highlight_query = query.lower()
-                    preview_lower = preview.lower()
-                    if highlight_query in preview_lower:
-                        highlight_pos = preview_lower.find(highlight_query)
-                        preview = (
-                            preview[:highlight_pos] + 
-                            f"**{preview[highlight_pos:highlight_pos+len(query)]}**" + 
-                            preview[highlight_pos+len(query):]
-                        )
-                    
-                    if start > 0:
-                        preview = "..." + preview
-                    if end < len(body_text):
-                        preview = preview + "..."
-                    
-                    report += f"   🔍 {preview}\n"
+            # 显示匹配内容（FTS5已用**高亮关键词）
+            preview = build_snippet(email.get('match_preview')) or email.get('snippet', '')[:120]
+            if preview:
+                report += f"   🔍 {preview}\n"
             
             # 重要性和附件标识
             importance = email.get('importance_score', 50)
@@ -1469,6 +1411,63 @@ def get_cache_performance_stats() -> str:
     try:
         stats = email_cache_manager.get_performance_stats()
         
+        # 连接器的邮件对象缓存（按字节限制容量）
+        message_cache_report = ""
+        if icloud_connector:
+            message_stats = icloud_connector.get_message_cache_stats()
+            message_cache_report = f"""
+📨 **邮件对象缓存:**
+• 当前条目: {message_stats['entries']} 封
+• 占用: {message_stats['total_bytes'] / 1024 / 1024:.2f}/{message_stats['max_bytes'] / 1024 / 1024:.0f} MB
+• 命中率: {message_stats['hit_rate']} (命中 {message_stats['hits']} / 未命中 {message_stats['misses']})
+• 淘汰次数: {message_stats['evictions']}
+• 存储方式: {'原始字节' if message_stats['store_raw'] else '解析后的邮件对象'}
+"""
+            compression = icloud_connector.get_compression_stats()
+            if compression['connections']:
+                message_cache_report += f"""
+🗜️ **IMAP传输压缩 (COMPRESS=DEFLATE):**
+• 压缩连接数: {compression['connections']}
+• 接收: {compression['bytes_received'] / 1024:.1f} KB（解压后 {compression['bytes_inflated'] / 1024:.1f} KB，压缩比 {compression['receive_ratio']}x）
+• 发送: {compression['bytes_sent'] / 1024:.1f} KB（压缩前 {compression['bytes_deflated'] / 1024:.1f} KB）
+• 节省流量: {compression['bytes_saved'] / 1024:.1f} KB
+"""
+            else:
+                state = '已关闭' if not compression['enabled'] else ('未启用' if compression['supported'] else '服务器不支持')
+                message_cache_report += f"\n🗜️ **IMAP传输压缩:** {state}\n"
+            
+            health = icloud_connector.get_connection_health()
+            supervisor = health['supervisor']
+            message_cache_report += f"""
+🔌 **IMAP连接守护:**
+• 连接池: {health['pool']['size']}/{health['pool']['max_size']} 条（空闲 {health['pool']['idle']}）
+• 保活: {'✅ 每 ' + str(int(health['keepalive_interval'])) + ' 秒' if health['supervisor_active'] else '❌ 未运行'}，NOOP {supervisor.get('keepalives', 0)} 次，丢弃失效连接 {supervisor.get('dropped', 0)} 条，重建 {supervisor.get('reconnects', 0)} 条
+• 中断后重放: {health['replays']} 次（失败 {health['replay_failures']} 次）
+• 服务器搜索结果缓存: 命中 {icloud_connector.search_cache_stats['hits']} 次，增量搜索 {icloud_connector.search_cache_stats['incremental']} 次，完整搜索 {icloud_connector.search_cache_stats['misses']} 次
+"""
+            
+            scheduling = icloud_connector.get_fetch_scheduler_stats()
+            interactive, bulk = scheduling['interactive'], scheduling['bulk']
+            message_cache_report += f"""
+🚦 **取件优先级调度:**
+• 交互请求: {interactive['requests']} 次，延迟 p50 {interactive['p50_ms']}ms / p95 {interactive['p95_ms']}ms / p99 {interactive['p99_ms']}ms
+• 后台同步: {bulk['requests']} 批 {bulk['items']} 封，吞吐 {bulk['throughput']} 封/秒，每批 p99 {bulk['p99_ms']}ms
+• 为交互请求让路: {scheduling['yields']} 次（排队让路 {scheduling['priority_waits']} 次，保留连接 {scheduling['interactive_reserve']} 条）
+"""
+            
+            rate = icloud_connector.get_rate_control_stats()
+            message_cache_report += f"""
+📈 **自适应并发控制:** {'✅ 已启用' if rate['enabled'] else '❌ 已关闭'}
+• 批量FETCH并发: {rate['limit']}/{rate['max_limit']}（进行中 {rate['in_flight']}）
+• 每封邮件平均耗时: {rate['baseline_ms'] if rate['baseline_ms'] is not None else '-'} ms
+• 限流响应: {rate['throttled']} 次，延迟突增: {rate['spikes']} 次{f"，暂停中（剩余 {rate['paused_for']} 秒）" if rate['paused_for'] else ''}
+• 并发调整: 增加 {rate['increases']} 次，减半 {rate['decreases']} 次
+"""
+        
+        sqlite_connections = stats['sqlite_cache'].get('connections', {})
+        memory_stats = stats['memory_cache']
+        memory_budget = f"{memory_stats['max_bytes'] / 1024 / 1024:.0f}" if memory_stats.get('max_bytes') else '不限'
+        
         return f"""📊 **邮件缓存性能统计**
 
 🚀 **缓存命中率:**
@@ -1482,10 +1481,14 @@ def get_cache_performance_stats() -> str:
 • 内容缓存数: {stats['sqlite_cache']['cached_content']}
 • 最近24小时: {stats['sqlite_cache']['recent_emails']} 封
 • 数据库大小: {stats['sqlite_cache']['db_size_mb']:.2f} MB
+• SQLite连接: {sqlite_connections.get('open_connections', 0)} 条（{str(sqlite_connections.get('journal_mode') or '-').upper()} 模式，复用 {sqlite_connections.get('reused', 0)} 次）
 
 ⚡ **内存缓存:**
 • 当前条目: {stats['memory_cache']['valid_entries']}/{stats['memory_cache']['max_size']}
+• 占用: {memory_stats['total_bytes'] / 1024 / 1024:.2f}/{memory_budget} MB（淘汰 {memory_stats.get('evictions', 0)} 次，过大未缓存 {memory_stats.get('rejected', 0)} 次）
 • TTL设置: {stats['memory_cache']['ttl_seconds']} 秒
+• 已失效条目: {stats['memory_cache'].get('invalidated', 0)} 条（写入时只失效受影响的列表和搜索结果）
+{message_cache_report}
 
 🔧 **操作统计:**
 • 获取操作: {stats['operation_stats']['get']} 次
@@ -1540,7 +1543,9 @@ def optimize_email_cache() -> str:
             suggestions.append("• 数据库较大，建议定期清理旧邮件")
         
         # 检查内存使用
-        memory_usage = stats['memory_cache']['valid_entries'] / stats['memory_cache']['max_size']
+        memory_stats = stats['memory_cache']
+        memory_usage = max(memory_stats['valid_entries'] / memory_stats['max_size'],
+                           memory_stats['total_bytes'] / memory_stats['max_bytes'] if memory_stats.get('max_bytes') else 0)
         if memory_usage > 0.9:
             suggestions.append("• 内存缓存接近满载，建议增加缓存大小")
         
@@ -2008,13 +2013,12 @@ def get_today_emails_simple(count: int = 10) -> str:
     if not icloud_connector:
         return "⚠️ 请先连接邮箱 - 连接器未初始化"
     
-    # 检查连接状态的多种方式
+    # 连接池会替换失效的连接，icloud_connector.mail 可能已过期，以连接状态和连接池为准
     is_connected = False
     try:
-        is_connected = (
-            hasattr(icloud_connector, 'connected') and 
-            icloud_connector.connected and
-            icloud_connector.mail is not None
+        is_connected = bool(
+            getattr(icloud_connector, 'connected', False) and
+            getattr(icloud_connector, 'pool', None) is not None
         )
     except Exception:
         is_connected = False
@@ -2081,94 +2085,47 @@ def get_today_emails_simple(count: int = 10) -> str:
             # FTS搜索失败，继续使用IMAP方法
             pass
         
-        # 方法2: 从IMAP直接获取邮件
-        recent_emails = icloud_connector.get_recent_emails(count)
-        if not recent_emails:
-            return "📭 没有找到邮件"
+        # 方法2: IDLE监听保持缓存最新时读取本地缓存，否则服务器端按到达时间筛选，只获取匹配邮件的邮件头
+        recent_emails = icloud_connector.get_today_emails(limit=count)
+        from_cache = icloud_connector.today_source == 'cache'
         
         today_emails = []
-        
         for email in recent_emails:
             date_str = email.get('date', '')
-            is_today = False
+            received = email.get('date_received') or email.get('parsed_date') or ''
             
-            # 检查多种日期格式
-            if date_str:
-                # 格式1: 包含今日日期字符串 (2025-06-24)
-                if today_str in date_str:
-                    is_today = True
-                # 格式2: RFC 2822格式 (Tue, 24 Jun 2025)
-                elif f"{today_day} Jun {today_year}" in date_str:
-                    is_today = True
-                # 格式3: 其他月份缩写格式
-                elif str(today_day) in date_str and str(today_year) in date_str:
-                    # 进一步检查月份
-                    month_names = {
-                        1: ['Jan', '01'], 2: ['Feb', '02'], 3: ['Mar', '03'],
-                        4: ['Apr', '04'], 5: ['May', '05'], 6: ['Jun', '06'],
-                        7: ['Jul', '07'], 8: ['Aug', '08'], 9: ['Sep', '09'],
-                        10: ['Oct', '10'], 11: ['Nov', '11'], 12: ['Dec', '12']
-                    }
-                    current_month_names = month_names.get(today_month, [])
-                    if any(month_name in date_str for month_name in current_month_names):
-                        is_today = True
-                # 格式4: ISO格式包含今日 (2025-06-24T)
-                elif f"{today_year}-{today_month:02d}-{today_day:02d}" in date_str:
-                    is_today = True
+            # 提取时间信息（按配置时区显示）
+            time_str = "未知时间"
+            try:
+                if 'T' in str(received):
+                    received_dt = datetime.fromisoformat(str(received).replace('Z', '+00:00'))
+                    if received_dt.tzinfo:
+                        received_dt = received_dt.astimezone(icloud_connector.timezone)
+                    time_str = received_dt.strftime('%H:%M')
+            except:
+                pass
             
-            if is_today:
-                # 提取时间信息
-                time_str = "未知时间"
-                try:
-                    if 'T' in date_str:
-                        time_part = date_str.split('T')[1][:5]  # HH:MM
-                        time_str = time_part
-                    elif ':' in date_str:
-                        # 查找时间模式 HH:MM
-                        import re
-                        time_match = re.search(r'(\d{1,2}:\d{2})', date_str)
-                        if time_match:
-                            time_str = time_match.group(1)
-                except:
-                    pass
-                
-                today_emails.append({
-                    'subject': email.get('subject', '无主题')[:50],
-                    'sender': email.get('sender', '未知发件人'),
-                    'time': time_str,
-                    'full_date': date_str
-                })
+            today_emails.append({
+                'subject': email.get('subject', '无主题')[:50],
+                'sender': email.get('sender', email.get('from_email', '未知发件人')),
+                'time': time_str,
+                'full_date': date_str or received
+            })
         
         if not today_emails:
-            # 提供调试信息
             debug_info = f"📅 今日({today_str})暂无新邮件\n\n"
-            debug_info += f"🔍 调试信息:\n"
-            debug_info += f"• 检查了 {len(recent_emails)} 封最近邮件\n"
-            debug_info += f"• 当前日期: {today_year}年{today_month}月{today_day}日\n"
-            debug_info += f"• 搜索格式: {today_str}, {today_day} Jun {today_year}\n\n"
-            
-            # 显示最近几封邮件的日期用于调试
-            debug_info += f"📋 最近邮件日期格式:\n"
-            for i, email in enumerate(recent_emails[:3], 1):
-                subject = email.get('subject', '无主题')[:30]
-                date_str = email.get('date', 'NO_DATE')
-                debug_info += f"{i}. {subject}\n   日期: {date_str}\n"
-            
-            debug_info += f"\n💡 可能原因:\n"
+            debug_info += f"💡 可能原因:\n"
             debug_info += f"• 今天确实没有新邮件\n"
-            debug_info += f"• 邮件日期格式与预期不符\n"
-            debug_info += f"• 时区差异导致日期判断错误\n"
-            debug_info += f"• 缓存数据与实时数据不同步\n"
-            
+            debug_info += f"• 邮件还在传输中\n"
             return debug_info
         
-        result = f"📅 **今日邮件** ({len(today_emails)}封) - {today_str} [IMAP实时]\n\n"
+        result = f"📅 **今日邮件** ({len(today_emails)}封) - {today_str} [{'本地缓存' if from_cache else 'IMAP实时'}]\n\n"
         for i, email in enumerate(today_emails, 1):
             result += f"**{i}.** {email['time']} | {email['sender']}\n"
             result += f"   📧 {email['subject']}\n"
             result += f"   🕒 {email['full_date']}\n\n"
         
-        result += f"💡 数据源: iCloud IMAP实时数据"
+        result += f"💡 数据源: {'本地缓存（IDLE监听实时更新）' if from_cache else 'iCloud IMAP实时数据'}"
         return result
         
     except Exception as e:
@@ -0,0 +1,13 @@
+"""
+测试公共配置
+
+把 src 加入导入路径；缓存管理器和配置管理器在导入时按相对路径创建 data/ 目录，
+测试在临时目录中运行，避免在仓库中生成数据库和配置文件。
+"""
+
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+os.chdir(tempfile.mkdtemp(prefix='smart_email_ai_tests_'))
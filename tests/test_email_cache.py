@@ -0,0 +1,276 @@
+"""邮件缓存测试"""
+
+import hashlib
+import sqlite3
+
+import pytest
+
+from smart_email_ai.core.email_cache import SQLiteCache
+
+
+def email_record(mail_id: str, subject: str = '季度报告', body: str = '请查收附件中的报告',
+                 **fields) -> dict:
+    record = {
+        'mail_id': mail_id,
+        'account_type': 'icloud',
+        'message_id': f'<{mail_id}@example.com>',
+        'subject': subject,
+        'sender': 'Alice <alice@example.com>',
+        'recipient': 'me@example.com',
+        'parsed_date': '2026-10-16T09:00:00+08:00',
+        'body_text': body,
+        'body_html': '',
+        'attachments': [],
+        'size': 100,
+        'body_loaded': True,
+    }
+    record.update(fields)
+    return record
+
+
+# 最初版本的表结构：以IMAP序号作为邮件ID，全文索引保存正文副本
+BASELINE_SCHEMA = """
+    CREATE TABLE emails_index (
+        id TEXT PRIMARY KEY,
+        account_type TEXT,
+        message_id TEXT UNIQUE,
+        subject TEXT,
+        from_email TEXT,
+        from_name TEXT,
+        to_emails TEXT,
+        date_received DATETIME,
+        importance_score INTEGER DEFAULT 50,
+        has_attachments BOOLEAN DEFAULT FALSE,
+        is_read BOOLEAN DEFAULT FALSE,
+        content_hash TEXT,
+        size_bytes INTEGER DEFAULT 0,
+        created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+        updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
+    );
+    CREATE TABLE email_content (
+        email_id TEXT PRIMARY KEY,
+        body_text TEXT,
+        body_html TEXT,
+        attachments_json TEXT,
+        FOREIGN KEY(email_id) REFERENCES emails_index(id)
+    );
+    CREATE VIRTUAL TABLE email_fts USING fts5(email_id, subject, body_text, from_name);
+"""
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / 'email_cache.db')
+
+
+def test_baseline_rows_keyed_by_sequence_number_are_dropped(db_path):
+    conn = sqlite3.connect(db_path)
+    conn.executescript(BASELINE_SCHEMA)
+    for seq in (1, 2, 3):
+        conn.execute("INSERT INTO emails_index (id, account_type, message_id, subject, date_received) "
+                     "VALUES (?, 'icloud', ?, '旧邮件', '2025-01-22T10:00:00')", (str(seq), f'<old{seq}>'))
+        conn.execute("INSERT INTO email_content VALUES (?, '旧正文', '', '[]')", (str(seq),))
+        conn.execute("INSERT INTO email_fts VALUES (?, '旧邮件', '旧正文', '')", (str(seq),))
+    conn.commit()
+    conn.close()
+
+    cache = SQLiteCache(db_path)
+
+    # 序号不能当作UID使用：旧记录不再返回，也不会出现在已缓存的UID中
+    assert cache.get_recent_emails(10) == []
+    assert cache.get_email('1') is None
+    assert cache.get_cached_uids('icloud', 'INBOX') == []
+    assert cache.search_emails('旧正文') == []
+
+    assert cache.store_email(email_record('2'))
+    stored = cache.get_email('2')
+    assert stored['uid'] == 2 and stored['folder'] == 'INBOX'
+    assert [row['id'] for row in cache.search_emails('季度报告')] == ['2']
+
+
+@pytest.fixture
+def manager(db_path):
+    from smart_email_ai.core.email_cache import EmailCacheManager
+    cache_manager = EmailCacheManager()
+    cache_manager.sqlite_cache = SQLiteCache(db_path)
+    return cache_manager
+
+
+def test_memory_cache_invalidate_where_uses_tags():
+    from smart_email_ai.core.email_cache import MemoryCache
+    cache = MemoryCache(max_size=10)
+    cache.set('inbox', ['a'], {'folder': 'INBOX'})
+    cache.set('archive', ['b'], {'folder': 'Archive'})
+    cache.set('untagged', ['c'])
+
+    # 没有依赖描述的条目总是删除
+    assert cache.invalidate_where(lambda tags: tags['folder'] == 'Archive') == 2
+    assert cache.get('inbox') == ['a']
+    assert cache.get('archive') is None and cache.get('untagged') is None
+    assert cache.stats()['invalidated'] == 2
+
+
+def test_write_invalidates_only_affected_entries(manager):
+    manager.store_emails([email_record('1', subject='季度报告'),
+                          email_record('Archive:7', subject='旅行计划', body='机票')])
+    assert len(manager.get_recent_emails(10, folder='INBOX')) == 1
+    assert len(manager.search_emails('旅行计划')) == 1
+    assert len(manager.search_emails('季度报告')) == 1
+
+    # 新邮件只匹配“季度报告”，旅行计划的搜索结果和其他文件夹的列表保持缓存
+    manager.store_emails([email_record('Archive:8', subject='季度报告')])
+    keys = set(manager.memory_cache.cache)
+    assert any(key.startswith('recent_icloud_10_INBOX') for key in keys)
+    assert manager.memory_cache.get(f"search_{hashlib.md5('旅行计划'.encode()).hexdigest()}_20_*")
+    assert len(manager.search_emails('季度报告')) == 2
+
+
+def test_recent_list_invalidation_compares_dates_across_offsets(manager):
+    manager.store_emails([email_record('1', parsed_date='2026-10-16T09:00:00+08:00')])
+    assert len(manager.get_recent_emails(1)) == 1
+    assert 'recent_icloud_1_INBOX' in manager.memory_cache.cache
+
+    # 更早的邮件不会使已满的列表失效
+    manager.store_emails([email_record('2', parsed_date='2026-10-16T08:00:00+08:00')])
+    assert 'recent_icloud_1_INBOX' in manager.memory_cache.cache
+
+    # 2026-10-15T20:00:00-07:00 即 2026-10-16T03:00Z，晚于列表中的 01:00Z，
+    # 按字符串比较却会被当作更早的邮件
+    manager.store_emails([email_record('3', parsed_date='2026-10-15T20:00:00-07:00')])
+    assert 'recent_icloud_1_INBOX' not in manager.memory_cache.cache
+
+
+def test_clear_folder_keeps_memory_entries_of_other_folders(manager):
+    manager.store_emails([email_record('1'), email_record('Archive:7')])
+    manager.get_recent_emails(10, folder='INBOX')
+    manager.get_recent_emails(10, folder='Archive')
+    manager.search_emails('季度报告', folder='INBOX')
+    manager.search_emails('季度报告')
+
+    manager.clear_cache('icloud', 'Archive')
+
+    assert sorted(manager.memory_cache.cache) == sorted([
+        'recent_icloud_10_INBOX',
+        f"search_{hashlib.md5('季度报告'.encode()).hexdigest()}_20_INBOX",
+    ])
+    assert manager.get_recent_emails(10, folder='Archive') == []
+    assert [email['id'] for email in manager.get_recent_emails(10, folder='INBOX')] == ['1']
+
+
+def test_store_emails_bulk_reports_outcome_per_row(db_path):
+    cache = SQLiteCache(db_path)
+    assert cache.store_email(email_record('1', body='完整正文'))
+
+    outcomes = cache.store_emails_bulk([
+        email_record('2'),
+        # 已加载正文的邮件只更新邮件头
+        email_record('1', body='', body_loaded=False, snippet='预览', is_read=True),
+        # 同一批中的重复邮件看到前一条写入后的状态
+        email_record('3', subject='第一版'),
+        email_record('3', subject='第二版'),
+        email_record('4', sender=None),
+    ])
+
+    assert [outcome['status'] for outcome in outcomes] == [
+        'inserted', 'kept_content', 'inserted', 'updated', 'failed']
+    assert outcomes[4]['id'] == '4' and outcomes[4]['error']
+    kept = cache.get_email('1')
+    assert kept['body_text'] == '完整正文' and kept['body_loaded'] and kept['is_read']
+    assert cache.get_email('3')['subject'] == '第二版'
+    assert cache.get_email('4') is None
+
+
+def test_store_emails_bulk_falls_back_to_row_by_row_writes(db_path):
+    cache = SQLiteCache(db_path)
+    # SQLite无法绑定字典类型，整批写入失败后逐条重试
+    outcomes = cache.store_emails_bulk([
+        email_record('1'),
+        email_record('2', subject={'not': 'bindable'}),
+        email_record('3'),
+    ])
+
+    assert [outcome['status'] for outcome in outcomes] == ['inserted', 'failed', 'inserted']
+    assert outcomes[1]['error']
+    assert cache.get_email('1') and cache.get_email('3') and cache.get_email('2') is None
+    assert sorted(row['id'] for row in cache.search_emails('季度报告')) == ['1', '3']
+
+
+def create_pre_fts_migration_db(db_path):
+    """索引表为当前结构，内容表和全文索引表为保存正文副本的旧结构"""
+    conn = sqlite3.connect(db_path)
+    conn.execute(f"CREATE TABLE emails_index ({SQLiteCache.EMAILS_INDEX_COLUMNS})")
+    conn.executescript("""
+        CREATE TABLE email_content (
+            email_id TEXT PRIMARY KEY, body_text TEXT, body_html TEXT, attachments_json TEXT);
+        CREATE VIRTUAL TABLE email_fts USING fts5(email_id, subject, body_text, from_name);
+    """)
+    for uid, subject, body in ((1, '季度报告', '预算草案'), (2, '旅行计划', '机票行程')):
+        conn.execute("INSERT INTO emails_index (id, account_type, subject, from_name, date_received, folder, uid) "
+                     "VALUES (?, 'icloud', ?, 'Alice', '2026-10-16T09:00:00+08:00', 'INBOX', ?)",
+                     (str(uid), subject, uid))
+        conn.execute("INSERT INTO email_content VALUES (?, ?, '', '[]')", (str(uid), body))
+        conn.execute("INSERT INTO email_fts VALUES (?, ?, ?, 'Alice')", (str(uid), subject, body))
+    conn.commit()
+    conn.close()
+
+
+def test_fts_migration_moves_to_external_content_index(db_path):
+    create_pre_fts_migration_db(db_path)
+    cache = SQLiteCache(db_path)
+
+    conn = sqlite3.connect(db_path)
+    columns = [row[1] for row in conn.execute("PRAGMA table_info(email_content)")]
+    assert columns[:3] == ['id', 'email_id', 'subject']
+    assert 'content=email_content' in conn.execute(
+        "SELECT sql FROM sqlite_master WHERE name = 'email_fts'").fetchone()[0].replace("'", '')
+    assert not conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'email_content_legacy'").fetchall()
+    conn.execute("INSERT INTO email_fts (email_fts) VALUES ('integrity-check')")
+    conn.close()
+
+    # 旧数据迁移后可以按主题和正文搜索
+    assert [row['id'] for row in cache.search_emails('预算草案')] == ['1']
+    assert [row['id'] for row in cache.search_emails('旅行计划')] == ['2']
+    assert cache.get_email('2')['body_text'] == '机票行程'
+
+
+def test_fts_triggers_follow_content_writes(db_path):
+    cache = SQLiteCache(db_path)
+    cache.store_email(email_record('1', body='初稿内容'))
+    assert cache.search_emails('初稿内容')
+
+    # 更新正文：旧词条移除，新词条可搜索，没有重复行
+    cache.store_email(email_record('1', body='终稿内容'))
+    assert cache.search_emails('初稿内容') == []
+    assert [row['id'] for row in cache.search_emails('终稿内容')] == ['1']
+
+    # 删除邮件时删除触发器移除全文索引行
+    assert cache.delete_emails(['1']) == 1
+    assert cache.search_emails('终稿内容') == []
+    conn = sqlite3.connect(db_path)
+    conn.execute("INSERT INTO email_fts (email_fts) VALUES ('integrity-check')")
+    assert conn.execute("SELECT count(*) FROM email_fts").fetchone()[0] == 0
+    conn.close()
+
+
+def test_failed_fts_migration_rolls_back(db_path):
+    create_pre_fts_migration_db(db_path)
+    conn = sqlite3.connect(db_path)
+    # 迁移时改名的目标表已存在，迁移中途失败
+    conn.execute("CREATE TABLE email_content_legacy (email_id TEXT)")
+    conn.commit()
+    conn.close()
+
+    with pytest.raises(sqlite3.Error):
+        SQLiteCache(db_path)
+
+    conn = sqlite3.connect(db_path)
+    assert [row[1] for row in conn.execute("PRAGMA table_info(email_content)")][0] == 'email_id'
+    assert conn.execute("SELECT count(*) FROM email_content").fetchone()[0] == 2
+    assert conn.execute("SELECT count(*) FROM email_fts WHERE email_fts MATCH '旅行计划'").fetchone()[0] == 1
+    conn.execute("DROP TABLE email_content_legacy")
+    conn.commit()
+    conn.close()
+
+    # 下次启动重新迁移
+    cache = SQLiteCache(db_path)
+    assert [row['id'] for row in cache.search_emails('旅行计划')] == ['2']
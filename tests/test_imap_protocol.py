@@ -0,0 +1,103 @@
+"""IMAP响应解析测试：使用imaplib实际返回的数据形态"""
+
+from smart_email_ai.core.imap_protocol import (
+    build_id_set, group_fetch_records, parse_bodystructure, parse_envelope,
+    parse_esearch, parse_fetch_record, parse_fetch_response, parse_id_set,
+)
+
+
+def test_parse_fetch_record_with_literal():
+    fragments = [
+        (b'7 (UID 12 FLAGS (\\Seen \\Flagged) RFC822.SIZE 11 BODY[] {11}', b'Subject: a\r\n'),
+        b')',
+    ]
+    seq, attrs = parse_fetch_record(fragments)
+    assert seq == 7
+    assert attrs['UID'] == '12'
+    assert attrs['FLAGS'] == ['\\Seen', '\\Flagged']
+    assert attrs['RFC822.SIZE'] == '11'
+    # 字面量原样保留为bytes，即使内容含括号也不影响后续结构
+    assert attrs['BODY[]'] == b'Subject: a\r\n'
+
+
+def test_parse_fetch_record_literal_with_parentheses_and_trailing_items():
+    fragments = [
+        (b'3 (UID 5 BODY[HEADER.FIELDS (SUBJECT)] {15}', b'Subject: (x)\r\n\r\n'),
+        b' FLAGS ())',
+    ]
+    seq, attrs = parse_fetch_record(fragments)
+    assert seq == 3
+    assert attrs['BODY[HEADER.FIELDS (SUBJECT)]'] == b'Subject: (x)\r\n\r\n'
+    assert attrs['FLAGS'] == []
+
+
+def test_group_fetch_records_splits_on_sequence_prefix():
+    untagged = [
+        (b'1 (UID 10 BODY[] {3}', b'abc'), b')',
+        (b'2 (UID 11 BODY[] {3}', b'def'), b')',
+        b'3 (UID 12 FLAGS (\\Seen))',
+        None,
+    ]
+    records = group_fetch_records(untagged)
+    assert [len(record) for record in records] == [2, 2, 1]
+    assert [(seq, attrs['UID']) for seq, attrs in parse_fetch_response(untagged)] == [
+        (1, '10'), (2, '11'), (3, '12')]
+
+
+def test_parse_envelope_quoted_strings_and_nil():
+    _, attrs = parse_fetch_record([
+        b'1 (ENVELOPE ("Mon, 13 Oct 2026 09:00:00 +0800" "=?UTF-8?B?5oql5ZGK?=" '
+        b'(("Alice \\"A\\"" NIL "alice" "example.com")) NIL NIL '
+        b'((NIL NIL "bob" "example.com")) NIL NIL NIL "<id@example.com>"))'
+    ])
+    envelope = parse_envelope(attrs['ENVELOPE'])
+    assert envelope['subject'] == '=?UTF-8?B?5oql5ZGK?='
+    assert envelope['from'] == [('Alice "A"', 'alice@example.com')]
+    assert envelope['to'] == [('', 'bob@example.com')]
+    assert envelope['cc'] == []
+    assert envelope['message_id'] == '<id@example.com>'
+
+
+def test_parse_bodystructure_multipart_with_attachment():
+    _, attrs = parse_fetch_record([
+        b'1 (BODYSTRUCTURE ('
+        b'("TEXT" "PLAIN" ("CHARSET" "utf-8") NIL NIL "7BIT" 120 4 NIL NIL NIL)'
+        b'(("TEXT" "HTML" ("CHARSET" "utf-8") NIL NIL "QUOTED-PRINTABLE" 300 8 NIL NIL NIL)'
+        b'("IMAGE" "PNG" ("NAME" "logo.png") "<logo>" NIL "BASE64" 500 NIL ("INLINE" NIL) NIL) "RELATED")'
+        b'("APPLICATION" "PDF" ("NAME" "report.pdf") NIL NIL "BASE64" 2048 NIL '
+        b'("ATTACHMENT" ("FILENAME" "=?UTF-8?B?5oql5ZGK?=.pdf")) NIL)'
+        b' "MIXED" ("BOUNDARY" "b1") NIL NIL))'
+    ])
+    parts = parse_bodystructure(attrs['BODYSTRUCTURE'])
+    assert [(p['part'], p['content_type'], p['size']) for p in parts] == [
+        ('1', 'text/plain', 120),
+        ('2.1', 'text/html', 300),
+        ('2.2', 'image/png', 500),
+        ('3', 'application/pdf', 2048),
+    ]
+    assert parts[0]['params'] == {'charset': 'utf-8'}
+    assert parts[1]['encoding'] == 'quoted-printable'
+    assert (parts[2]['disposition'], parts[2]['filename']) == ('inline', 'logo.png')
+    assert (parts[3]['disposition'], parts[3]['filename']) == ('attachment', '=?UTF-8?B?5oql5ZGK?=.pdf')
+
+
+def test_parse_bodystructure_single_part():
+    _, attrs = parse_fetch_record([b'1 (BODYSTRUCTURE ("TEXT" "PLAIN" NIL NIL NIL "7BIT" 42 2))'])
+    assert parse_bodystructure(attrs['BODYSTRUCTURE']) == [{
+        'part': '1', 'content_type': 'text/plain', 'params': {}, 'encoding': '7bit',
+        'size': 42, 'disposition': None, 'filename': None,
+    }]
+    assert parse_bodystructure(None) == []
+
+
+def test_parse_esearch():
+    assert parse_esearch(b'(TAG "A5") UID COUNT 3 MIN 4 MAX 9 ALL 4,8:9') == {
+        'uid': True, 'count': 3, 'min': 4, 'max': 9, 'all': [4, 8, 9]}
+    assert parse_esearch('(TAG "A6") COUNT 0') == {'uid': False, 'count': 0}
+    assert parse_esearch(b'(TAG "A7") UID') == {'uid': True}
+
+
+def test_id_set_round_trip():
+    assert build_id_set([b'9', '1', 2, 3, 5, 10, 12, 11]) == '1:3,5,9:12'
+    assert build_id_set([]) == ''
+    assert parse_id_set(b'1:3,5,12:9,*') == [1, 2, 3, 5, 9, 10, 11, 12]
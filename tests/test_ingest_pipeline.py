@@ -0,0 +1,75 @@
+"""批量导入流水线测试"""
+
+import threading
+from contextlib import contextmanager
+from email.message import EmailMessage
+
+import pytest
+
+from smart_email_ai.core import ingest_pipeline
+from smart_email_ai.core.email_cache import make_email_id
+from smart_email_ai.core.fetch_scheduler import FetchScheduler
+from smart_email_ai.core.icloud_connector import iCloudConnector
+from smart_email_ai.core.ingest_pipeline import IngestPipeline
+
+
+def raw_message(uid: int) -> bytes:
+    msg = EmailMessage()
+    msg['Subject'] = f'邮件 {uid}'
+    msg['From'] = 'sender@example.com'
+    msg['To'] = 'me@example.com'
+    msg['Date'] = 'Fri, 16 Oct 2026 09:00:00 +0800'
+    msg.set_content(f'正文 {uid}')
+    return msg.as_bytes()
+
+
+class FakeConnector:
+    """只提供流水线用到的接口：获取原始邮件和补充记录字段"""
+
+    _finalize_record = iCloudConnector._finalize_record
+
+    def __init__(self, seen_uids):
+        self.seen_uids = set(seen_uids)
+        self.fetch_scheduler = FetchScheduler()
+        self.message_flags = {}
+        self.fetch_finished = threading.Event()
+
+    @contextmanager
+    def _connection(self, folder):
+        yield None
+
+    def fetch_raw_emails(self, mail_ids):
+        for mail_id in mail_ids:
+            uid = int(mail_id)
+            flags = ['\\Seen'] if uid in self.seen_uids else []
+            yield make_email_id('INBOX', uid), raw_message(uid), {'flags': flags, 'size': 123, 'parts': None}
+        self.fetch_finished.set()
+
+
+class FakeCache:
+    def __init__(self):
+        self.records = []
+
+    def store_emails(self, batch):
+        self.records.extend(batch)
+        return len(batch)
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_seen_flag_survives_pipeline(monkeypatch, workers):
+    cache = FakeCache()
+    monkeypatch.setattr(ingest_pipeline, 'email_cache_manager', cache)
+    uids = [str(uid).encode() for uid in range(1, 61)]
+    connector = FakeConnector(seen_uids=range(1, 61, 2))
+
+    # 获取队列足够大，获取阶段在解析完成前就已结束
+    pipeline = IngestPipeline(connector, workers=workers, fetch_queue_size=100,
+                              parse_chunk_size=4, write_batch_size=7)
+    result = pipeline.run(uids)
+
+    assert connector.fetch_finished.is_set()
+    assert result['stored'] == 60 and result['failed'] == 0
+    is_read = {record['uid']: record['is_read'] for record in cache.records}
+    assert is_read == {uid: uid % 2 == 1 for uid in range(1, 61)}
+    assert all(record['size'] == 123 for record in cache.records)
+    assert connector.message_flags == {}
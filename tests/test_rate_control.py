@@ -0,0 +1,129 @@
+"""自适应并发控制测试"""
+
+import imaplib
+import threading
+
+import pytest
+
+from smart_email_ai.core import rate_control
+from smart_email_ai.core.rate_control import AIMDController, is_throttle_error
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(rate_control.time, 'time', fake.time)
+    return fake
+
+
+def run_batch(controller, clock, seconds, items=10, throttled=False):
+    started = controller.acquire()
+    clock.now += seconds
+    controller.release(started, items, throttled=throttled)
+    return started
+
+
+def test_is_throttle_error():
+    assert is_throttle_error(imaplib.IMAP4.error('FETCH => NO [LIMIT] Too many commands'))
+    assert is_throttle_error(imaplib.IMAP4.error('NO [UNAVAILABLE] try again later'))
+    assert not is_throttle_error(imaplib.IMAP4.error('NO [NONEXISTENT] no such mailbox'))
+    assert not is_throttle_error(OSError('[LIMIT]'))
+
+
+def test_additive_increase_up_to_max(clock):
+    controller = AIMDController(max_limit=4, initial_limit=2)
+    # 每个批次加 1/limit，约 limit 个批次后上限加一：2 -> 2.5 -> 2.9 -> 3.24
+    for _ in range(2):
+        run_batch(controller, clock, 0.1)
+    assert int(controller.limit) == 2
+    run_batch(controller, clock, 0.1)
+    assert int(controller.limit) == 3
+    for _ in range(20):
+        run_batch(controller, clock, 0.1)
+    assert controller.limit == 4.0
+    assert controller.stats['increases'] == 2
+
+
+def test_throttle_halves_limit_and_pauses(clock, monkeypatch):
+    monkeypatch.setattr(rate_control, 'backoff_delay', lambda attempt, base, cap: min(cap, base * 2 ** attempt))
+    controller = AIMDController(max_limit=8, initial_limit=8, base_delay=1.0, max_delay=3.0)
+
+    run_batch(controller, clock, 0.1, throttled=True)
+    assert controller.limit == 4.0
+    assert controller.snapshot()['paused_for'] == 1.0
+
+    # 连续限流时暂停时间指数增加，直到上限
+    clock.now += 1.0
+    run_batch(controller, clock, 0.0, throttled=True)
+    assert controller.snapshot()['paused_for'] == 2.0
+    clock.now += 2.0
+    run_batch(controller, clock, 0.0, throttled=True)
+    clock.now += 3.0
+    run_batch(controller, clock, 0.0, throttled=True)
+    assert controller.snapshot()['paused_for'] == 3.0
+    assert controller.limit == 1.0 and controller.stats['throttled'] == 4
+
+    # 成功的批次重置退避
+    clock.now += 3.0
+    run_batch(controller, clock, 0.1)
+    assert controller._throttle_streak == 0
+
+
+def test_batches_started_before_a_decrease_are_not_penalised_again(clock):
+    controller = AIMDController(max_limit=8, initial_limit=8)
+    first = controller.acquire()
+    second = controller.acquire()
+    clock.now += 0.5
+    controller.release(first, throttled=True)
+    controller.release(second, throttled=True)
+    assert controller.limit == 4.0 and controller.stats['decreases'] == 1
+
+
+def test_latency_spike_decreases_limit(clock):
+    controller = AIMDController(max_limit=8, initial_limit=8, warmup=3, spike_ratio=2.5)
+    for _ in range(3):
+        run_batch(controller, clock, 1.0)
+    run_batch(controller, clock, 3.0)
+    assert controller.stats['spikes'] == 1 and controller.limit == 4.0
+    # 延迟在阈值内时不减小
+    run_batch(controller, clock, 1.5)
+    assert controller.stats['spikes'] == 1
+
+
+def test_bulk_acquire_waits_for_a_free_slot():
+    controller = AIMDController(max_limit=1, initial_limit=1)
+    started = controller.acquire()
+    acquired = threading.Event()
+
+    def bulk():
+        controller.release(controller.acquire(), 1)
+        acquired.set()
+
+    worker = threading.Thread(target=bulk)
+    worker.start()
+    assert not acquired.wait(0.2)
+    # 交互请求不受并发上限限制
+    controller.release(controller.acquire(bulk=False), 1)
+    assert not acquired.is_set()
+    controller.release(started, 1)
+    assert acquired.wait(2)
+    worker.join()
+
+
+def test_disabled_controller_only_counts(clock):
+    controller = AIMDController(max_limit=2, initial_limit=1, enabled=False)
+    first = controller.acquire()
+    second = controller.acquire()
+    controller.release(first, throttled=True)
+    controller.release(second)
+    assert controller.limit == 1.0
+    assert controller.snapshot()['paused_for'] == 0.0
+    assert controller.stats['throttled'] == 1 and controller.stats['decreases'] == 0
@@ -0,0 +1,22 @@
+"""搜索规划器的UID区间覆盖计算测试"""
+
+import pytest
+
+from smart_email_ai.core.search_planner import uncovered_ranges
+
+
+@pytest.mark.parametrize('coverage, upper, expected', [
+    ([], 10, [(1, 10)]),
+    ([(1, 10)], 10, []),
+    ([(1, 20)], 10, []),
+    ([(3, 5)], 10, [(1, 2), (6, 10)]),
+    ([(1, 2), (5, 6), (9, 10)], 10, [(3, 4), (7, 8)]),
+    # 区间相邻时不产生空洞
+    ([(1, 4), (5, 8)], 10, [(9, 10)]),
+    # 超出上界的覆盖区间被截断
+    ([(1, 2), (8, 15)], 5, [(3, 5)]),
+    ([(12, 15)], 10, [(1, 10)]),
+    ([], 0, []),
+])
+def test_uncovered_ranges(coverage, upper, expected):
+    assert uncovered_ranges(coverage, upper) == expected